@@ -0,0 +1,171 @@
+"""
+Wall-clock deadlines and token budgets for one analysis.
+
+Each analysis gets an overall deadline and token budget, and every phase
+(clone, scan, initial, questions, final, ...) its own limits on top. A slice
+of the overall budget is held back for the verdict phases, so running out
+while exploring still leaves room to write a (partial) verdict from what was
+gathered. Time spent waiting for the user's answers is not counted.
+"""
+
+import json
+import os
+import threading
+import time
+from typing import Dict, Optional
+
+# Per-phase limits; override with PHASE_BUDGETS='{"initial": {"seconds": 60, "tokens": 30000}}'
+DEFAULT_PHASE_BUDGETS = {
+    "clone": {"seconds": 120},
+    "scan": {"seconds": 60},
+    "initial": {"seconds": 180, "tokens": 60000},
+    "questions": {"seconds": 90, "tokens": 30000},
+    "final": {"seconds": 180, "tokens": 60000},
+    "final_draft": {"seconds": 180, "tokens": 60000},
+    "final_refine": {"seconds": 120, "tokens": 40000},
+    "delta": {"seconds": 120, "tokens": 40000},
+    "partial": {"seconds": 90, "tokens": 30000}
+}
+
+# Phases that may spend the reserve held back for the verdict
+VERDICT_PHASES = {"final", "final_draft", "final_refine", "delta", "partial"}
+
+
+class BudgetExceeded(Exception):
+    """A phase ran out of time or tokens."""
+
+    def __init__(self, phase: str, reason: str):
+        super().__init__(f"{phase}: {reason}")
+        self.phase = phase
+        self.reason = reason
+
+
+def _phase_budgets() -> Dict[str, Dict]:
+    budgets = {phase: dict(limits) for phase, limits in DEFAULT_PHASE_BUDGETS.items()}
+    try:
+        for phase, limits in json.loads(os.getenv("PHASE_BUDGETS", "{}")).items():
+            budgets.setdefault(phase, {}).update(limits)
+    except (ValueError, TypeError, AttributeError):
+        pass
+    return budgets
+
+
+class AnalysisBudget:
+    """
+    Deadline and token accounting for one analysis.
+
+    Args:
+        deadline: Seconds for the whole analysis (ANALYSIS_DEADLINE, default 600)
+        token_budget: Tokens for the whole analysis (ANALYSIS_TOKEN_BUDGET, default 200000)
+        reserve_seconds: Part of the deadline only verdict phases may use
+            (BUDGET_VERDICT_RESERVE_SECONDS, default 90)
+        reserve_tokens: Part of the token budget only verdict phases may use
+            (BUDGET_VERDICT_RESERVE_TOKENS, default 30000)
+        phases: Per-phase ``{"seconds": ..., "tokens": ...}`` limits
+            (DEFAULT_PHASE_BUDGETS updated from PHASE_BUDGETS)
+    """
+
+    def __init__(self, deadline: Optional[float] = None, token_budget: Optional[int] = None,
+                 reserve_seconds: Optional[float] = None, reserve_tokens: Optional[int] = None,
+                 phases: Optional[Dict[str, Dict]] = None):
+        self.deadline_s = deadline or float(os.getenv("ANALYSIS_DEADLINE", "600"))
+        self.token_budget = token_budget or int(os.getenv("ANALYSIS_TOKEN_BUDGET", "200000"))
+        self.reserve_seconds = reserve_seconds if reserve_seconds is not None else float(
+            os.getenv("BUDGET_VERDICT_RESERVE_SECONDS", "90"))
+        self.reserve_tokens = reserve_tokens if reserve_tokens is not None else int(
+            os.getenv("BUDGET_VERDICT_RESERVE_TOKENS", "30000"))
+        self.phases = phases or _phase_budgets()
+        self._lock = threading.Lock()
+        self._started = time.monotonic()
+        self._paused_at: Optional[float] = None
+        self._phase_started: Dict[str, float] = {}
+        self._phase_tokens: Dict[str, int] = {}
+        self.tokens_used = 0
+        self.exceeded: Optional[BudgetExceeded] = None
+
+    def pause(self) -> None:
+        """Stop the clock, e.g. while waiting for the user's answers."""
+        with self._lock:
+            if self._paused_at is None:
+                self._paused_at = time.monotonic()
+
+    def resume(self) -> None:
+        with self._lock:
+            if self._paused_at is not None:
+                self._started += time.monotonic() - self._paused_at
+                self._paused_at = None
+
+    def elapsed(self) -> float:
+        with self._lock:
+            return (self._paused_at or time.monotonic()) - self._started
+
+    def begin(self, phase: str) -> None:
+        """Start ``phase``'s clock (a phase that is never begun starts on first use)."""
+        with self._lock:
+            self._phase_started[phase] = time.monotonic()
+
+    def deadline(self, phase: str) -> float:
+        """Monotonic time by which ``phase`` must finish."""
+        with self._lock:
+            started = self._phase_started.setdefault(phase, time.monotonic())
+            overall = self._started + self.deadline_s
+            if self._paused_at is not None:
+                overall += time.monotonic() - self._paused_at
+        if phase not in VERDICT_PHASES:
+            overall -= self.reserve_seconds
+        seconds = self.phases.get(phase, {}).get("seconds")
+        return min(overall, started + seconds) if seconds else overall
+
+    def remaining(self, phase: str) -> float:
+        """Seconds ``phase`` has left (0 when it is out of time)."""
+        return max(0.0, self.deadline(phase) - time.monotonic())
+
+    def tokens_left(self, phase: str) -> int:
+        """Tokens ``phase`` may still spend."""
+        with self._lock:
+            overall = self.token_budget - self.tokens_used
+            phase_used = self._phase_tokens.get(phase, 0)
+        if phase not in VERDICT_PHASES:
+            overall -= self.reserve_tokens
+        limit = self.phases.get(phase, {}).get("tokens")
+        return max(0, min(overall, limit - phase_used) if limit else overall)
+
+    def check(self, phase: str, tokens_needed: int = 1) -> None:
+        """
+        Raise BudgetExceeded when ``phase`` is out of time or cannot afford
+        ``tokens_needed`` more tokens. The latest overrun is kept as ``exceeded``.
+        """
+        if self.remaining(phase) <= 0:
+            reason = f"deadline reached after {self.elapsed():.0f}s"
+        elif self.tokens_left(phase) < tokens_needed:
+            reason = f"token budget spent ({self.tokens_used} of {self.token_budget} tokens used)"
+        else:
+            return
+        raise self.record_overrun(phase, reason)
+
+    def record_overrun(self, phase: str, reason: str) -> BudgetExceeded:
+        """Record that ``phase`` ran out and return the exception to raise."""
+        error = BudgetExceeded(phase, reason)
+        with self._lock:
+            self.exceeded = error
+        return error
+
+    def charge(self, phase: str, usage: Dict[str, int]) -> None:
+        """Count a call's prompt and completion tokens against the budget."""
+        tokens = usage.get("prompt_tokens", 0) + usage.get("completion_tokens", 0)
+        with self._lock:
+            self.tokens_used += tokens
+            self._phase_tokens[phase] = self._phase_tokens.get(phase, 0) + tokens
+
+    def snapshot(self) -> Dict:
+        with self._lock:
+            phase_tokens = dict(self._phase_tokens)
+            exceeded = self.exceeded
+        return {
+            "elapsed_s": round(self.elapsed(), 1),
+            "deadline_s": self.deadline_s,
+            "tokens_used": self.tokens_used,
+            "token_budget": self.token_budget,
+            "phase_tokens": phase_tokens,
+            "exceeded": {"phase": exceeded.phase, "reason": exceeded.reason} if exceeded else None
+        }
@@ -0,0 +1,62 @@
+"""
+How many agent iterations are lost to format errors.
+
+An iteration is lost when the model's output could not be turned into a
+valid tool call: unparseable text (ReAct) or tool-call JSON, a tool name
+that does not exist, or arguments that fail the tool's schema. Each of those
+costs a full LLM round trip without doing any work.
+"""
+
+import threading
+from typing import Dict, Iterable, List, Tuple
+from langchain_core.agents import AgentAction
+
+# Observation returned by a tool whose arguments failed schema validation
+VALIDATION_ERROR_PREFIX = "Invalid tool arguments: "
+
+# Tool name AgentExecutor uses for output it could not parse
+PARSE_ERROR_TOOL = "_Exception"
+
+
+def validation_error_message(error: Exception) -> str:
+    """handle_validation_error callback: report bad arguments to the model instead of failing the run."""
+    return f"{VALIDATION_ERROR_PREFIX}{error}"
+
+
+class IterationStats:
+    """Iterations and format-error iterations per agent mode."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._modes: Dict[str, Dict[str, int]] = {}
+
+    def record(self, mode: str, intermediate_steps: List[Tuple[AgentAction, str]],
+               tool_names: Iterable[str]) -> None:
+        tool_names = set(tool_names)
+        parse_errors = invalid_tools = validation_errors = 0
+        for action, observation in intermediate_steps:
+            if action.tool == PARSE_ERROR_TOOL:
+                parse_errors += 1
+            elif action.tool not in tool_names:
+                invalid_tools += 1
+            elif str(observation).startswith(VALIDATION_ERROR_PREFIX):
+                validation_errors += 1
+        with self._lock:
+            entry = self._modes.setdefault(mode, {
+                "runs": 0, "iterations": 0, "parse_errors": 0, "invalid_tools": 0, "validation_errors": 0
+            })
+            entry["runs"] += 1
+            # The final answer is an iteration too
+            entry["iterations"] += len(intermediate_steps) + 1
+            entry["parse_errors"] += parse_errors
+            entry["invalid_tools"] += invalid_tools
+            entry["validation_errors"] += validation_errors
+
+    def snapshot(self) -> Dict:
+        with self._lock:
+            modes = {mode: dict(entry) for mode, entry in self._modes.items()}
+        for entry in modes.values():
+            lost = entry["parse_errors"] + entry["invalid_tools"] + entry["validation_errors"]
+            entry["lost_iterations"] = lost
+            entry["lost_percent"] = round(100.0 * lost / entry["iterations"], 1) if entry["iterations"] else 0.0
+        return modes
@@ -0,0 +1,155 @@
+"""
+Per-phase model routing with escalation.
+
+Every tool-loop iteration (tool selection) runs on a fast, cheap model, and
+so do the phases that summarize the repository and generate questions. The
+verdict phases are written by the strong model in a single call from what the
+fast tool loop gathered. When the fast model's answer fails the phase's
+validation check, the strong model writes it instead. MODEL_PHASE_ROLES
+moves phases between the two. Latency, tokens, cached tokens and estimated
+cost are recorded per phase and model, so the split can be measured.
+"""
+
+import json
+import os
+import re
+import threading
+import time
+from typing import Callable, Dict, Optional
+from uuid import UUID
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.outputs import LLMResult
+
+# OpenRouter model id
+DEFAULT_FAST_MODEL = "anthropic/claude-3.5-haiku"
+
+# Which model role writes each phase's answer; anything not listed uses the strong model.
+# Override with MODEL_PHASE_ROLES='{"initial": "strong"}'
+PHASE_ROLES = {
+    "tools": "fast",
+    "initial": "fast",
+    "questions": "fast",
+    "final": "strong",
+    "final_draft": "strong",
+    "final_refine": "strong",
+    "delta": "strong",
+    "partial": "strong"
+}
+
+# USD per million (prompt, completion) tokens; override with MODEL_PRICES='{"model": [in, out]}'
+MODEL_PRICES = {
+    "anthropic/claude-3-5-sonnet-20241022": (3.0, 15.0),
+    "anthropic/claude-3-5-sonnet": (3.0, 15.0),
+    "anthropic/claude-3.5-haiku": (0.8, 4.0),
+    "anthropic/claude-3-haiku": (0.25, 1.25)
+}
+
+
+def model_prices() -> Dict[str, tuple]:
+    prices = dict(MODEL_PRICES)
+    try:
+        prices.update({k: tuple(v) for k, v in json.loads(os.getenv("MODEL_PRICES", "{}")).items()})
+    except (ValueError, TypeError, AttributeError):
+        pass
+    return prices
+
+
+def estimate_cost(model: str, usage: Dict[str, int]) -> Optional[float]:
+    """Estimated USD cost of a call, or None when the model has no known price."""
+    price = model_prices().get(model)
+    if not price:
+        return None
+    return round((usage.get("prompt_tokens", 0) * price[0] + usage.get("completion_tokens", 0) * price[1]) / 1e6, 6)
+
+
+def _validate_analysis(answer: str) -> bool:
+    return len(answer.strip()) >= 200
+
+
+def _validate_questions(answer: str) -> bool:
+    questions = re.findall(r'^\s*\d+[.)]\s+\S', answer, re.MULTILINE)
+    return 1 <= len(questions) <= 3
+
+
+def _validate_verdict(answer: str) -> bool:
+    return re.search(r'ANSWER:\W*(YES|NO)\b', answer, re.IGNORECASE) is not None
+
+
+# Output checks per phase; a failed check on the fast model escalates to the strong one
+VALIDATORS: Dict[str, Callable[[str], bool]] = {
+    "initial": _validate_analysis,
+    "questions": _validate_questions,
+    "final": _validate_verdict,
+    "final_draft": _validate_verdict,
+    "final_refine": _validate_verdict,
+    "delta": _validate_verdict,
+    "partial": _validate_verdict
+}
+
+
+def role_for(phase: str) -> str:
+    roles = dict(PHASE_ROLES)
+    try:
+        roles.update(json.loads(os.getenv("MODEL_PHASE_ROLES", "{}")))
+    except (ValueError, TypeError):
+        pass
+    return roles.get(phase, "strong")
+
+
+def validate(phase: str, answer: str) -> bool:
+    validator = VALIDATORS.get(phase)
+    return validator(answer) if validator else bool(answer.strip())
+
+
+class PhaseMetrics:
+    """Calls, escalations, latency, tokens and estimated cost per phase."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._phases: Dict[str, Dict] = {}
+
+    def record(self, phase: str, model: str, usage: Dict[str, int], latency: float,
+               escalated: bool = False) -> None:
+        cost = estimate_cost(model, usage)
+        with self._lock:
+            entry = self._phases.setdefault(phase, {
+                "calls": 0, "escalations": 0, "latency_s": 0.0, "prompt_tokens": 0,
+                "completion_tokens": 0, "cost_usd": 0.0, "models": {}
+            })
+            entry["calls"] += 1
+            entry["escalations"] += int(escalated)
+            entry["latency_s"] += latency
+            entry["prompt_tokens"] += usage.get("prompt_tokens", 0)
+            entry["completion_tokens"] += usage.get("completion_tokens", 0)
+            entry["cost_usd"] += cost or 0.0
+            entry["models"][model] = entry["models"].get(model, 0) + 1
+
+    def snapshot(self) -> Dict:
+        with self._lock:
+            phases = {phase: {**entry, "models": dict(entry["models"])} for phase, entry in self._phases.items()}
+        for entry in phases.values():
+            entry["avg_latency_s"] = round(entry["latency_s"] / entry["calls"], 3) if entry["calls"] else 0.0
+            entry["latency_s"] = round(entry["latency_s"], 3)
+            entry["cost_usd"] = round(entry["cost_usd"], 6)
+        return phases
+
+
+class PhaseMetricsCallback(BaseCallbackHandler):
+    """Records every LLM call made through the tool loop under one phase."""
+
+    def __init__(self, metrics: PhaseMetrics, phase: str, model: str):
+        self.metrics = metrics
+        self.phase = phase
+        self.model = model
+        self._started: Dict[UUID, float] = {}
+
+    def on_chat_model_start(self, serialized, messages, *, run_id: UUID, **kwargs) -> None:
+        self._started[run_id] = time.monotonic()
+
+    def on_llm_end(self, response: LLMResult, *, run_id: UUID, **kwargs) -> None:
+        started = self._started.pop(run_id, None)
+        usage = (response.llm_output or {}).get("token_usage") or {}
+        self.metrics.record(self.phase, self.model, usage, time.monotonic() - started if started else 0.0)
+
+    def on_llm_error(self, error: BaseException, *, run_id: UUID, **kwargs) -> None:
+        self._started.pop(run_id, None)
@@ -0,0 +1,88 @@
+"""
+Cache-friendly prompt layout.
+
+Phase prompts are sent as a byte-stable prefix (system instructions plus the
+repository context and environment variables) followed by a phase-specific
+suffix and the tool loop's scratchpad. Providers with automatic prefix
+caching reuse the prefix on their own; for providers that need explicit
+breakpoints (Anthropic and Gemini through OpenRouter) the prefix block
+carries a ``cache_control`` hint.
+"""
+
+import threading
+from typing import Dict, List, Optional
+from langchain_core.messages import BaseMessage, HumanMessage, SystemMessage
+
+# Model families that only cache when the request marks a breakpoint
+EXPLICIT_CACHE_PROVIDERS = ("anthropic/", "google/gemini")
+
+
+def supports_cache_control(model_name: str) -> bool:
+    return model_name.lower().startswith(EXPLICIT_CACHE_PROVIDERS)
+
+
+def build_context_message(system_text: str, context_prefix: str, model_name: str) -> SystemMessage:
+    """
+    The stable leading system message: instructions plus repository context.
+
+    It is identical for every phase of an analysis as long as
+    ``context_prefix`` is, which is what lets the provider cache it.
+    """
+    if supports_cache_control(model_name):
+        return SystemMessage(content=[
+            {"type": "text", "text": system_text},
+            {"type": "text", "text": context_prefix, "cache_control": {"type": "ephemeral"}}
+        ])
+    return SystemMessage(content=f"{system_text}\n\n{context_prefix}")
+
+
+def build_cached_messages(system_text: str, context_prefix: str, suffix: str,
+                          model_name: str) -> List[BaseMessage]:
+    """Lay out a phase prompt as [stable system + context] + [phase suffix]."""
+    return [build_context_message(system_text, context_prefix, model_name), HumanMessage(content=suffix)]
+
+
+def extract_usage(token_usage: Optional[Dict]) -> Dict[str, int]:
+    """
+    Normalize provider usage into prompt, cached-prompt and completion tokens.
+
+    OpenAI-style responses (including OpenRouter) report cached tokens under
+    ``prompt_tokens_details.cached_tokens``; Anthropic-style payloads use
+    ``cache_read_input_tokens``.
+    """
+    token_usage = token_usage or {}
+    details = token_usage.get("prompt_tokens_details") or {}
+    cached = details.get("cached_tokens") or token_usage.get("cache_read_input_tokens") or 0
+    prompt = token_usage.get("prompt_tokens") or 0
+    return {
+        "prompt_tokens": int(prompt),
+        "cached_prompt_tokens": int(cached),
+        "uncached_prompt_tokens": max(int(prompt) - int(cached), 0),
+        "completion_tokens": int(token_usage.get("completion_tokens") or 0)
+    }
+
+
+class PromptCacheStats:
+    """Cached vs. uncached prompt tokens accumulated per phase."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._phases: Dict[str, Dict[str, int]] = {}
+
+    def record(self, phase: str, usage: Dict[str, int]) -> None:
+        with self._lock:
+            entry = self._phases.setdefault(phase, {
+                "calls": 0, "prompt_tokens": 0, "cached_prompt_tokens": 0,
+                "uncached_prompt_tokens": 0, "completion_tokens": 0
+            })
+            entry["calls"] += 1
+            for key in ("prompt_tokens", "cached_prompt_tokens", "uncached_prompt_tokens", "completion_tokens"):
+                entry[key] += usage.get(key, 0)
+
+    def snapshot(self) -> Dict:
+        with self._lock:
+            phases = {phase: dict(entry) for phase, entry in self._phases.items()}
+        for entry in phases.values():
+            prompt = entry["prompt_tokens"]
+            entry["cache_hit_percent"] = round(100.0 * entry["cached_prompt_tokens"] / prompt, 1) if prompt else 0.0
+        return phases
@@ -0,0 +1,551 @@
+"""
+Process-wide rate limiting and retries for OpenRouter calls.
+
+Every LLM request, from any session, goes through one limiter:
+
+* token buckets on requests and tokens per minute (in-process, or shared
+  between workers through Redis when RATE_LIMIT_REDIS_URL is set),
+* an AIMD concurrency limit that grows by one slot per window of fast,
+  successful calls and halves on 429s or slow responses,
+* retries with full-jitter exponential backoff that honor Retry-After,
+* a circuit breaker that fails fast while the provider is down.
+"""
+
+import email.utils
+import logging
+import os
+import random
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, List, Optional
+
+import openai
+from langchain_core.messages import BaseMessage
+from langchain_core.outputs import ChatResult
+from langchain_openai import ChatOpenAI
+from tools.cancellation import AnalysisCancelled, CancellationToken, check_cancelled, sleep
+from tools.observation_format import count_tokens
+
+try:
+    import redis
+except ImportError:
+    redis = None
+
+logger = logging.getLogger(__name__)
+
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling the provider while the circuit breaker is open."""
+
+
+class TokenBucket:
+    """In-process token bucket refilled continuously at ``per_minute`` / 60 per second."""
+
+    def __init__(self, per_minute: float):
+        self.capacity = float(per_minute)
+        self.rate = per_minute / 60.0
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def try_acquire(self, amount: float) -> float:
+        """Take ``amount`` tokens if available; otherwise return the seconds to wait."""
+        amount = min(amount, self.capacity)
+        with self._lock:
+            self._refill()
+            if self._tokens >= amount:
+                self._tokens -= amount
+                return 0.0
+            return (amount - self._tokens) / self.rate
+
+    def adjust(self, amount: float) -> None:
+        """Consume (or, when negative, refund) tokens without waiting."""
+        with self._lock:
+            self._refill()
+            self._tokens = min(self.capacity, self._tokens - amount)
+
+    def available(self) -> float:
+        with self._lock:
+            self._refill()
+            return self._tokens
+
+
+class RedisTokenBucket:
+    """Token bucket kept in Redis so several worker processes share one quota."""
+
+    SCRIPT = """
+local rate = tonumber(ARGV[1])
+local capacity = tonumber(ARGV[2])
+local now = tonumber(ARGV[3])
+local amount = tonumber(ARGV[4])
+local force = ARGV[5] == '1'
+local state = redis.call('HMGET', KEYS[1], 'tokens', 'ts')
+local tokens = tonumber(state[1]) or capacity
+local ts = tonumber(state[2]) or now
+tokens = math.min(capacity, tokens + math.max(now - ts, 0) * rate)
+local wait = 0
+if force or tokens >= amount then
+    tokens = math.min(capacity, tokens - amount)
+else
+    wait = (amount - tokens) / rate
+end
+redis.call('HSET', KEYS[1], 'tokens', tokens, 'ts', now)
+redis.call('EXPIRE', KEYS[1], math.ceil(capacity / rate) + 60)
+return {tostring(wait), tostring(tokens)}
+"""
+
+    def __init__(self, client, key: str, per_minute: float):
+        self.client = client
+        self.key = key
+        self.capacity = float(per_minute)
+        self.rate = per_minute / 60.0
+        self._script = client.register_script(self.SCRIPT)
+
+    def _run(self, amount: float, force: bool) -> List[float]:
+        wait, tokens = self._script(keys=[self.key], args=[self.rate, self.capacity, time.time(), amount, int(force)])
+        return [float(wait), float(tokens)]
+
+    def try_acquire(self, amount: float) -> float:
+        return self._run(min(amount, self.capacity), False)[0]
+
+    def adjust(self, amount: float) -> None:
+        self._run(amount, True)
+
+    def available(self) -> float:
+        return self._run(0, True)[1]
+
+
+class AdaptiveConcurrency:
+    """
+    AIMD limit on calls in flight: +1 slot after ``limit`` consecutive fast
+    successes, halved on throttling or when latency exceeds the target.
+    """
+
+    def __init__(self, initial: int, minimum: int, maximum: int, latency_target: float):
+        self.limit = float(initial)
+        self.minimum = minimum
+        self.maximum = maximum
+        self.latency_target = latency_target
+        self.in_flight = 0
+        self._condition = threading.Condition()
+
+    @contextmanager
+    def slot(self):
+        with self._condition:
+            while self.in_flight >= int(self.limit):
+                self._condition.wait()
+            self.in_flight += 1
+        try:
+            yield
+        finally:
+            with self._condition:
+                self.in_flight -= 1
+                self._condition.notify_all()
+
+    def on_success(self, latency: float) -> None:
+        with self._condition:
+            if latency > self.latency_target:
+                self._decrease()
+            else:
+                self.limit = min(self.maximum, self.limit + 1.0 / self.limit)
+            self._condition.notify_all()
+
+    def on_throttle(self) -> None:
+        with self._condition:
+            self._decrease()
+
+    def _decrease(self) -> None:
+        self.limit = max(self.minimum, self.limit / 2.0)
+
+
+class CircuitBreaker:
+    """
+    Opens after ``threshold`` consecutive provider failures and rejects calls
+    for ``reset_timeout`` seconds, then lets a single trial call through.
+    """
+
+    def __init__(self, threshold: int, reset_timeout: float):
+        self.threshold = threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.state = "closed"
+        self.opened_at = 0.0
+        self._lock = threading.Lock()
+
+    def before_call(self) -> bool:
+        """Raise CircuitOpenError while open; returns True when this call is the half-open trial."""
+        with self._lock:
+            if self.state == "open":
+                if time.monotonic() - self.opened_at < self.reset_timeout:
+                    raise CircuitOpenError(
+                        f"LLM provider unavailable after {self.failures} consecutive failures; "
+                        f"retrying in {self.reset_timeout - (time.monotonic() - self.opened_at):.0f}s"
+                    )
+                self.state = "half_open"
+                return True
+            elif self.state == "half_open":
+                raise CircuitOpenError("LLM provider unavailable; a trial request is in progress")
+            return False
+
+    def release_trial(self) -> None:
+        """Give up a half-open trial that ended without an outcome (cancelled or timed out)."""
+        with self._lock:
+            if self.state == "half_open":
+                self.state = "open"
+                self.opened_at = time.monotonic()
+
+    def record_success(self) -> None:
+        with self._lock:
+            self.failures = 0
+            self.state = "closed"
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self.failures += 1
+            if self.state == "half_open" or self.failures >= self.threshold:
+                self.state = "open"
+                self.opened_at = time.monotonic()
+
+
+def classify_error(error: Exception) -> str:
+    """'throttled', 'transient' (retry, counts towards the breaker) or 'fatal'."""
+    if isinstance(error, openai.RateLimitError):
+        return "throttled"
+    if isinstance(error, (openai.APIConnectionError, openai.APITimeoutError, openai.InternalServerError)):
+        return "transient"
+    if isinstance(error, openai.APIStatusError) and error.status_code in (408, 409, 425):
+        return "transient"
+    return "fatal"
+
+
+def retry_after(error: Exception) -> Optional[float]:
+    """Seconds requested by a Retry-After (or retry-after-ms) header, if any."""
+    response = getattr(error, "response", None)
+    headers = getattr(response, "headers", None) or {}
+    try:
+        if headers.get("retry-after-ms"):
+            return float(headers["retry-after-ms"]) / 1000.0
+        value = headers.get("retry-after")
+        if not value:
+            return None
+        try:
+            return max(float(value), 0.0)
+        except ValueError:
+            return max(email.utils.parsedate_to_datetime(value).timestamp() - time.time(), 0.0)
+    except (TypeError, ValueError):
+        return None
+
+
+class RateLimiter:
+    """
+    Coordinates every LLM call in the process.
+
+    Configured from the environment: LLM_RPM (60), LLM_TPM (200000),
+    LLM_MAX_CONCURRENCY (8), LLM_MIN_CONCURRENCY (1), LLM_LATENCY_TARGET
+    seconds (60), LLM_MAX_RETRIES (4), LLM_BACKOFF_BASE / LLM_BACKOFF_MAX
+    seconds (1 / 60), LLM_BREAKER_THRESHOLD (5), LLM_BREAKER_RESET seconds
+    (30) and RATE_LIMIT_REDIS_URL (optional, requires the redis package).
+    """
+
+    def __init__(self):
+        self.rpm = float(os.getenv("LLM_RPM", "60"))
+        self.tpm = float(os.getenv("LLM_TPM", "200000"))
+        self.max_retries = int(os.getenv("LLM_MAX_RETRIES", "4"))
+        self.backoff_base = float(os.getenv("LLM_BACKOFF_BASE", "1"))
+        self.backoff_max = float(os.getenv("LLM_BACKOFF_MAX", "60"))
+        self.backend = "local"
+        self.requests, self.tokens = self._buckets(os.getenv("RATE_LIMIT_REDIS_URL"))
+        maximum = int(os.getenv("LLM_MAX_CONCURRENCY", "8"))
+        self.concurrency = AdaptiveConcurrency(
+            initial=maximum,
+            minimum=int(os.getenv("LLM_MIN_CONCURRENCY", "1")),
+            maximum=maximum,
+            latency_target=float(os.getenv("LLM_LATENCY_TARGET", "60"))
+        )
+        self.breaker = CircuitBreaker(
+            int(os.getenv("LLM_BREAKER_THRESHOLD", "5")),
+            float(os.getenv("LLM_BREAKER_RESET", "30"))
+        )
+        self._lock = threading.Lock()
+        self.counters = {"calls": 0, "retries": 0, "throttled": 0, "failed": 0, "rejected": 0, "waited_s": 0.0}
+
+    def _buckets(self, redis_url: Optional[str]):
+        if redis_url:
+            if redis is None:
+                logger.warning("RATE_LIMIT_REDIS_URL is set but the redis package is not installed; using local buckets")
+            else:
+                try:
+                    client = redis.Redis.from_url(redis_url)
+                    client.ping()
+                    self.backend = "redis"
+                    return (RedisTokenBucket(client, "git-agent:llm:rpm", self.rpm),
+                            RedisTokenBucket(client, "git-agent:llm:tpm", self.tpm))
+                except Exception as e:
+                    logger.warning(f"Redis rate limiter unavailable ({str(e)}); using local buckets")
+        return TokenBucket(self.rpm), TokenBucket(self.tpm)
+
+    def _count(self, key: str, amount: float = 1) -> None:
+        with self._lock:
+            self.counters[key] += amount
+
+    def _wait_for(self, bucket, amount: float, deadline: Optional[float] = None,
+                  cancel_token: Optional[CancellationToken] = None) -> None:
+        while True:
+            wait = bucket.try_acquire(amount)
+            if wait <= 0:
+                return
+            if deadline is not None and time.monotonic() + wait > deadline:
+                raise TimeoutError("Rate limit wait would pass the call's deadline")
+            self._count("waited_s", wait)
+            sleep(min(wait, 5.0), cancel_token)
+
+    def backoff(self, attempt: int, error: Exception) -> float:
+        """Delay before retry ``attempt``: Retry-After when given, else full-jitter exponential."""
+        requested = retry_after(error)
+        if requested is not None:
+            return min(requested, self.backoff_max) + random.uniform(0, self.backoff_base)
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * (2 ** attempt)))
+
+    def call(self, fn: Callable[[], Any], estimated_tokens: int,
+             usage_of: Optional[Callable[[Any], Optional[int]]] = None,
+             deadline: Optional[float] = None, cancel_token: Optional[CancellationToken] = None) -> Any:
+        """
+        Run ``fn`` under the limits, retrying throttled and transient failures.
+
+        Args:
+            fn: The provider call
+            estimated_tokens: Tokens reserved from the TPM bucket up front
+            usage_of: Returns the actual tokens used by ``fn``'s result, so
+                the reservation can be corrected
+            deadline: Monotonic time after which no wait or retry is started
+            cancel_token: Cancelling it interrupts waits and backoff with AnalysisCancelled
+        """
+        attempt = 0
+        while True:
+            check_cancelled(cancel_token)
+            if deadline is not None and time.monotonic() >= deadline:
+                # Never take the half-open trial for a call that cannot be made
+                raise TimeoutError("LLM call deadline reached")
+            try:
+                trial = self.breaker.before_call()
+            except CircuitOpenError:
+                self._count("rejected")
+                raise
+            settled = False
+            reserved = False
+            succeeded = False
+            try:
+                self._wait_for(self.requests, 1, deadline, cancel_token)
+                self._wait_for(self.tokens, estimated_tokens, deadline, cancel_token)
+                reserved = True
+                self._count("calls")
+                with self.concurrency.slot():
+                    started = time.monotonic()
+                    try:
+                        result = fn()
+                    except AnalysisCancelled:
+                        # Says nothing about the provider; just give the slot back
+                        raise
+                    except Exception as e:
+                        error, kind = e, classify_error(e)
+                    else:
+                        self.concurrency.on_success(time.monotonic() - started)
+                        self.breaker.record_success()
+                        settled = succeeded = True
+                        used = usage_of(result) if usage_of else None
+                        if used:
+                            self.tokens.adjust(used - estimated_tokens)
+                        return result
+
+                if kind == "transient":
+                    self.breaker.record_failure()
+                    settled = True
+                elif isinstance(error, openai.APIStatusError):
+                    # The provider answered, so it is up even if the request failed
+                    self.breaker.record_success()
+                    settled = True
+                # Anything else (a local timeout, a bug) says nothing about the provider
+            finally:
+                if reserved and not succeeded:
+                    # A failed call did not spend the tokens reserved for it
+                    self.tokens.adjust(-estimated_tokens)
+                if trial and not settled:
+                    # Otherwise the breaker would wait forever for this trial's outcome
+                    self.breaker.release_trial()
+
+            if kind == "throttled":
+                self._count("throttled")
+                self.concurrency.on_throttle()
+            delay = self.backoff(attempt, error)
+            out_of_time = deadline is not None and time.monotonic() + delay >= deadline
+            if kind == "fatal" or attempt >= self.max_retries or out_of_time:
+                self._count("failed")
+                raise error
+            logger.warning(f"LLM call {kind} ({str(error)[:200]}); retry {attempt + 1} in {delay:.1f}s")
+            self._count("retries")
+            sleep(delay, cancel_token)
+            attempt += 1
+
+    def stats(self) -> Dict:
+        with self._lock:
+            counters = dict(self.counters)
+        counters["waited_s"] = round(counters["waited_s"], 1)
+        return {
+            **counters,
+            "backend": self.backend,
+            "rpm": self.rpm,
+            "tpm": self.tpm,
+            "concurrency_limit": round(self.concurrency.limit, 2),
+            "in_flight": self.concurrency.in_flight,
+            "circuit": self.breaker.state
+        }
+
+
+# Shared RateLimiter instance
+_shared_rate_limiter = None
+_shared_limiter_lock = threading.Lock()
+
+
+def get_shared_rate_limiter() -> RateLimiter:
+    """Get or create the process-wide RateLimiter instance."""
+    global _shared_rate_limiter
+    with _shared_limiter_lock:
+        if _shared_rate_limiter is None:
+            _shared_rate_limiter = RateLimiter()
+        return _shared_rate_limiter
+
+
+def _total_tokens(result: ChatResult) -> Optional[int]:
+    usage = (result.llm_output or {}).get("token_usage") or {}
+    return usage.get("total_tokens")
+
+
+def _collect_stream(stream) -> Dict[str, Any]:
+    """Assemble streamed chunks into the dict shape of a non-streaming completion."""
+    content: List[str] = []
+    tool_calls: Dict[int, Dict[str, Any]] = {}
+    finish_reason = None
+    usage: Dict[str, Any] = {}
+    fingerprint = ""
+    for chunk in stream:
+        if chunk.usage:
+            usage = chunk.usage.model_dump(exclude_none=True)
+        fingerprint = chunk.system_fingerprint or fingerprint
+        for choice in chunk.choices:
+            delta = choice.delta
+            if delta.content:
+                content.append(delta.content)
+            for call in delta.tool_calls or []:
+                entry = tool_calls.setdefault(
+                    call.index, {"id": None, "type": "function", "function": {"name": "", "arguments": ""}}
+                )
+                if call.id:
+                    entry["id"] = call.id
+                if call.function:
+                    if call.function.name:
+                        entry["function"]["name"] = call.function.name
+                    if call.function.arguments:
+                        entry["function"]["arguments"] += call.function.arguments
+            if choice.finish_reason:
+                finish_reason = choice.finish_reason
+    message: Dict[str, Any] = {"role": "assistant", "content": "".join(content)}
+    if tool_calls:
+        message["tool_calls"] = [tool_calls[index] for index in sorted(tool_calls)]
+    return {
+        "choices": [{"message": message, "finish_reason": finish_reason}],
+        "usage": usage,
+        "system_fingerprint": fingerprint
+    }
+
+
+class RateLimitedChatOpenAI(ChatOpenAI):
+    """
+    ChatOpenAI whose requests go through the shared RateLimiter.
+
+    The client's own retries are disabled (max_retries=0) so that the
+    limiter's retry policy is the only one. A ``deadline`` keyword (monotonic
+    time) bounds the whole call: each attempt's request timeout is the time
+    left, and no retry starts past it. A ``cancel_token`` keyword makes the
+    call abortable: the request is streamed over the shared connection pool,
+    and cancelling closes that one response while the caller returns
+    immediately.
+    """
+
+    completion_reserve: int = 500
+
+    def _generate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                  run_manager=None, **kwargs: Any) -> ChatResult:
+        estimated = sum(count_tokens(str(m.content)) for m in messages) + self.completion_reserve
+        deadline = kwargs.pop("deadline", None)
+        cancel_token = kwargs.pop("cancel_token", None)
+
+        def attempt() -> ChatResult:
+            if deadline is not None:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise TimeoutError("LLM call deadline reached")
+                kwargs["timeout"] = remaining
+            if cancel_token is not None:
+                return self._generate_cancellable(messages, stop, kwargs, cancel_token)
+            return super(RateLimitedChatOpenAI, self)._generate(messages, stop=stop, run_manager=run_manager, **kwargs)
+
+        return get_shared_rate_limiter().call(attempt, estimated, _total_tokens, deadline, cancel_token)
+
+    def _generate_cancellable(self, messages: List[BaseMessage], stop: Optional[List[str]],
+                              kwargs: Dict[str, Any], cancel_token: CancellationToken) -> ChatResult:
+        """
+        One request, streamed on the model's pooled client so that it can be
+        abandoned on its own: cancellation or the deadline closes just this
+        response, and the other calls keep their pooled connections.
+        """
+        check_cancelled(cancel_token)
+        message_dicts, params = self._create_message_dicts(messages, stop)
+        params = {**params, **kwargs, "stream": True, "stream_options": {"include_usage": True}}
+        timeout = kwargs.get("timeout")
+        outcome: Dict[str, Any] = {}
+        done = threading.Event()
+        state_lock = threading.Lock()
+        state: Dict[str, Any] = {"stream": None, "abandoned": False}
+
+        def abandon() -> None:
+            with state_lock:
+                state["abandoned"] = True
+                stream = state["stream"]
+            if stream is not None:
+                stream.close()
+
+        def request():
+            try:
+                stream = self.client.create(messages=message_dicts, **params)
+                with state_lock:
+                    state["stream"] = stream
+                    abandoned = state["abandoned"]
+                if abandoned:
+                    stream.close()
+                    return
+                outcome["result"] = self._create_chat_result(_collect_stream(stream))
+            except Exception as e:
+                outcome["error"] = e
+            finally:
+                done.set()
+
+        threading.Thread(target=request, name="llm-request", daemon=True).start()
+        unregister = cancel_token.on_cancel(done.set)
+        try:
+            finished = done.wait(timeout)
+        finally:
+            unregister()
+        if "result" in outcome:
+            return outcome["result"]
+        if cancel_token.cancelled or not finished:
+            abandon()
+            if cancel_token.cancelled:
+                raise AnalysisCancelled(cancel_token.reason)
+            raise TimeoutError("LLM call deadline reached")
+        raise outcome["error"]
@@ -7,9 +7,10 @@ for comprehensive GitHub repository analysis.
 """
 
 import os
+import time
 from typing import List, Dict, Any, Optional
 from dotenv import load_dotenv
-from langchain.agents import create_react_agent, AgentExecutor
+from langchain.agents import create_openai_tools_agent, create_react_agent, AgentExecutor
 from langchain_openai import ChatOpenAI
 from langchain_core.prompts import PromptTemplate
 from langchain_core.tools import BaseTool
@@ -18,37 +19,119 @@ from langchain.tools import Tool
 from langchain.schema import AgentAction
 import json
 import re
+from langchain.agents.format_scratchpad.openai_tools import format_to_openai_tool_messages
+from langchain.agents.output_parsers import ReActSingleInputOutputParser
+from langchain.agents.output_parsers.openai_tools import OpenAIToolsAgentOutputParser
+from langchain_core.prompts import ChatPromptTemplate, MessagesPlaceholder
+from langchain_core.utils.function_calling import convert_to_openai_tool
+from langchain.tools.render import render_text_description
+from langchain_core.runnables import RunnablePassthrough
 
+from agent.budget import AnalysisBudget, BudgetExceeded
+from agent.iteration_stats import IterationStats, validation_error_message
+from langchain_core.callbacks import BaseCallbackHandler
+from agent.model_router import DEFAULT_FAST_MODEL, PhaseMetrics, PhaseMetricsCallback, estimate_cost, role_for, validate
+from agent.prompt_cache import PromptCacheStats, build_cached_messages, build_context_message, extract_usage
+from agent.rate_limiter import RateLimitedChatOpenAI
+from agent.scratchpad import ScratchpadCompactor
+from tools.cancellation import AnalysisCancelled, CancellationToken
+from tools.observation_format import count_tokens
 from tools import (
     CloneRepositoryTool,
     GetRepositoryStructureTool,
+    ListDirectoryTool,
     FlexibleReadFileTool,
+    ReadFileTool,
     ListClonedRepositoriesTool,
     AnalyzeRepositoryTool,
     CleanupRepositoryTool
 )
 
 
+# Stable system text placed ahead of the repository context in every phase
+CONTEXT_SYSTEM_PROMPT = """You are a GitHub Repository Analyzer assistant evaluating whether a repository can be deployed.
+The repository context below was gathered from the repository itself and is shared by every step of this analysis.
+Base your answers on it, use the tools to look at anything it leaves out, and follow the instructions in the user message."""
+
+
+class PhaseUsageCallback(BaseCallbackHandler):
+    """
+    Budget and usage accounting for the LLM calls of one phase's tool loop.
+
+    Every call is checked against the phase's budget before it is sent
+    (raising BudgetExceeded stops the loop) and charged afterwards; usage is
+    summed for the phase's statistics.
+    """
+
+    raise_error = True
+
+    def __init__(self, phase: str, budget: Optional[AnalysisBudget] = None):
+        self.phase = phase
+        self.budget = budget
+        self.calls = 0
+        self.usage = extract_usage(None)
+
+    def on_chat_model_start(self, serialized, messages, **kwargs) -> None:
+        if self.budget is not None:
+            prompt_tokens = sum(count_tokens(str(m.content)) for batch in messages for m in batch)
+            # Leave room for at least a short answer
+            self.budget.check(self.phase, prompt_tokens + 200)
+
+    def on_llm_end(self, response, **kwargs) -> None:
+        usage = extract_usage((response.llm_output or {}).get("token_usage"))
+        self.calls += 1
+        for key, value in usage.items():
+            self.usage[key] += value
+        if self.budget is not None:
+            self.budget.charge(self.phase, usage)
+
+
 class GitHubRepoReActAgent:
     """
     A ReAct agent specialized for GitHub repository analysis.
     Uses LangChain's ReAct framework with custom repository tools.
     """
     
-    def __init__(self, api_key: str, model_name: str = "anthropic/claude-3-5-sonnet-20241022", temperature: float = 0.1):
-        """Initialize the ReAct agent."""
+    def __init__(self, api_key: str, model_name: str = "anthropic/claude-3-5-sonnet-20241022", temperature: float = 0.1,
+                 compact_scratchpad: bool = None, scratchpad_max_tokens: int = None, keep_last_steps: int = None,
+                 fast_model_name: str = None, agent_mode: str = None):
+        """
+        Initialize the ReAct agent.
+        
+        Args:
+            api_key: OpenRouter API key
+            model_name: Strong model, which writes the verdicts and escalated answers
+            temperature: Sampling temperature
+            compact_scratchpad: Compact older observations once the scratchpad
+                passes scratchpad_max_tokens (default: on, SCRATCHPAD_COMPACTION=0 disables)
+            scratchpad_max_tokens: Scratchpad size that triggers compaction
+            keep_last_steps: Most recent steps always kept verbatim
+            fast_model_name: Cheap model for every tool-loop iteration, the initial summary
+                and the questions (default MODEL_FAST or claude-3.5-haiku; pass model_name
+                to disable the cascade)
+            agent_mode: "tools" for native function calling with the tools' args_schemas
+                (default, AGENT_MODE), or "react" for the text-parsed ReAct format
+        """
         self.api_key = api_key
         self.model_name = model_name
+        self.fast_model_name = fast_model_name or os.getenv("MODEL_FAST", DEFAULT_FAST_MODEL)
+        self.phase_metrics = PhaseMetrics()
+        self.agent_mode = (agent_mode or os.getenv("AGENT_MODE", "tools")).lower()
+        self.iteration_stats = IterationStats()
         self.temperature = temperature
+        if compact_scratchpad is None:
+            compact_scratchpad = os.getenv("SCRATCHPAD_COMPACTION", "1") != "0"
+        self.scratchpad = ScratchpadCompactor(scratchpad_max_tokens, keep_last_steps) if compact_scratchpad else None
+        self.prompt_cache_stats = PromptCacheStats()
         
-        # Initialize LLM with OpenRouter configuration
-        self.llm = ChatOpenAI(
-            model=model_name,
-            openai_api_key=api_key,
-            openai_api_base="https://openrouter.ai/api/v1",
-            temperature=temperature,
-            max_tokens=4000
-        )
+        # Initialize LLM with OpenRouter configuration; calls share the
+        # process-wide rate limiter, which also owns retries
+        self.llm = self._create_llm(model_name, max_tokens=4000)
+        self.fast_llm = self._create_llm(self.fast_model_name, max_tokens=int(os.getenv("MODEL_FAST_MAX_TOKENS", "2000")))
+        self.models = {
+            "strong": (self.model_name, self.llm),
+            "fast": (self.fast_model_name, self.fast_llm)
+        }
         
         # Initialize tools
         self.tools = self._initialize_tools()
@@ -62,29 +145,62 @@ class GitHubRepoReActAgent:
             tools=self.tools,
             verbose=True,
             max_iterations=10,
-            handle_parsing_errors=True
+            # Wall-clock bound on the tool loop; stops with the best answer so far
+            max_execution_time=float(os.getenv("AGENT_MAX_EXECUTION_TIME", "300")),
+            handle_parsing_errors=True,
+            return_intermediate_steps=True
+        )
+    
+    def _create_llm(self, model_name: str, max_tokens: int) -> RateLimitedChatOpenAI:
+        return RateLimitedChatOpenAI(
+            model=model_name,
+            openai_api_key=self.api_key,
+            openai_api_base="https://openrouter.ai/api/v1",
+            temperature=self.temperature,
+            max_tokens=max_tokens,
+            max_retries=0
         )
     
     def _initialize_tools(self) -> List[BaseTool]:
         """Initialize all repository analysis tools."""
-        return [
+        tools = [
             CloneRepositoryTool(),
             GetRepositoryStructureTool(),
-            FlexibleReadFileTool(),
+            ListDirectoryTool(),
+            # Function calling sends structured arguments; ReAct sends one string
+            ReadFileTool() if self.agent_mode == "tools" else FlexibleReadFileTool(),
             ListClonedRepositoriesTool(),
             AnalyzeRepositoryTool(),
             CleanupRepositoryTool()
         ]
+        for tool in tools:
+            # Bad arguments go back to the model as an observation instead of aborting the run
+            tool.handle_validation_error = validation_error_message
+        return tools
     
-    def _create_agent(self):
-        """Create the ReAct agent with custom prompt."""
+    def _create_agent(self, tool_llm=None):
+        """
+        Create the agent: native tool calling, or ReAct with a custom prompt.
+        
+        Both prompts start with an optional ``context`` message list, where
+        ask_with_context puts the cacheable repository context so that it
+        precedes everything that changes between calls.
+        """
+        if tool_llm is None:
+            # Tool routing runs on the fast model; its calls are recorded as the "tools" phase
+            tool_llm = self.fast_llm.with_config(
+                callbacks=[PhaseMetricsCallback(self.phase_metrics, "tools", self.fast_model_name)]
+            )
+        
+        if self.agent_mode == "tools":
+            return self._create_tools_agent(tool_llm)
         
         # Create a prompt template compatible with create_react_agent
         prompt_template = """You are a GitHub Repository Analyzer assistant. Your goal is to help users analyze GitHub repositories comprehensively.
 
 When using tools, follow these guidelines:
 1. Always start by cloning the repository using clone_repository
-2. Use get_repository_structure to understand the project layout
+2. Use list_directory to see the top level, then expand only the directories that matter (get_repository_structure gives a quick tree of small repositories)
 3. Read key files like README, package.json, requirements.txt, etc.
 4. For read_file action, use this format: repo_full_name="owner/repo" file_path="filename"
 5. Provide comprehensive analysis including architecture, dependencies, and recommendations
@@ -117,9 +233,69 @@ Begin!
 Question: {input}
 Thought: {agent_scratchpad}"""
 
-        prompt = PromptTemplate.from_template(prompt_template)
+        prompt = ChatPromptTemplate.from_messages([
+            MessagesPlaceholder("context", optional=True),
+            ("human", prompt_template)
+        ])
+        
+        if self.scratchpad is None:
+            return create_react_agent(tool_llm, self.tools, prompt)
         
-        return create_react_agent(self.llm, self.tools, prompt)
+        # Same pipeline as create_react_agent, with a compacting scratchpad
+        prompt = prompt.partial(
+            tools=render_text_description(list(self.tools)),
+            tool_names=", ".join([t.name for t in self.tools]),
+        )
+        return (
+            RunnablePassthrough.assign(
+                agent_scratchpad=lambda x: self.scratchpad.format(x["intermediate_steps"]),
+            )
+            | prompt
+            | tool_llm.bind(stop=["\nObservation"])
+            | ReActSingleInputOutputParser()
+        )
+    
+    def _create_tools_agent(self, tool_llm):
+        """
+        Agent built on the provider's tool calling: the model returns
+        structured calls validated against each tool's args_schema, so there
+        is no free-text Action format to parse.
+        """
+        prompt = ChatPromptTemplate.from_messages([
+            MessagesPlaceholder("context", optional=True),
+            ("system", """You are a GitHub Repository Analyzer assistant. Your goal is to help users analyze GitHub repositories comprehensively.
+
+When using tools, follow these guidelines:
+1. Always start by cloning the repository using clone_repository
+2. Use list_directory to see the top level, then expand only the directories that matter (get_repository_structure gives a quick tree of small repositories)
+3. Read key files like README, package.json, requirements.txt, etc.
+4. Provide comprehensive analysis including architecture, dependencies, and recommendations"""),
+            ("human", "{input}"),
+            MessagesPlaceholder("agent_scratchpad")
+        ])
+        
+        if self.scratchpad is None:
+            return create_openai_tools_agent(tool_llm, self.tools, prompt)
+        
+        # Same pipeline as create_openai_tools_agent, with compacted observations
+        return (
+            RunnablePassthrough.assign(
+                agent_scratchpad=lambda x: format_to_openai_tool_messages(
+                    self.scratchpad.compact_steps(x["intermediate_steps"])
+                ),
+            )
+            | prompt
+            | tool_llm.bind(tools=[convert_to_openai_tool(tool) for tool in self.tools])
+            | OpenAIToolsAgentOutputParser()
+        )
+    
+    def _invoke(self, input_text: str) -> Dict[str, Any]:
+        """Run the tool loop and record how many iterations were lost to format errors."""
+        result = self.agent_executor.invoke({"input": input_text})
+        self.iteration_stats.record(
+            self.agent_mode, result.get("intermediate_steps", []), [tool.name for tool in self.tools]
+        )
+        return result
     
     def analyze_repository(self, github_url: str, cleanup_after: bool = True) -> Dict[str, Any]:
         """
@@ -150,7 +326,7 @@ Thought: {agent_scratchpad}"""
             """
             
             # Run the agent
-            result = self.agent_executor.invoke({"input": input_text})
+            result = self._invoke(input_text)
             
             return {
                 "success": True,
@@ -178,7 +354,7 @@ Thought: {agent_scratchpad}"""
             Dict containing the response
         """
         try:
-            result = self.agent_executor.invoke({"input": question})
+            result = self._invoke(question)
             
             return {
                 "success": True,
@@ -194,6 +370,214 @@ Thought: {agent_scratchpad}"""
                 "question": question
             }
     
+    def ask_with_context(self, context_prefix: str, prompt: str, phase: str = "default",
+                         budget: Optional[AnalysisBudget] = None,
+                         cancel_token: Optional[CancellationToken] = None,
+                         callbacks: Optional[List[BaseCallbackHandler]] = None) -> Dict[str, Any]:
+        """
+        Run the tool loop on a prompt against a shared, cacheable repository context.
+        
+        The context prefix leads every request of the loop, ahead of the tool
+        instructions, the prompt and the scratchpad, and must be byte-identical
+        across calls for the provider to reuse its prompt cache; only
+        ``prompt`` changes between phases.
+        
+        The tool loop (tool selection) always runs on the fast model; the
+        phase picks the model that writes the answer (see
+        agent.model_router.PHASE_ROLES). When the fast model errors or its
+        answer fails the phase's validation, the strong model writes the
+        answer instead, from the tool results the fast attempt gathered.
+        
+        With a budget, every call of the loop is bounded by the phase's
+        deadline and the tokens it has left; a phase that is out of budget
+        fails with ``budget_exceeded`` set instead of escalating. Cancelling
+        ``cancel_token`` aborts the in-flight request and fails the phase with
+        ``cancelled`` set.
+        
+        Args:
+            context_prefix: Stable repository context (see tools.repo_context.build_context_prefix)
+            prompt: Phase-specific instructions
+            phase: Phase label, used for routing and the per-phase statistics
+            budget: The analysis' deadlines and token budget, if any
+            cancel_token: The analysis' cancellation token, if any
+            callbacks: Extra handlers for every model request of the phase,
+                run after the budget check (e.g. a concurrency slot)
+            
+        Returns:
+            Dict containing the answer and the phase's token usage, latency and cost
+        """
+        role = role_for(phase)
+        if self.fast_model_name == self.model_name:
+            role = "strong"
+        try:
+            if role == "fast":
+                gathered = None
+                try:
+                    result, gathered = self._run_phase("fast", context_prefix, prompt, phase, budget=budget,
+                                                       cancel_token=cancel_token, callbacks=callbacks)
+                    if validate(phase, result["answer"]):
+                        return result
+                    reason = "answer failed validation"
+                except (BudgetExceeded, AnalysisCancelled):
+                    raise
+                except Exception as e:
+                    reason = f"fast model error: {str(e)}"
+                result, _ = self._run_phase("strong", context_prefix, prompt, phase, escalated=True, budget=budget,
+                                            cancel_token=cancel_token, gathered=gathered, callbacks=callbacks)
+                result["escalation_reason"] = reason
+                return result
+            return self._run_phase("strong", context_prefix, prompt, phase, budget=budget, cancel_token=cancel_token,
+                                   callbacks=callbacks)[0]
+            
+        except AnalysisCancelled as e:
+            return {
+                "success": False,
+                "error": f"Cancelled: {str(e)}",
+                "cancelled": True,
+                "question": prompt,
+                "phase": phase
+            }
+        except BudgetExceeded as e:
+            return {
+                "success": False,
+                "error": str(e),
+                "budget_exceeded": True,
+                "question": prompt,
+                "phase": phase
+            }
+        except Exception as e:
+            return {
+                "success": False,
+                "error": str(e),
+                "question": prompt,
+                "phase": phase
+            }
+    
+    def _limits(self, llm, context_prefix: str, prompt: str, phase: str,
+                budget: Optional[AnalysisBudget], cancel_token: Optional[CancellationToken]) -> Dict[str, Any]:
+        """Per-call bounds (deadline, max_tokens, cancel_token) for one model within the phase's budget."""
+        limits = {}
+        if budget is not None:
+            prompt_tokens = count_tokens(context_prefix) + count_tokens(prompt)
+            budget.check(phase, prompt_tokens + 200)
+            limits = {
+                "deadline": budget.deadline(phase),
+                "max_tokens": min(llm.max_tokens, budget.tokens_left(phase) - prompt_tokens)
+            }
+        if cancel_token is not None:
+            limits["cancel_token"] = cancel_token
+        return limits
+    
+    def _format_findings(self, steps) -> str:
+        """Render a tool loop's calls and observations for the model that writes the answer."""
+        if self.scratchpad is not None:
+            steps = self.scratchpad.compact_steps(steps)
+        return "\n\n".join(
+            f"{action.tool}({json.dumps(action.tool_input, default=str)}):\n{observation}"
+            for action, observation in steps
+        ) or "(no tools were called)"
+    
+    def _run_phase(self, role: str, context_prefix: str, prompt: str, phase: str,
+                   escalated: bool = False, budget: Optional[AnalysisBudget] = None,
+                   cancel_token: Optional[CancellationToken] = None,
+                   gathered: Optional[tuple] = None,
+                   callbacks: Optional[List[BaseCallbackHandler]] = None) -> tuple:
+        """
+        One phase, recorded in the phase statistics.
+        
+        The tool loop runs on the fast model. For the strong role, the strong
+        model then writes the answer in one call from the loop's tool results
+        and draft; ``gathered`` (a previous run's ``(draft, steps)``) skips
+        the loop, so an escalation does not repeat the fast attempt's tool calls.
+        
+        Returns:
+            (result dict, (draft, steps) of the tool loop)
+        """
+        model_name, llm = self.models[role]
+        loop_model, loop_llm = self.models["fast"]
+        if role == "strong" and loop_model == model_name:
+            loop_llm = llm
+        max_execution_time = float(os.getenv("AGENT_MAX_EXECUTION_TIME", "300"))
+        if budget is not None:
+            max_execution_time = min(max_execution_time, budget.remaining(phase))
+        loop_usage = PhaseUsageCallback(phase, budget)
+        answer_usage = PhaseUsageCallback(phase, budget)
+        callbacks = list(callbacks or [])
+        started = time.monotonic()
+        try:
+            if gathered is None:
+                limits = self._limits(loop_llm, context_prefix, prompt, phase, budget, cancel_token)
+                executor = AgentExecutor(
+                    agent=self._create_agent(loop_llm.bind(**limits).with_config(callbacks=[loop_usage, *callbacks])),
+                    tools=self.tools,
+                    max_iterations=10,
+                    max_execution_time=max_execution_time,
+                    handle_parsing_errors=True,
+                    return_intermediate_steps=True
+                )
+                result = executor.invoke({
+                    "input": prompt,
+                    "context": [build_context_message(CONTEXT_SYSTEM_PROMPT, context_prefix, loop_model)]
+                })
+                gathered = (result["output"], result.get("intermediate_steps", []))
+                self.iteration_stats.record(self.agent_mode, gathered[1], [tool.name for tool in self.tools])
+                if budget is not None and budget.remaining(phase) <= 0:
+                    # The loop stopped on its time limit rather than with an answer
+                    raise budget.record_overrun(phase, f"deadline reached after {len(gathered[1])} tool calls")
+            draft, steps = gathered
+            answer = draft
+            answered = time.monotonic()
+            if role == "strong" and loop_llm is not llm:
+                suffix = (
+                    f"{prompt}\n\nRepository tool results gathered for this step:\n{self._format_findings(steps)}"
+                    f"\n\nDraft answer from the tool-routing model (verify it against the context and "
+                    f"the tool results; do not copy its mistakes):\n{draft}"
+                )
+                limits = self._limits(llm, context_prefix, suffix, phase, budget, cancel_token)
+                response = llm.bind(**limits).invoke(
+                    build_cached_messages(CONTEXT_SYSTEM_PROMPT, context_prefix, suffix, model_name),
+                    config={"callbacks": [answer_usage, *callbacks]}
+                )
+                answer = response.content
+        except (AnalysisCancelled, BudgetExceeded):
+            raise
+        except Exception as e:
+            if budget is not None and budget.remaining(phase) <= 0:
+                raise budget.record_overrun(phase, f"deadline reached during the call ({str(e)})")
+            raise
+        finished = time.monotonic()
+        latency = finished - started
+        
+        usage = extract_usage(None)
+        costs = []
+        # The loop and the answer are recorded under the models that served them
+        for part, part_model, part_latency in ((loop_usage, model_name if loop_llm is llm else loop_model,
+                                                answered - started),
+                                               (answer_usage, model_name, finished - answered)):
+            if not part.calls:
+                continue
+            for key, value in part.usage.items():
+                usage[key] += value
+            self.phase_metrics.record(phase, part_model, part.usage, part_latency,
+                                      escalated and part_model == model_name)
+            costs.append(estimate_cost(part_model, part.usage))
+        self.prompt_cache_stats.record(phase, usage)
+        cost = round(sum(costs), 6) if costs and None not in costs else None
+        
+        return {
+            "success": True,
+            "question": prompt,
+            "answer": answer,
+            "model_used": model_name,
+            "phase": phase,
+            "usage": usage,
+            "llm_calls": loop_usage.calls + answer_usage.calls,
+            "tool_calls": len(steps),
+            "latency_s": round(latency, 3),
+            "cost_usd": cost,
+            "escalated": escalated
+        }, gathered
+    
     def compare_repositories(self, repo_urls: List[str]) -> Dict[str, Any]:
         """
         Compare multiple repositories.
@@ -228,7 +612,7 @@ Thought: {agent_scratchpad}"""
             Clean up all repositories after analysis.
             """
             
-            result = self.agent_executor.invoke({"input": input_text})
+            result = self._invoke(input_text)
             
             return {
                 "success": True,
@@ -274,7 +658,7 @@ Thought: {agent_scratchpad}"""
             Clean up the repository after analysis.
             """
             
-            result = self.agent_executor.invoke({"input": input_text})
+            result = self._invoke(input_text)
             
             return {
                 "success": True,
@@ -293,9 +677,7 @@ Thought: {agent_scratchpad}"""
     def cleanup_all_repositories(self) -> Dict[str, Any]:
         """Clean up all cloned repositories."""
         try:
-            result = self.agent_executor.invoke({
-                "input": "Please list all currently cloned repositories and then clean them all up."
-            })
+            result = self._invoke("Please list all currently cloned repositories and then clean them all up.")
             
             return {
                 "success": True,
@@ -0,0 +1,137 @@
+"""
+Rolling scratchpad compaction for long ReAct runs.
+
+The stock ReAct agent re-sends every Thought/Action/Observation on each
+iteration, so prompt size grows with every step. Once the scratchpad crosses
+a token threshold, older observations are replaced by one-line summaries
+that tell the agent how to fetch the data again; the most recent steps are
+always kept verbatim.
+"""
+
+import os
+import threading
+from typing import List, Tuple
+from langchain_core.agents import AgentAction
+from tools.observation_format import count_tokens
+
+OBSERVATION_PREFIX = "Observation: "
+LLM_PREFIX = "Thought: "
+
+
+def _tool_call(action: AgentAction) -> str:
+    tool_input = action.tool_input
+    if not isinstance(tool_input, str):
+        tool_input = ", ".join(f"{k}={v}" for k, v in dict(tool_input).items())
+    tool_input = " ".join(str(tool_input).split())
+    if len(tool_input) > 120:
+        tool_input = tool_input[:117] + "..."
+    return f"{action.tool}({tool_input})"
+
+
+def summarize_observation(action: AgentAction, observation: str, head_chars: int = 200) -> str:
+    """One-line stand-in for an observation that has been compacted."""
+    text = str(observation)
+    # Keep the header of compact observations (everything before a file body)
+    head = text.split("\n<<<", 1)[0]
+    head = " | ".join(line.strip() for line in head.splitlines() if line.strip())
+    if len(head) > head_chars:
+        head = head[:head_chars - 3] + "..."
+    lines = text.count("\n") + 1
+    return (
+        f"[compacted: {_tool_call(action)} returned {lines} lines (~{count_tokens(text)} tokens); "
+        f"summary: {head}; call the tool again if you need the full output]"
+    )
+
+
+class ScratchpadCompactor:
+    """
+    Formats intermediate steps into a scratchpad that stays under a token budget.
+
+    Args:
+        max_tokens: Scratchpad size that triggers compaction
+        keep_last: Number of most recent steps always kept verbatim
+    """
+
+    def __init__(self, max_tokens: int = None, keep_last: int = None):
+        self.max_tokens = max_tokens or int(os.getenv("SCRATCHPAD_MAX_TOKENS", "6000"))
+        self.keep_last = keep_last if keep_last is not None else int(os.getenv("SCRATCHPAD_KEEP_STEPS", "2"))
+        self._lock = threading.Lock()
+        self.history: List[dict] = []
+
+    @staticmethod
+    def _step(action: AgentAction, observation: str) -> str:
+        return f"{action.log}\n{OBSERVATION_PREFIX}{observation}\n{LLM_PREFIX}"
+
+    def format(self, intermediate_steps: List[Tuple[AgentAction, str]]) -> str:
+        """Build the agent_scratchpad string for the next iteration."""
+        steps = [self._step(action, observation) for action, observation in intermediate_steps]
+        full = "".join(steps)
+        full_tokens = count_tokens(full)
+        if full_tokens <= self.max_tokens or len(intermediate_steps) <= self.keep_last:
+            self._record(len(intermediate_steps), full_tokens, full_tokens, 0)
+            return full
+
+        split = len(intermediate_steps) - self.keep_last
+        recent = steps[split:]
+        budget = self.max_tokens - count_tokens("".join(recent))
+        older = []
+        compacted = 0
+        # Summarize older observations, newest first, until they fit
+        for action, observation in reversed(intermediate_steps[:split]):
+            summary = self._step(action, summarize_observation(action, observation))
+            budget -= count_tokens(summary)
+            if budget < 0 and older:
+                # Past the budget even when summarized: reduce to a bare reference
+                summary = f"(earlier step: {_tool_call(action)}, output compacted)\n{LLM_PREFIX}"
+            older.append(summary)
+            compacted += 1
+        scratchpad = "".join(reversed(older)) + "".join(recent)
+        self._record(len(intermediate_steps), full_tokens, count_tokens(scratchpad), compacted)
+        return scratchpad
+
+    def compact_steps(self, intermediate_steps: List[Tuple[AgentAction, str]]) -> List[Tuple[AgentAction, str]]:
+        """
+        Apply the same budget to message-based scratchpads (function-calling
+        agents): older observations are replaced by their summaries, and the
+        steps themselves are kept so tool calls and results stay paired.
+        """
+        observations = [str(observation) for _, observation in intermediate_steps]
+        full_tokens = sum(count_tokens(o) for o in observations)
+        if full_tokens <= self.max_tokens or len(intermediate_steps) <= self.keep_last:
+            self._record(len(intermediate_steps), full_tokens, full_tokens, 0)
+            return list(intermediate_steps)
+
+        split = len(intermediate_steps) - self.keep_last
+        recent = list(intermediate_steps[split:])
+        budget = self.max_tokens - sum(count_tokens(o) for o in observations[split:])
+        older = []
+        for action, observation in reversed(intermediate_steps[:split]):
+            summary = summarize_observation(action, observation)
+            budget -= count_tokens(summary)
+            if budget < 0 and older:
+                summary = f"(output of {_tool_call(action)} compacted)"
+            older.append((action, summary))
+        steps = list(reversed(older)) + recent
+        sent = sum(count_tokens(str(o)) for _, o in steps)
+        self._record(len(intermediate_steps), full_tokens, sent, split)
+        return steps
+
+    def _record(self, steps: int, full_tokens: int, sent_tokens: int, compacted: int) -> None:
+        with self._lock:
+            self.history.append({
+                "steps": steps,
+                "uncompacted_tokens": full_tokens,
+                "scratchpad_tokens": sent_tokens,
+                "compacted_steps": compacted
+            })
+            del self.history[:-100]
+
+    def stats(self) -> dict:
+        with self._lock:
+            history = list(self.history)
+        return {
+            "max_tokens": self.max_tokens,
+            "keep_last": self.keep_last,
+            "iterations": len(history),
+            "recent": history[-10:]
+        }
@@ -2,12 +2,27 @@
 """
 Interactive GitHub Repository Deployment Analyzer
 Usage: python analyze_repo.py <github_url>
+       python analyze_repo.py --batch FILE [--output results.jsonl] [--workers N] [--llm-concurrency M]
 """
 
 import sys
 import os
+import argparse
+import json
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime
 from dotenv import load_dotenv
+from langchain_core.callbacks import BaseCallbackHandler
+from agent.budget import AnalysisBudget, BudgetExceeded
 from agent.react_agent import GitHubRepoReActAgent
+from tools.assessment_archive import get_shared_assessment_archive
+from tools.repo_cloner import clean_unnecessary_files
+from tools.repo_context import KEY_FILES, build_context_prefix, format_file_summaries, render_structure, summarize_key_files
+from tools.snapshot import DiskSnapshot
+from tools.workspace import get_shared_workspace_registry
 
 
 def get_user_input(question):
@@ -212,15 +227,277 @@ def analyze_repo_interactive(github_url: str):
         print(f"❌ Error: {str(e)}")
         return False
 
+BATCH_INITIAL_PROMPT = """Analyze this repository for deployment feasibility.
+
+Identify deployment blockers: hardcoded localhost URLs, IPs, ports or file paths, development-only or
+missing production configuration, required environment variables and external services (databases,
+caches, queues), dependency problems and exposed secrets. List any information that is missing."""
+
+BATCH_FINAL_PROMPT = """PRELIMINARY ANALYSIS:
+{initial_analysis}
+
+This analysis runs unattended, so nobody can answer questions. Where information is missing, state the
+assumption you make instead of asking.
+
+Provide a SIMPLE final assessment:
+
+## CAN THIS REPOSITORY BE DEPLOYED?
+
+**ANSWER: YES/NO**
+
+**REASON:**
+- Brief explanation of the answer
+
+## DEPLOYMENT SETUP (only if deployable)
+Prerequisites, setup steps, required environment variables and the command to run the application."""
+
+
+def read_batch_targets(batch_file: str) -> list:
+    """Read repository URLs or local paths, one per line ('#' starts a comment)."""
+    targets = []
+    with open(batch_file, 'r', encoding='utf-8') as f:
+        for line in f:
+            target = line.split('#', 1)[0].strip()
+            if target and target not in targets:
+                targets.append(target)
+    return targets
+
+
+def load_completed_targets(output_path: str) -> set:
+    """
+    Targets that already have a successful result in ``output_path``.
+    
+    A line cut short by an interrupted run is dropped so the file stays valid
+    JSONL; failed targets are retried.
+    """
+    if not os.path.exists(output_path):
+        return set()
+    with open(output_path, 'rb') as f:
+        data = f.read()
+    if data and not data.endswith(b'\n'):
+        data = data[:data.rfind(b'\n') + 1]
+        with open(output_path, 'wb') as f:
+            f.write(data)
+    
+    completed = set()
+    for line in data.decode('utf-8', errors='replace').splitlines():
+        try:
+            record = json.loads(line)
+        except ValueError:
+            continue
+        if record.get('success'):
+            completed.add(record.get('target'))
+    return completed
+
+
+class LLMSlotCallback(BaseCallbackHandler):
+    """
+    Holds one of the batch's LLM slots for the duration of each model request.
+    
+    Tool execution and file reads between the requests of a tool loop run
+    without a slot, so other targets can use it meanwhile. Time spent waiting
+    for a slot is added to ``timing['llm_wait_s']``.
+    """
+    
+    def __init__(self, llm_slots, timing):
+        self.llm_slots = llm_slots
+        self.timing = timing
+        self._held = set()
+        self._lock = threading.Lock()
+    
+    def on_chat_model_start(self, serialized, messages, *, run_id, **kwargs) -> None:
+        wait_start = time.time()
+        self.llm_slots.acquire()
+        with self._lock:
+            self._held.add(run_id)
+            self.timing['llm_wait_s'] = round(self.timing.get('llm_wait_s', 0) + time.time() - wait_start, 3)
+    
+    def _release(self, run_id) -> None:
+        with self._lock:
+            if run_id not in self._held:
+                return
+            self._held.discard(run_id)
+        self.llm_slots.release()
+    
+    def on_llm_end(self, response, *, run_id, **kwargs) -> None:
+        self._release(run_id)
+    
+    def on_llm_error(self, error, *, run_id, **kwargs) -> None:
+        self._release(run_id)
+
+
+def _ask(agent, llm_slots, timing, context_prefix, prompt, phase, budget):
+    """Run one LLM phase under the global concurrency cap and the target's budget, recording wait and call time."""
+    call_start = time.time()
+    result = agent.ask_with_context(context_prefix, prompt, phase=phase, budget=budget,
+                                    callbacks=[LLMSlotCallback(llm_slots, timing)])
+    timing[f'{phase}_s'] = round(time.time() - call_start, 3)
+    if result.get("budget_exceeded"):
+        raise budget.exceeded
+    if not result.get("success"):
+        raise Exception(f"{phase.capitalize()} analysis failed: {result.get('error')}")
+    return result
+
+
+def analyze_batch_target(agent, target: str, llm_slots) -> dict:
+    """
+    Analyze one repository URL or local path without asking questions.
+    
+    When the preliminary analysis runs out of budget, the verdict is written
+    from the repository context alone and the record is marked partial.
+    
+    Returns:
+        JSON-serializable result record with per-phase timing
+    """
+    started = time.time()
+    timing = {}
+    record = {'target': target, 'success': False}
+    registry = get_shared_workspace_registry()
+    local_path = None
+    budget = AnalysisBudget()
+    try:
+        fetch_start = time.time()
+        if os.path.isdir(target):
+            snapshot = DiskSnapshot(os.path.abspath(target))
+        elif target.startswith('https://github.com/'):
+            budget.begin('clone')
+            workspace = registry.acquire(target, cleaner=clean_unnecessary_files, timeout=budget.remaining('clone'))
+            if "error" in workspace:
+                raise Exception(workspace["error"])
+            local_path = workspace["local_path"]
+            record['sha'] = workspace.get("sha")
+            record['skipped_files'] = workspace.get("skipped_files", [])
+            snapshot = registry.snapshot_for(local_path)
+        else:
+            raise Exception("Not a GitHub URL (https://github.com/...) or an existing directory")
+        timing['fetch_s'] = round(time.time() - fetch_start, 3)
+        
+        context_start = time.time()
+        file_summaries = summarize_key_files(snapshot, KEY_FILES)
+        context_prefix = build_context_prefix(
+            target,
+            render_structure(snapshot),
+            format_file_summaries(file_summaries),
+            skipped_files=record.get('skipped_files')
+        )
+        timing['context_s'] = round(time.time() - context_start, 3)
+        
+        try:
+            initial = _ask(agent, llm_slots, timing, context_prefix, BATCH_INITIAL_PROMPT, 'initial', budget)
+            initial_analysis = initial['answer']
+        except BudgetExceeded as e:
+            initial, initial_analysis = {}, None
+            record['partial'] = str(e)
+        final = _ask(agent, llm_slots, timing, context_prefix,
+                     BATCH_FINAL_PROMPT.format(
+                         initial_analysis=initial_analysis or "Not available: the preliminary analysis ran out of budget."
+                     ), 'final', budget)
+        
+        verdict = re.search(r'ANSWER:\W*(YES|NO)\b', final['answer'], re.IGNORECASE)
+        record.update({
+            'success': True,
+            'deployable': (verdict.group(1).upper() == 'YES') if verdict else None,
+            'final_assessment': final['answer'],
+            'initial_analysis': initial_analysis,
+            'model_used': final.get('model_used'),
+            'phases': {
+                phase: {key: result.get(key) for key in ('model_used', 'usage', 'latency_s', 'cost_usd', 'escalated')}
+                for phase, result in (('initial', initial), ('final', final))
+            }
+        })
+        try:
+            record['assessment_id'] = get_shared_assessment_archive().add(
+                target, final['answer'], sha=record.get('sha'), file_names=list(file_summaries),
+                partial=bool(record.get('partial')), source='batch'
+            )
+        except Exception as e:
+            print(f"⚠️ Could not archive the assessment of {target}: {e}")
+    except Exception as e:
+        record['error'] = str(e)
+    finally:
+        if local_path:
+            registry.release_path(local_path)
+    
+    timing['total_s'] = round(time.time() - started, 3)
+    record['timing'] = timing
+    record['budget'] = budget.snapshot()
+    record['finished_at'] = datetime.now().isoformat()
+    return record
+
+
+def analyze_repo_batch(batch_file: str, output_path: str, workers: int, llm_concurrency: int) -> bool:
+    """
+    Analyze every target in ``batch_file`` concurrently and append one JSON
+    line per target to ``output_path`` as each finishes.
+    
+    Targets that already have a successful line in ``output_path`` are
+    skipped, so an interrupted run can be restarted with the same arguments.
+    
+    Args:
+        batch_file: File with one GitHub URL or local path per line
+        output_path: JSONL results file (appended to)
+        workers: Repositories analyzed at the same time
+        llm_concurrency: LLM calls in flight at the same time, across all workers
+    """
+    load_dotenv()
+    
+    api_key = os.getenv("OPENROUTER_API_KEY")
+    if not api_key:
+        print("❌ Error: OPENROUTER_API_KEY not found in environment variables.")
+        print("Please add your API key to the .env file.")
+        return False
+    
+    targets = read_batch_targets(batch_file)
+    completed = load_completed_targets(output_path)
+    pending = [t for t in targets if t not in completed]
+    print(f"📋 {len(targets)} targets, {len(targets) - len(pending)} already done, {len(pending)} to analyze")
+    if not pending:
+        return True
+    
+    agent = GitHubRepoReActAgent(api_key)
+    llm_slots = threading.BoundedSemaphore(llm_concurrency)
+    failures = 0
+    
+    with open(output_path, 'a', encoding='utf-8') as output, ThreadPoolExecutor(max_workers=workers) as pool:
+        futures = {pool.submit(analyze_batch_target, agent, target, llm_slots): target for target in pending}
+        for done, future in enumerate(as_completed(futures), 1):
+            record = future.result()
+            output.write(json.dumps(record) + "\n")
+            output.flush()
+            if record['success']:
+                print(f"✅ [{done}/{len(pending)}] {record['target']} ({record['timing']['total_s']:.1f}s)")
+            else:
+                failures += 1
+                print(f"❌ [{done}/{len(pending)}] {record['target']}: {record['error']}")
+    
+    print(f"🏁 Batch finished: {len(pending) - failures} succeeded, {failures} failed -> {output_path}")
+    return failures == 0
+
 
 def main():
     """Main function."""
-    if len(sys.argv) != 2:
-        print("Usage: python analyze_repo.py <github_url>")
-        print("Example: python analyze_repo.py https://github.com/user/repo")
+    parser = argparse.ArgumentParser(
+        description="GitHub Repository Deployment Analyzer",
+        epilog="Example: python analyze_repo.py https://github.com/user/repo"
+    )
+    parser.add_argument('github_url', nargs='?', help='Repository to analyze interactively')
+    parser.add_argument('--batch', metavar='FILE', help='Analyze every URL or local path in FILE without questions')
+    parser.add_argument('--output', default='batch_results.jsonl', help='JSONL results file for --batch (resumable)')
+    parser.add_argument('--workers', type=int, default=int(os.getenv('BATCH_WORKERS', '8')),
+                        help='Repositories analyzed concurrently')
+    parser.add_argument('--llm-concurrency', type=int, default=int(os.getenv('BATCH_LLM_CONCURRENCY', '4')),
+                        help='Maximum LLM calls in flight across all workers')
+    args = parser.parse_args()
+    
+    if args.batch:
+        success = analyze_repo_batch(args.batch, args.output, max(args.workers, 1), max(args.llm_concurrency, 1))
+        sys.exit(0 if success else 1)
+    
+    if not args.github_url:
+        parser.print_usage()
         sys.exit(1)
     
-    github_url = sys.argv[1].strip()
+    github_url = args.github_url.strip()
     
     # Validate URL
     if not github_url.startswith('https://github.com/'):
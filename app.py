@@ -5,13 +5,44 @@ Simple deployability check with clear yes/no answers
 """
 
 import os
+from dotenv import load_dotenv
+
+# Load environment variables
+load_dotenv()
+
+# Greenlet serving mode: sockets and timers become cooperative, so an idle
+# connection costs a greenlet instead of a thread. Threads and subprocess stay
+# native because clone, scan and LLM work (git runs included) happens on the
+# analysis executor; under gevent os and signal stay native as well, since its
+# patched os.close defers closing to the hub and stalls native subprocess
+# spawns. The LLM client's transport is imported first: httpcore
+# pulls in trio when it is installed, and trio cannot be imported once select
+# and socket are patched.
+ASYNC_MODE = os.getenv('SOCKETIO_ASYNC_MODE', 'threading')
+if ASYNC_MODE == 'eventlet':
+    import httpcore  # noqa: F401
+    import eventlet
+    eventlet.monkey_patch(thread=False, subprocess=False)
+elif ASYNC_MODE == 'gevent':
+    import httpcore  # noqa: F401
+    from gevent import monkey
+    monkey.patch_all(thread=False, subprocess=False, os=False, signal=False)
+
 import json
+import hashlib
+import hmac
+import secrets
+import gzip
+import uuid
 import asyncio
 import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
-from flask import Flask, render_template, request, jsonify
-from flask_socketio import SocketIO, emit
-from dotenv import load_dotenv
+from flask import Flask, render_template, request, jsonify, make_response
+from flask_socketio import SocketIO, emit, join_room
+from agent.budget import AnalysisBudget, BudgetExceeded
+from agent.rate_limiter import get_shared_rate_limiter
 from agent.react_agent import GitHubRepoReActAgent
 import random
 import string
@@ -24,21 +55,81 @@ from langchain.agents import create_react_agent, AgentExecutor
 from langchain.tools import Tool
 from langchain_core.prompts import PromptTemplate
 from langchain.memory import ConversationBufferMemory
+from tools.cancellation import AnalysisCancelled, CancellationToken, check_cancelled
+from tools.analysis_store import env_fingerprint, get_shared_analysis_store
+from tools.assessment_archive import get_shared_assessment_archive
+from tools.event_stream import EventStream, LoopBridge
+from tools.git_object_store import get_shared_object_store
+from tools.ignore_rules import is_ignored
+from tools.observation_format import observation_stats
+from tools.repo_context import (
+    KEY_FILES,
+    build_context_prefix,
+    build_file_index,
+    format_file_summaries,
+    render_structure,
+    summarize_key_files
+)
+from tools.watchlist import Watchlist
+from tools.repo_cloner import clean_unnecessary_files
+from tools.workspace import authenticated_url, get_shared_workspace_registry, normalize_repo_url, resolve_head_sha
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-# Load environment variables
-load_dotenv()
-
 app = Flask(__name__)
 app.config['SECRET_KEY'] = os.getenv('SECRET_KEY', 'dev-secret-key-change-in-production')
-socketio = SocketIO(app, cors_allowed_origins="*")
+# Long-polling responses are compressed; websocket payloads are deflated per field by the event stream
+socketio = SocketIO(
+    app,
+    async_mode=ASYNC_MODE,
+    cors_allowed_origins="*",
+    http_compression=True,
+    compression_threshold=int(os.getenv('SOCKETIO_COMPRESSION_THRESHOLD', '1024'))
+)
+
+# Blocking analysis work (clone, scan, LLM calls) runs on native threads, off the event loop
+ANALYSIS_WORKERS = int(os.getenv('ANALYSIS_WORKERS', '16'))
+analysis_executor = ThreadPoolExecutor(max_workers=ANALYSIS_WORKERS, thread_name_prefix='analysis')
+
+
+def deliver_batch(room, batch):
+    socketio.emit('analysis_batch', batch, room=room)
+
+
+# Analysis updates are coalesced per session and kept for replay after a reconnect
+if ASYNC_MODE == 'threading':
+    loop_bridge = None
+    event_stream = EventStream(deliver_batch, spawn=socketio.start_background_task, sleep=socketio.sleep)
+else:
+    # Workers are native threads: their socket writes and timers are handed to the event loop
+    loop_bridge = LoopBridge(socketio.start_background_task)
+    loop_bridge.start()
+    event_stream = EventStream(
+        lambda room, batch: loop_bridge.call(deliver_batch, room, batch),
+        spawn=lambda fn: loop_bridge.call(socketio.start_background_task, fn),
+        sleep=socketio.sleep
+    )
+
+
+def run_blocking(fn, *args):
+    """Run blocking analysis work on the analysis executor."""
+    return analysis_executor.submit(fn, *args)
 
 # Global variables for analysis state
 analysis_sessions = {}
 agent_instance = None
+workspace_registry = get_shared_workspace_registry()
+analysis_store = get_shared_analysis_store()
+assessment_archive = get_shared_assessment_archive()
+interactive_analyses = 0
+interactive_lock = threading.Lock()
+# Reconnected socket id -> the session id it resumed
+session_aliases = {}
+# REST analysis jobs (job id -> metadata); their state lives in analysis_sessions
+analysis_jobs = {}
+analysis_jobs_lock = threading.Lock()
 
 
 def initialize_agent():
@@ -51,112 +142,86 @@ def initialize_agent():
     return False
 
 
-def clone_repository_with_auth(github_url, github_token=None):
-    """Clone a GitHub repository with optional authentication."""
+def clone_repository_with_auth(github_url, github_token=None, fetch_strategy=None, timeout=60, cancel_token=None):
+    """Clone a GitHub repository with optional authentication.
+
+    Checkouts come from the shared workspace registry, so concurrent analyses
+    of the same repository and commit reuse one read-only clone. When history
+    is not needed the snapshot is streamed from the archive endpoint instead
+    of cloned (``fetch_strategy`` or FETCH_STRATEGY can force either path).
+    Cancelling ``cancel_token`` kills the clone and raises AnalysisCancelled.
+    """
     try:
-        # Generate a unique local path
-        repo_name = github_url.split('/')[-1].replace('.git', '')
-        random_id = ''.join(random.choices(string.ascii_lowercase + string.digits, k=8))
-        local_path = os.path.join(tempfile.gettempdir(), f"{repo_name}_{random_id}")
+        clone_url = authenticated_url(github_url, github_token)
         
-        if github_token:
-            # Convert GitHub URL to authenticated URL
-            if github_url.startswith('https://github.com/'):
-                auth_url = github_url.replace('https://github.com/', f'https://{github_token}@github.com/')
-            else:
-                auth_url = github_url
-            
-            # Clone with authentication
-            result = subprocess.run(
-                ['git', 'clone', auth_url, local_path],
-                capture_output=True,
-                text=True,
-                timeout=60
-            )
-        else:
-            # Clone public repository
-            result = subprocess.run(
-                ['git', 'clone', github_url, local_path],
-                capture_output=True,
-                text=True,
-                timeout=60
-            )
+        workspace = workspace_registry.acquire(
+            github_url,
+            clone_url=clone_url,
+            cleaner=clean_unnecessary_files,
+            timeout=timeout,
+            strategy=fetch_strategy,
+            github_token=github_token,
+            cancel_token=cancel_token
+        )
         
-        if result.returncode == 0:
-            logger.info(f"Successfully cloned repository to {local_path}")
+        if "success" in workspace:
+            local_path = workspace["local_path"]
+            logger.info(
+                f"{'Reusing shared' if workspace['shared'] else 'Fetched'} checkout "
+                f"{workspace['workspace_key']} via {workspace['strategy']} at {local_path}"
+            )
             return local_path
         else:
-            logger.error(f"Failed to clone repository: {result.stderr}")
+            logger.error(f"Failed to clone repository: {workspace['error']}")
             return None
             
-    except subprocess.TimeoutExpired:
-        logger.error("Repository cloning timed out")
-        return None
+    except AnalysisCancelled:
+        raise
     except Exception as e:
         logger.error(f"Error cloning repository: {str(e)}")
         return None
 
 
 def get_repository_structure(local_path):
-    """Get the structure of the repository."""
+    """Get the structure of the repository (computed once per shared checkout)."""
+    return workspace_registry.cached(local_path, 'structure', lambda: _scan_repository_structure(local_path))
+
+
+def _scan_repository_structure(local_path):
+    """Walk the repository and render its structure."""
     try:
-        structure = []
-        for root, dirs, files in os.walk(local_path):
-            # Skip .git directory
-            if '.git' in dirs:
-                dirs.remove('.git')
-            
-            level = root.replace(local_path, '').count(os.sep)
-            indent = ' ' * 2 * level
-            rel_path = os.path.relpath(root, local_path)
-            if rel_path != '.':
-                structure.append(f"{indent}{os.path.basename(root)}/")
-            
-            subindent = ' ' * 2 * (level + 1)
-            for file in files[:10]:  # Limit files per directory
-                structure.append(f"{subindent}{file}")
-            
-            if len(files) > 10:
-                structure.append(f"{subindent}... and {len(files) - 10} more files")
-        
-        return '\n'.join(structure[:100])  # Limit total lines
+        return render_structure(workspace_registry.snapshot_for(local_path))
     except Exception as e:
         logger.error(f"Error getting repository structure: {str(e)}")
         return "Error reading repository structure"
 
 
 def get_repository_content(local_path):
-    """Get key content from the repository."""
+    """Get key content from the repository (computed once per shared checkout)."""
+    return format_file_summaries(get_file_summaries(local_path))
+
+
+def get_file_summaries(local_path):
+    """Per-file excerpts of the key files (computed once per shared checkout)."""
+    return workspace_registry.cached(local_path, 'file_summaries', lambda: _scan_repository_content(local_path))
+
+
+def _scan_repository_content(local_path):
+    """Read the key files of the repository."""
     try:
-        content_summary = []
-        
-        # Key files to analyze
-        key_files = [
-            'package.json', 'requirements.txt', 'Dockerfile', 'docker-compose.yml',
-            'app.py', 'main.py', 'index.js', 'server.js', 'app.js',
-            'README.md', '.env.example', 'config.py', 'settings.py'
-        ]
-        
-        for file_name in key_files:
-            file_path = os.path.join(local_path, file_name)
-            if os.path.exists(file_path):
-                try:
-                    with open(file_path, 'r', encoding='utf-8') as f:
-                        content = f.read()[:2000]  # Limit content size
-                        content_summary.append(f"\n--- {file_name} ---\n{content}")
-                except Exception as e:
-                    content_summary.append(f"\n--- {file_name} ---\nError reading file: {str(e)}")
-        
-        return '\n'.join(content_summary)
+        return summarize_key_files(workspace_registry.snapshot_for(local_path), KEY_FILES)
     except Exception as e:
         logger.error(f"Error getting repository content: {str(e)}")
-        return "Error reading repository content"
+        return {}
 
 
 def cleanup_repository(local_path):
-    """Clean up the cloned repository."""
+    """Release the cloned repository; the last holder removes the checkout."""
     try:
-        if local_path and os.path.exists(local_path):
+        result = workspace_registry.release_path(local_path)
+        if result.get("removed"):
+            logger.info(f"Cleaned up repository at {local_path}")
+        elif "error" in result and local_path and os.path.exists(local_path):
             shutil.rmtree(local_path)
             logger.info(f"Cleaned up repository at {local_path}")
     except Exception as e:
@@ -184,15 +249,79 @@ def should_ask_questions(analysis_result, user_env_vars):
     return needs_questions
 
 
+def record_prompt_usage(session_id, phase, response):
+    """Store a phase's token usage (cached/uncached), model, latency and cost on its session."""
+    usage = response.get("usage")
+    if usage is None:
+        return None
+    usage = {
+        **usage,
+        'model': response.get('model_used'),
+        'latency_s': response.get('latency_s'),
+        'cost_usd': response.get('cost_usd'),
+        'escalated': response.get('escalated', False)
+    }
+    if session_id in analysis_sessions:
+        analysis_sessions[session_id].setdefault('prompt_usage', {})[phase] = usage
+    return usage
+
+
+def session_key():
+    """Session id of the current socket, following a resumed session."""
+    return session_aliases.get(request.sid, request.sid)
+
+
 def emit_status(session_id, status, message, data=None):
-    """Emit status updates to the frontend."""
-    socketio.emit('analysis_update', {
+    """Emit status updates to the frontend (coalesced, see tools.event_stream)."""
+    event_stream.publish(session_id, {
         'session_id': session_id,
         'status': status,
         'message': message,
         'data': data,
         'timestamp': datetime.now().isoformat()
-    }, room=session_id)
+    })
+
+
+def ask_phase(context_prefix, prompt, phase, budget, cancel_token):
+    """
+    Run an LLM phase within the analysis's own budget and cancellation token.
+    
+    Both are passed by the pipeline that owns them rather than looked up by
+    session id, so a session that was dropped or replaced meanwhile cannot
+    lend the call someone else's limits.
+    
+    Raises BudgetExceeded when the budget runs out, and AnalysisCancelled when
+    the analysis was cancelled.
+    """
+    check_cancelled(cancel_token)
+    response = agent_instance.ask_with_context(
+        context_prefix, prompt, phase=phase, budget=budget, cancel_token=cancel_token
+    )
+    if response.get('cancelled'):
+        raise AnalysisCancelled(cancel_token.reason if cancel_token else 'cancelled')
+    if response.get('budget_exceeded'):
+        raise budget.exceeded
+    return response
+
+
+def cancel_analysis(session_id, reason):
+    """
+    Cancel a session's analysis and drop the session.
+    
+    The running pipeline sees the cancelled token: the clone subprocess is
+    killed, the in-flight LLM request is aborted, and the pipeline unwinds,
+    releasing its workspace and job slot.
+    
+    Returns:
+        True if there was a session to cancel
+    """
+    session = analysis_sessions.pop(session_id, None)
+    if session is None:
+        return False
+    if session.get('cancel_token'):
+        session['cancel_token'].cancel(reason)
+    logger.info(f"Analysis {session_id} cancelled: {reason}")
+    return True
 
 
 def run_analysis_phase(session_id, github_url, phase, prompt, phase_name):
@@ -218,8 +347,225 @@ def run_analysis_phase(session_id, github_url, phase, prompt, phase_name):
         return None
 
 
-def analyze_repository_async(github_url, session_id, user_env_vars=None, github_token=None):
-    """Analyze repository asynchronously with optional GitHub token for private repos"""
+def archive_assessment(session_id):
+    """Add the session's final assessment to the searchable archive."""
+    session = analysis_sessions.get(session_id)
+    if not session or not session.get('final_assessment'):
+        return
+    final_assessment = session['final_assessment']
+    # User-provided values (secrets included) are echoed in the setup section; keep only the names
+    for value in (session.get('user_env_vars') or {}).values():
+        if value and len(str(value)) >= 4:
+            final_assessment = final_assessment.replace(str(value), '***')
+    artifacts = session.get('artifacts') or {}
+    if session_id in analysis_jobs:
+        source = 'api'
+    elif session_id.startswith('watchlist:'):
+        source = 'watchlist'
+    else:
+        source = 'web'
+    try:
+        assessment_archive.add(
+            session['github_url'],
+            final_assessment,
+            sha=artifacts.get('sha'),
+            file_names=list(artifacts.get('file_index') or artifacts.get('file_summaries') or []),
+            partial=session.get('partial', False),
+            source=source,
+            env_vars=session.get('user_env_vars')
+        )
+    except Exception as e:
+        logger.error(f"Error archiving assessment: {str(e)}")
+
+
+def store_analysis(session_id):
+    """
+    Archive the session's assessment and keep its artifacts so the next
+    analysis of a newer commit can be incremental.
+    """
+    archive_assessment(session_id)
+    session = analysis_sessions.get(session_id)
+    artifacts = (session or {}).get('artifacts')
+    # Partial verdicts are never reused
+    if not artifacts or not artifacts.get('sha') or not session.get('final_assessment') or session.get('partial'):
+        return
+    try:
+        analysis_store.save(session['github_url'], artifacts['sha'], {
+            'structure': artifacts.get('structure'),
+            'file_summaries': artifacts.get('file_summaries', {}),
+            'file_index': artifacts.get('file_index', {}),
+            'based_on': artifacts.get('based_on'),
+            'env_fingerprint': env_fingerprint(session.get('user_env_vars')),
+            'initial_analysis': session.get('initial_analysis'),
+            'user_responses': session.get('user_responses', []),
+            'final_assessment': session['final_assessment']
+        })
+    except Exception as e:
+        logger.error(f"Error storing analysis artifacts: {str(e)}")
+
+
+def incremental_reanalysis(session_id, github_url, user_env_vars=None, github_token=None, budget=None,
+                           cancel_token=None):
+    """
+    Update the last stored verdict for this repository instead of re-running
+    the full analysis.
+    
+    The previous commit's artifacts are diffed against the new HEAD in the
+    object store (trees only), only the structure and key-file excerpts that
+    the changed paths touch are recomputed, and a short LLM delta pass
+    revises the prior verdict. Returns False when there is nothing to build
+    on (no prior analysis with the same environment variables, or a diff
+    larger than INCREMENTAL_MAX_CHANGED_FILES), so the caller runs the full
+    analysis.
+    
+    The store is shared by every user, so only verdicts that no user's
+    answers went into are built on, and only after this user's own URL
+    resolved HEAD. The git work runs in the 'clone' phase of ``budget`` and
+    is killed when ``cancel_token`` is cancelled.
+    """
+    if os.getenv("INCREMENTAL_ANALYSIS", "1") == "0":
+        return False
+    prior = analysis_store.latest(github_url, env_fingerprint(user_env_vars), without_answers=True)
+    if not prior or not prior.get('final_assessment'):
+        return False
+    
+    def git_timeout():
+        check_cancelled(cancel_token)
+        if budget is None:
+            return 300
+        budget.check('clone', 0)
+        return min(300, budget.remaining('clone'))
+    
+    if budget is not None:
+        budget.begin('clone')
+    clone_url = authenticated_url(github_url, github_token)
+    head_sha = resolve_head_sha(clone_url, timeout=min(30, git_timeout()), cancel_token=cancel_token)
+    if not head_sha:
+        return False
+    
+    session = analysis_sessions[session_id]
+    if head_sha == prior['sha']:
+        session.update({
+            'initial_analysis': prior.get('initial_analysis'),
+            'final_assessment': prior['final_assessment'],
+            'status': 'completed',
+            'end_time': datetime.now()
+        })
+        emit_status(session_id, 'completed', '🎉 No new commits - reusing the previous assessment', {
+            'final_assessment': prior['final_assessment'],
+            'incremental': {'base_sha': prior['sha'], 'head_sha': head_sha, 'changed_files': 0}
+        })
+        return True
+    
+    repo = normalize_repo_url(github_url)
+    object_store = get_shared_object_store()
+    try:
+        changes = [
+            c for c in object_store.diff(repo, clone_url, prior['sha'], head_sha, git_timeout(), cancel_token)
+            if not is_ignored(c['path'])
+        ]
+    except (AnalysisCancelled, BudgetExceeded):
+        raise
+    except Exception as e:
+        if budget is not None and budget.remaining('clone') <= 0:
+            raise budget.record_overrun('clone', f"deadline reached during the incremental diff ({str(e)})")
+        logger.warning(f"Incremental diff failed, running full analysis: {str(e)}")
+        return False
+    if len(changes) > int(os.getenv("INCREMENTAL_MAX_CHANGED_FILES", "200")):
+        return False
+    
+    emit_status(session_id, 'processing',
+                f'🔄 Updating the analysis of {prior["sha"][:8]} with {len(changes)} changed files...')
+    
+    # Recompute only what the changed paths affect
+    file_index = dict(prior.get('file_index') or {})
+    file_summaries = dict(prior.get('file_summaries') or {})
+    structure = prior.get('structure') or ''
+    changed_key_files = set()
+    structural = False
+    snapshot = None
+    for change in changes:
+        if change['status'] == 'D':
+            file_index.pop(change['path'], None)
+            file_summaries.pop(change['path'], None)
+        if change['status'] in ('A', 'D'):
+            structural = True
+        if change['status'] != 'D' and change['path'] in KEY_FILES:
+            changed_key_files.add(change['path'])
+    
+    live_changes = [c['path'] for c in changes if c['status'] != 'D']
+    if live_changes or structural:
+        snapshot = object_store.snapshot(repo, clone_url, head_sha, git_timeout(), cancel_token)
+        for path in live_changes:
+            if snapshot.isfile(path):
+                file_index[path] = snapshot.getsize(path)
+        if structural:
+            structure = render_structure(snapshot)
+        file_summaries.update(summarize_key_files(snapshot, sorted(changed_key_files)))
+    
+    change_lines = [f"{c['status']} {c['path']}" for c in changes]
+    updated_excerpts = format_file_summaries(
+        {name: file_summaries[name] for name in changed_key_files if name in file_summaries}
+    )
+    delta_prompt = f"""The repository {github_url} was assessed at commit {prior['sha']}. It has since moved to commit {head_sha}.
+
+PREVIOUS ASSESSMENT:
+{prior['final_assessment']}
+
+CHANGED FILES ({len(changes)}):
+{chr(10).join(change_lines[:100])}{chr(10) + f"... and {len(change_lines) - 100} more" if len(change_lines) > 100 else ""}
+
+UPDATED KEY FILES:
+{updated_excerpts or "None of the key files changed."}
+
+Update the previous assessment for the new commit. Keep everything that the changes do not affect, revise the YES/NO answer only if the changes warrant it, and use the same format as the previous assessment. Start with a one-line note on what changed."""
+    
+    context_prefix = build_context_prefix(github_url, user_env_vars=user_env_vars)
+    # Out of budget, the previous verdict is the best evidence there is
+    session['prior_assessment'] = {'sha': prior['sha'], 'final_assessment': prior['final_assessment']}
+    response = ask_phase(context_prefix, delta_prompt, 'delta', budget, cancel_token)
+    if not response.get("success"):
+        logger.warning(f"Delta pass failed, running full analysis: {response.get('error')}")
+        return False
+    
+    final_assessment = response["answer"]
+    session.update({
+        'initial_analysis': prior.get('initial_analysis'),
+        'user_responses': [],
+        'final_assessment': final_assessment,
+        'status': 'completed',
+        'end_time': datetime.now(),
+        'artifacts': {
+            'sha': head_sha,
+            'based_on': prior['sha'],
+            'structure': structure,
+            'file_summaries': file_summaries,
+            'file_index': file_index
+        }
+    })
+    record_prompt_usage(session_id, 'delta', response)
+    store_analysis(session_id)
+    
+    emit_status(session_id, 'completed', '🎉 Analysis updated!', {
+        'final_assessment': final_assessment,
+        'user_env_vars': user_env_vars,
+        'prompt_usage': session.get('prompt_usage', {}),
+        'incremental': {'base_sha': prior['sha'], 'head_sha': head_sha, 'changed_files': len(changes)}
+    })
+    return True
+
+
+def analyze_repository_async(github_url, session_id, user_env_vars=None, github_token=None, incremental=True,
+                             interactive=True, resume_token=None):
+    """Analyze repository asynchronously with optional GitHub token for private repos
+
+    Non-interactive runs (watchlist precomputation) never stop for questions
+    and do not hold back the background refresh lane. ``resume_token`` is
+    the secret a reconnecting client must present to rejoin the session.
+    """
+    if interactive:
+        _track_interactive(1)
+    cancel_token = CancellationToken()
     try:
         # Initialize analysis session
         analysis_sessions[session_id] = {
@@ -227,61 +573,83 @@ def analyze_repository_async(github_url, session_id, user_env_vars=None, github_
             'status': 'started',
             'start_time': datetime.now(),
             'user_env_vars': user_env_vars or {},
-            'github_token': github_token  # Store token for repository access
+            'github_token': github_token,  # Store token for repository access
+            'budget': AnalysisBudget(),
+            'cancel_token': cancel_token,
+            'resume_token': resume_token
         }
+        budget = analysis_sessions[session_id]['budget']
+        
+        # Build on the last stored analysis when only a few files changed
+        if incremental and incremental_reanalysis(session_id, github_url, user_env_vars, github_token, budget, cancel_token):
+            return
         
         # Emit start event
-        socketio.emit('analysis_update', {
+        event_stream.publish(session_id, {
             'status': 'started',
             'message': 'Starting repository analysis...',
             'timestamp': datetime.now().isoformat()
-        }, room=session_id)
-        
-        # Prepare context for user-provided environment variables
-        env_vars_context = ""
-        if user_env_vars:
-            env_vars_list = [f"- {key}={value}" for key, value in user_env_vars.items()]
-            env_vars_context = f"""
-USER PROVIDED ENVIRONMENT VARIABLES:
-{chr(10).join(env_vars_list)}
-
-These environment variables should be considered when analyzing deployment feasibility.
-"""
+        })
         
         # Clone repository with authentication if token provided
-        local_path = clone_repository_with_auth(github_url, github_token)
+        budget.begin('clone')
+        local_path = clone_repository_with_auth(
+            github_url, github_token, timeout=budget.remaining('clone'), cancel_token=cancel_token
+        )
         
         if not local_path:
+            budget.check('clone', 0)
             raise Exception("Failed to clone repository")
         
         try:
+            cancel_token.raise_if_cancelled()
+            
             # Get repository structure and content
+            budget.begin('scan')
+            
+            def scan_check():
+                # Stops a long walk as soon as the analysis is cancelled or out of time
+                cancel_token.raise_if_cancelled()
+                budget.check('scan', 0)
+            
             repo_structure = get_repository_structure(local_path)
-            repo_content = get_repository_content(local_path)
+            file_summaries = get_file_summaries(local_path)
+            repo_content = format_file_summaries(file_summaries)
             
-            # Create comprehensive analysis context
-            analysis_context = f"""
-REPOSITORY: {github_url}
-STRUCTURE:
-{repo_structure}
-
-CONTENT ANALYSIS:
-{repo_content}
-
-{env_vars_context}
-"""
+            # Artifacts kept per commit for later incremental re-analysis
+            workspace = workspace_registry.get_by_path(local_path)
+            skipped_files = workspace.skipped_files if workspace else []
+            analysis_sessions[session_id]['artifacts'] = {
+                'sha': workspace.sha if workspace else None,
+                'skipped_files': skipped_files,
+                'structure': repo_structure,
+                'file_summaries': file_summaries,
+                'file_index': workspace_registry.cached(
+                    local_path, 'file_index',
+                    lambda: build_file_index(workspace_registry.snapshot_for(local_path), check=scan_check)
+                )
+            }
+            
+            # Shared, byte-stable context; each phase only appends its own instructions
+            context_prefix = build_context_prefix(github_url, repo_structure, repo_content, user_env_vars,
+                                                  skipped_files)
+            analysis_sessions[session_id]['context_prefix'] = context_prefix
+            if skipped_files:
+                emit_status(session_id, 'processing',
+                            f'⚠️ {len(skipped_files)} files over the archive size cap were not downloaded',
+                            {'skipped_files': skipped_files})
+            cancel_token.raise_if_cancelled()
+            budget.check('scan', 0)
             
             # Perform initial analysis
-            socketio.emit('analysis_update', {
+            event_stream.publish(session_id, {
                 'status': 'processing',
                 'message': 'Analyzing repository structure and dependencies...',
                 'timestamp': datetime.now().isoformat()
-            }, room=session_id)
+            })
             
             initial_prompt = f"""Analyze this GitHub repository for deployment feasibility: {github_url}
 
-{env_vars_context}
-
 Focus on critical deployment blockers. Give a preliminary assessment and identify if any essential information is missing that would prevent giving a definitive YES/NO answer.
 
 Consider these factors:
@@ -291,13 +659,9 @@ Consider these factors:
 - Hardcoded values that prevent deployment
 - Missing essential configurations not provided by user
 
-Provide a structured analysis with clear reasoning.
-
-REPOSITORY ANALYSIS:
-{analysis_context}
-"""
+Provide a structured analysis with clear reasoning."""
             
-            initial_response = agent_instance.ask_question(initial_prompt)
+            initial_response = ask_phase(context_prefix, initial_prompt, 'initial', budget, cancel_token)
             
             if not initial_response.get("success"):
                 raise Exception(f"Initial analysis failed: {initial_response.get('error')}")
@@ -306,27 +670,27 @@ REPOSITORY ANALYSIS:
             
             # Store initial analysis
             analysis_sessions[session_id]['initial_analysis'] = initial_result
+            initial_usage = record_prompt_usage(session_id, 'initial', initial_response)
             
             # Emit phase complete
-            socketio.emit('analysis_update', {
+            event_stream.publish(session_id, {
                 'status': 'phase_complete',
                 'data': {
                     'phase': 'initial',
-                    'result': initial_result
+                    'result': initial_result,
+                    'prompt_usage': initial_usage
                 },
                 'message': 'Initial analysis complete',
                 'timestamp': datetime.now().isoformat()
-            }, room=session_id)
+            })
             
             # Check if we need to ask questions
-            if should_ask_questions(initial_result, user_env_vars):
+            if interactive and should_ask_questions(initial_result, user_env_vars):
                 # Generate minimal questions
-                questions_prompt = f"""Based on this analysis, generate ONLY the most critical questions (maximum 3) needed to determine deployment feasibility:
-
+                questions_prompt = f"""PRELIMINARY ANALYSIS:
 {initial_result}
 
-USER PROVIDED ENVIRONMENT VARIABLES:
-{env_vars_context}
+Based on this analysis, generate ONLY the most critical questions (maximum 3) needed to determine deployment feasibility.
 
 Only ask about information that is:
 1. Absolutely essential for deployment
@@ -335,7 +699,7 @@ Only ask about information that is:
 
 Format as numbered questions."""
                 
-                questions_response = agent_instance.ask_question(questions_prompt)
+                questions_response = ask_phase(context_prefix, questions_prompt, 'questions', budget, cancel_token)
                 
                 if not questions_response.get("success"):
                     raise Exception(f"Questions generation failed: {questions_response.get('error')}")
@@ -343,15 +707,23 @@ Format as numbered questions."""
                 questions = questions_response["answer"]
                 
                 analysis_sessions[session_id]['questions'] = questions
+                questions_usage = record_prompt_usage(session_id, 'questions', questions_response)
                 
-                socketio.emit('analysis_update', {
+                event_stream.publish(session_id, {
                     'status': 'questions_ready',
                     'data': {
-                        'questions': questions
+                        'questions': questions,
+                        'prompt_usage': questions_usage
                     },
                     'message': 'Questions generated - waiting for user input',
                     'timestamp': datetime.now().isoformat()
-                }, room=session_id)
+                })
+                
+                # The user's thinking time does not count against the deadline
+                budget.pause()
+                
+                # Draft the final assessment while the user is answering
+                start_speculative_assessment(session_id)
                 
             else:
                 # Generate final assessment directly
@@ -359,35 +731,103 @@ Format as numbered questions."""
                     initial_result, 
                     [], 
                     user_env_vars, 
-                    github_url
+                    github_url,
+                    session_id=session_id,
+                    budget=budget,
+                    cancel_token=cancel_token
                 )
                 
-                analysis_sessions[session_id]['final_assessment'] = final_assessment
+                analysis_sessions[session_id].update({
+                    'final_assessment': final_assessment,
+                    'status': 'completed',
+                    'end_time': datetime.now()
+                })
+                store_analysis(session_id)
                 
-                socketio.emit('analysis_update', {
+                event_stream.publish(session_id, {
                     'status': 'completed',
                     'data': {
-                        'final_assessment': final_assessment
+                        'final_assessment': final_assessment,
+                        'prompt_usage': analysis_sessions[session_id].get('prompt_usage', {})
                     },
                     'message': 'Analysis complete!',
                     'timestamp': datetime.now().isoformat()
-                }, room=session_id)
+                })
                 
         finally:
             # Clean up repository
             cleanup_repository(local_path)
             
+    except BudgetExceeded as e:
+        complete_partial(session_id, e)
+    except AnalysisCancelled as e:
+        logger.info(f"Analysis {session_id} stopped: {str(e)}")
     except Exception as e:
+        if cancel_token.cancelled:
+            # The session was dropped while this analysis was still writing to it
+            logger.info(f"Analysis {session_id} stopped after cancellation: {str(e)}")
+            return
         logger.error(f"Analysis error: {str(e)}")
-        socketio.emit('analysis_update', {
+        if session_id in analysis_sessions:
+            analysis_sessions[session_id].update({'status': 'failed', 'error': str(e)})
+        event_stream.publish(session_id, {
             'status': 'error',
             'message': f'Analysis failed: {str(e)}',
             'timestamp': datetime.now().isoformat()
-        }, room=session_id)
+        })
+    finally:
+        if interactive:
+            _track_interactive(-1)
+
+
+def _track_interactive(delta):
+    global interactive_analyses
+    with interactive_lock:
+        interactive_analyses += delta
+
+
+def precompute_analysis(github_url, github_token=None):
+    """
+    Run a full, non-interactive analysis in the background and store it.
+    
+    Called by the watchlist when HEAD moves. The stored result is what the
+    next interactive request for the same commit (without custom environment
+    variables) is served from; when an older analysis exists this is itself
+    an incremental update.
+    
+    Returns:
+        SHA of the commit that was analyzed
+    """
+    session_id = f"watchlist:{normalize_repo_url(github_url)}"
+    try:
+        analyze_repository_async(github_url, session_id, {}, github_token, interactive=False)
+        session = analysis_sessions.get(session_id, {})
+        if not session.get('final_assessment'):
+            raise Exception(session.get('error') or 'No assessment was produced')
+        if session.get('partial'):
+            raise Exception(f"Analysis stopped early ({session['budget'].exceeded})")
+        sha = (session.get('artifacts') or {}).get('sha')
+        if not sha:
+            raise Exception('The analyzed commit is unknown')
+        return sha
+    finally:
+        analysis_sessions.pop(session_id, None)
+
+
+watchlist = Watchlist(precompute_analysis, is_busy=lambda: interactive_analyses > 0)
 
 
-def generate_final_assessment_content(initial_analysis, user_responses, user_env_vars, github_url):
-    """Generate the final assessment content."""
+def generate_final_assessment_content(initial_analysis, user_responses, user_env_vars, github_url, session_id=None,
+                                      phase='final', budget=None, cancel_token=None):
+    """
+    Generate the final assessment content.
+    
+    The prompt reuses the session's repository context prefix when there is
+    one, so the final phase hits the same prompt cache as the earlier phases.
+    """
+    session = analysis_sessions.get(session_id, {}) if session_id else {}
+    context_prefix = session.get('context_prefix') or build_context_prefix(github_url, user_env_vars=user_env_vars)
+
     # Prepare environment variables for deployment instructions
     env_vars_section = ""
     if user_env_vars:
@@ -406,9 +846,6 @@ Create a .env file with these variables:
     Original Analysis:
     {initial_analysis}
     
-    User-Provided Environment Variables:
-    {chr(10).join([f"- {key}={value}" for key, value in user_env_vars.items()]) if user_env_vars else "None provided"}
-    
     User Responses:
     {chr(10).join([f"Q: {resp['question']} | A: {resp['answer']}" for resp in user_responses])}
     
@@ -450,14 +887,103 @@ Create a .env file with these variables:
     Keep it simple and practical - focus on what the user needs to do to deploy this with their provided environment variables.
     """
     
-    response = agent_instance.ask_question(final_prompt)
+    response = ask_phase(context_prefix, final_prompt, phase, budget, cancel_token)
     
     if response.get("success"):
+        record_prompt_usage(session_id, phase, response)
         return response["answer"]
     else:
         raise Exception(f"Final assessment failed: {response.get('error')}")
 
 
+# Answers that leave the assessment inputs unchanged
+NON_ANSWERS = {'', '-', '?', 'n/a', 'na', 'skip', 'idk', 'unknown', 'not sure', "don't know", 'dont know'}
+
+
+def informative_responses(user_responses):
+    """User responses that actually add information."""
+    return [
+        resp for resp in user_responses
+        if str(resp.get('answer') or '').strip().lower().rstrip('.!') not in NON_ANSWERS
+    ]
+
+
+def start_speculative_assessment(session_id):
+    """
+    Generate a provisional final assessment from the initial analysis while
+    the user answers the questions (SPECULATIVE_FINAL=0 disables this).
+    """
+    if os.getenv('SPECULATIVE_FINAL', '1') == '0':
+        return
+    session = analysis_sessions[session_id]
+    draft = {'status': 'running', 'ready': threading.Event()}
+    session['draft'] = draft
+    
+    def run():
+        try:
+            draft['assessment'] = generate_final_assessment_content(
+                session['initial_analysis'],
+                [],
+                session.get('user_env_vars', {}),
+                session['github_url'],
+                session_id=session_id,
+                phase='final_draft',
+                budget=session.get('budget'),
+                cancel_token=session.get('cancel_token')
+            )
+            draft['status'] = 'ready'
+        except Exception as e:
+            logger.warning(f"Speculative assessment failed: {str(e)}")
+            draft.update({'status': 'failed', 'error': str(e)})
+        finally:
+            draft['ready'].set()
+    
+    run_blocking(run)
+
+
+def final_from_draft(session_id, user_responses):
+    """
+    Turn the speculative draft into the final assessment.
+    
+    The draft is reused as-is when none of the answers add information;
+    otherwise a refinement pass revises the draft against the answers, which
+    is a shorter prompt than regenerating from the initial analysis.
+    
+    Returns:
+        (final assessment or None, how the draft was used)
+    """
+    session = analysis_sessions[session_id]
+    draft = session.get('draft')
+    if not draft:
+        return None, 'no_draft'
+    draft['ready'].wait(timeout=int(os.getenv('SPECULATIVE_WAIT', '120')))
+    if draft['status'] != 'ready':
+        return None, 'draft_failed'
+    
+    answered = informative_responses(user_responses)
+    if not answered:
+        return draft['assessment'], 'reused'
+    
+    refine_prompt = f"""DRAFT ASSESSMENT (written before the user answered the questions):
+{draft['assessment']}
+
+USER RESPONSES:
+{chr(10).join([f"Q: {resp['question']} | A: {resp['answer']}" for resp in answered])}
+
+Revise the draft to account for these answers. Change only what the answers affect, keep the same format including the **ANSWER: YES/NO** line, and return the complete revised assessment."""
+    
+    context_prefix = session.get('context_prefix') or build_context_prefix(
+        session['github_url'], user_env_vars=session.get('user_env_vars')
+    )
+    response = ask_phase(context_prefix, refine_prompt, 'final_refine', session.get('budget'),
+                         session.get('cancel_token'))
+    if not response.get("success"):
+        logger.warning(f"Draft refinement failed: {response.get('error')}")
+        return None, 'refine_failed'
+    record_prompt_usage(session_id, 'final_refine', response)
+    return response["answer"], 'refined'
+
+
 def generate_final_assessment(session_id):
     """Generate final simple deployment assessment."""
     try:
@@ -466,28 +992,124 @@ def generate_final_assessment(session_id):
         user_env_vars = session.get('user_env_vars', {})
         initial_analysis = session['initial_analysis']
         user_responses = session.get('user_responses', [])
+        if session.get('budget'):
+            session['budget'].resume()
         
-        final_assessment = generate_final_assessment_content(
-            initial_analysis, 
-            user_responses, 
-            user_env_vars, 
-            github_url
-        )
+        final_assessment, speculative = final_from_draft(session_id, user_responses)
+        if final_assessment is None:
+            final_assessment = generate_final_assessment_content(
+                initial_analysis, 
+                user_responses, 
+                user_env_vars, 
+                github_url,
+                session_id=session_id,
+                budget=session.get('budget'),
+                cancel_token=session.get('cancel_token')
+            )
         
         analysis_sessions[session_id]['final_assessment'] = final_assessment
         analysis_sessions[session_id]['status'] = 'completed'
         analysis_sessions[session_id]['end_time'] = datetime.now()
+        store_analysis(session_id)
         
         emit_status(session_id, 'completed', '🎉 Analysis completed!', {
             'final_assessment': final_assessment,
-            'user_env_vars': user_env_vars
+            'user_env_vars': user_env_vars,
+            'prompt_usage': analysis_sessions[session_id].get('prompt_usage', {}),
+            'speculative': speculative
         })
             
+    except BudgetExceeded as e:
+        complete_partial(session_id, e)
+    except AnalysisCancelled as e:
+        logger.info(f"Final assessment for {session_id} stopped: {str(e)}")
     except Exception as e:
+        if session_id not in analysis_sessions:
+            # Cancelled while the assessment was being written
+            return
         emit_status(session_id, 'error', f'❌ Final assessment failed: {str(e)}')
         analysis_sessions[session_id]['status'] = 'failed'
 
 
+def partial_assessment(session_id, session, error):
+    """
+    Best verdict from the evidence gathered before the budget ran out.
+    
+    In order of preference: a finished speculative draft, the previous
+    commit's verdict (incremental runs), a short verdict pass over the
+    repository context and whatever analysis finished, and, when no LLM call
+    fits in the verdict reserve, a plain summary of what was gathered.
+    ``session`` is passed in so the session being dropped meanwhile does not
+    interrupt the verdict.
+    """
+    draft = session.get('draft') or {}
+    if draft.get('status') == 'ready':
+        return draft['assessment']
+    prior = session.get('prior_assessment')
+    if prior:
+        return f"*Verdict for the previous commit {prior['sha'][:8]}; the new changes were not assessed.*\n\n{prior['final_assessment']}"
+    
+    initial_analysis = session.get('initial_analysis')
+    context_prefix = session.get('context_prefix')
+    if context_prefix:
+        partial_prompt = f"""The analysis of {session['github_url']} was stopped early ({error.reason} in the {error.phase} phase).
+
+PRELIMINARY ANALYSIS:
+{initial_analysis or "The preliminary analysis did not finish; use the repository context only."}
+
+Give the best deployment verdict this evidence supports, in the usual format with the **ANSWER: YES/NO** line and a short **REASON:** list. Say which conclusions are uncertain because the analysis was cut short. Keep it brief."""
+        response = agent_instance.ask_with_context(
+            context_prefix, partial_prompt, phase='partial', budget=session.get('budget')
+        )
+        if response.get('success'):
+            record_prompt_usage(session_id, 'partial', response)
+            return response['answer']
+        logger.warning(f"Partial verdict pass failed: {response.get('error')}")
+    
+    gathered = []
+    if initial_analysis:
+        gathered.append(f"**PRELIMINARY ANALYSIS:**\n{initial_analysis}")
+    file_summaries = (session.get('artifacts') or {}).get('file_summaries') or {}
+    if file_summaries:
+        gathered.append("**KEY FILES FOUND:** " + ", ".join(sorted(file_summaries)))
+    return f"""## CAN THIS REPOSITORY BE DEPLOYED?
+
+**ANSWER: UNDETERMINED**
+
+**REASON:**
+- The analysis ran out of budget before a verdict could be written.
+
+{chr(10).join(gathered) or "No repository evidence was gathered."}"""
+
+
+def complete_partial(session_id, error):
+    """Finish an analysis that ran out of time or tokens with a clearly marked partial verdict."""
+    logger.warning(f"Analysis {session_id} stopped early: {str(error)}")
+    session = analysis_sessions.get(session_id)
+    if session is None:
+        # Dropped meanwhile (expired job or disconnected client); nobody is waiting for a verdict
+        return
+    assessment = partial_assessment(session_id, session, error)
+    final_assessment = (
+        f"> ⚠️ **PARTIAL RESULT** - the analysis stopped early ({error.reason} in the {error.phase} phase). "
+        f"This verdict is based only on the evidence gathered up to that point.\n\n{assessment}"
+    )
+    session.update({
+        'final_assessment': final_assessment,
+        'partial': True,
+        'status': 'completed',
+        'end_time': datetime.now()
+    })
+    archive_assessment(session_id)
+    emit_status(session_id, 'completed', '⚠️ Analysis stopped early - partial result', {
+        'final_assessment': final_assessment,
+        'user_env_vars': session.get('user_env_vars', {}),
+        'prompt_usage': session.get('prompt_usage', {}),
+        'partial': True,
+        'budget': session['budget'].snapshot()
+    })
+
+
 @app.route('/')
 def index():
     """Main page."""
@@ -501,10 +1123,285 @@ def health_check():
     return jsonify({
         'status': 'healthy',
         'api_key_configured': bool(api_key),
-        'agent_ready': agent_instance is not None
+        'agent_ready': agent_instance is not None,
+        'workspaces': len(workspace_registry.list_workspaces()),
+        'archived_assessments': assessment_archive.stats(),
+        'workspace_usage': {
+            **workspace_registry.manager.stats(),
+            'memory_bytes': workspace_registry.memory_bytes()
+        },
+        'observation_tokens': observation_stats.snapshot(),
+        'prompt_cache': agent_instance.prompt_cache_stats.snapshot() if agent_instance else {},
+        'phase_metrics': agent_instance.phase_metrics.snapshot() if agent_instance else {},
+        'agent_iterations': agent_instance.iteration_stats.snapshot() if agent_instance else {},
+        'watchlist': watchlist.stats(),
+        'events': event_stream.stats(),
+        'server': {'async_mode': ASYNC_MODE, 'analysis_workers': ANALYSIS_WORKERS},
+        'llm_rate_limiter': get_shared_rate_limiter().stats()
     })
 
 
+@app.route('/api/watchlist', methods=['GET'])
+def list_watchlist():
+    """Watched repositories and their precomputation status."""
+    return jsonify({'repositories': watchlist.list(), **watchlist.stats()})
+
+
+def watchlist_auth_error():
+    """
+    Changes to the watchlist (which stores GitHub tokens) need
+    ``Authorization: Bearer <WATCHLIST_ADMIN_TOKEN>``; without that setting
+    they are disabled.
+    """
+    admin_token = os.getenv('WATCHLIST_ADMIN_TOKEN')
+    if not admin_token:
+        return jsonify({'error': 'Watchlist changes are disabled; set WATCHLIST_ADMIN_TOKEN'}), 403
+    if not hmac.compare_digest(request.headers.get('Authorization', ''), f'Bearer {admin_token}'):
+        return jsonify({'error': 'Invalid or missing watchlist token'}), 401
+    return None
+
+
+@app.route('/api/watchlist', methods=['POST'])
+def add_to_watchlist():
+    """Watch a repository and queue its precomputation."""
+    auth_error = watchlist_auth_error()
+    if auth_error:
+        return auth_error
+    data = request.get_json(silent=True) or {}
+    github_url = data.get('github_url')
+    if not github_url:
+        return jsonify({'error': 'GitHub URL is required'}), 400
+    watchlist.add(github_url, data.get('github_token'))
+    result = watchlist.check(github_url)
+    return jsonify({**result, 'repository': watchlist.entry(github_url)}), (202 if 'success' in result else 502)
+
+
+@app.route('/api/watchlist', methods=['DELETE'])
+def remove_from_watchlist():
+    """Stop watching a repository."""
+    auth_error = watchlist_auth_error()
+    if auth_error:
+        return auth_error
+    data = request.get_json(silent=True) or {}
+    if not watchlist.remove(data.get('github_url', '')):
+        return jsonify({'error': 'Repository is not on the watchlist'}), 404
+    return jsonify({'success': True})
+
+
+@app.route('/api/webhooks/push', methods=['POST'])
+def handle_push_webhook():
+    """
+    Push webhook (GitHub payload format): refresh a watched repository as
+    soon as its default branch moves instead of waiting for the next poll.
+    
+    Requests must be signed with WATCHLIST_WEBHOOK_SECRET; without it the
+    endpoint is disabled. The payload only triggers a poll: the new HEAD is
+    resolved from the repository itself, never taken from the payload.
+    """
+    secret = os.getenv('WATCHLIST_WEBHOOK_SECRET')
+    if not secret:
+        return jsonify({'error': 'Webhooks are disabled; set WATCHLIST_WEBHOOK_SECRET'}), 403
+    expected = 'sha256=' + hmac.new(secret.encode(), request.get_data(), hashlib.sha256).hexdigest()
+    if not hmac.compare_digest(expected, request.headers.get('X-Hub-Signature-256', '')):
+        return jsonify({'error': 'Invalid signature'}), 401
+    
+    payload = request.get_json(silent=True) or {}
+    repository = payload.get('repository') or {}
+    github_url = repository.get('html_url') or repository.get('clone_url')
+    if not github_url or not watchlist.is_watched(github_url):
+        return jsonify({'ignored': 'repository is not on the watchlist'}), 202
+    default_branch = repository.get('default_branch')
+    if default_branch and payload.get('ref') not in (None, f"refs/heads/{default_branch}"):
+        return jsonify({'ignored': 'push is not to the default branch'}), 202
+    
+    result = watchlist.check(github_url)
+    return jsonify(result), (202 if 'success' in result else 502)
+
+
+def expire_jobs():
+    """Forget REST jobs that finished more than JOB_TTL seconds (default 3600) ago."""
+    cutoff = time.time() - int(os.getenv('JOB_TTL', '3600'))
+    with analysis_jobs_lock:
+        expired = [
+            job_id for job_id, job in analysis_jobs.items()
+            if job.get('finished_at') and job['finished_at'] < cutoff
+        ]
+        for job_id in expired:
+            del analysis_jobs[job_id]
+    for job_id in expired:
+        analysis_sessions.pop(job_id, None)
+        event_stream.forget(job_id)
+
+
+def run_job(job_id, github_url, user_env_vars, github_token, incremental):
+    """Run a REST job on the analysis executor unless it was cancelled while queued."""
+    if analysis_jobs.get(job_id, {}).get('cancelled'):
+        return
+    try:
+        analyze_repository_async(github_url, job_id, user_env_vars, github_token, incremental, False)
+    finally:
+        # Start the TTL clock whether or not anyone polls the job
+        with analysis_jobs_lock:
+            job = analysis_jobs.get(job_id)
+            if job is not None and not job.get('finished_at'):
+                job['finished_at'] = time.time()
+
+
+def job_snapshot(job_id):
+    """Current status and, once finished, the result of a REST job."""
+    job = analysis_jobs[job_id]
+    session = analysis_sessions.get(job_id)
+    if job.get('cancelled'):
+        status = 'cancelled'
+    elif session is None:
+        status = 'queued'
+    else:
+        status = session.get('status', 'started')
+    snapshot = {
+        'job_id': job_id,
+        'github_url': job['github_url'],
+        'status': status,
+        'created_at': job['created_at']
+    }
+    last_event = event_stream.last_event(job_id)
+    if last_event and status not in ('completed', 'failed'):
+        snapshot['progress'] = last_event.get('message')
+    if session is not None and status == 'completed':
+        snapshot['result'] = {
+            'final_assessment': session.get('final_assessment'),
+            'initial_analysis': session.get('initial_analysis'),
+            'partial': session.get('partial', False),
+            'sha': (session.get('artifacts') or {}).get('sha'),
+            'prompt_usage': session.get('prompt_usage', {})
+        }
+    if session is not None and status == 'failed':
+        snapshot['error'] = session.get('error')
+    return snapshot
+
+
+@app.route('/api/analyses', methods=['POST'])
+def create_analysis_job():
+    """
+    Start an analysis without a socket connection (for CI systems and scripts).
+    
+    The job runs without questions; poll GET /api/analyses/<id> for the result.
+    """
+    data = request.get_json(silent=True) or {}
+    github_url = data.get('github_url')
+    if not github_url:
+        return jsonify({'error': 'GitHub URL is required'}), 400
+    if not agent_instance:
+        return jsonify({'error': 'Agent is not initialized'}), 503
+    
+    expire_jobs()
+    job_id = uuid.uuid4().hex
+    with analysis_jobs_lock:
+        analysis_jobs[job_id] = {'github_url': github_url, 'created_at': time.time()}
+    run_blocking(
+        run_job,
+        job_id,
+        github_url,
+        data.get('user_env_vars', {}),
+        data.get('github_token'),
+        data.get('incremental', True)
+    )
+    
+    response = jsonify({'job_id': job_id, 'status': 'queued', 'status_url': f'/api/analyses/{job_id}'})
+    response.status_code = 202
+    response.headers['Location'] = f'/api/analyses/{job_id}'
+    return response
+
+
+@app.route('/api/analyses/<job_id>', methods=['GET'])
+def get_analysis_job(job_id):
+    """
+    Status and result of a REST job.
+    
+    The ETag changes with every update of the job. A request whose
+    If-None-Match matches it gets 304; with ``?wait=<seconds>`` (up to 60) the
+    request is held until the job changes or the wait runs out. Finished
+    results are gzip-compressed for clients that accept it.
+    """
+    expire_jobs()
+    if job_id not in analysis_jobs:
+        return jsonify({'error': 'Analysis job not found'}), 404
+    
+    def current_etag():
+        job = analysis_jobs.get(job_id, {})
+        return f"{job_id}-{event_stream.last_seq(job_id)}-{int(bool(job.get('cancelled')))}"
+    
+    etag = current_etag()
+    if request.if_none_match.contains(etag):
+        wait = min(max(request.args.get('wait', 0, type=float), 0.0), 60.0)
+        deadline = time.time() + wait
+        while etag == current_etag() and time.time() < deadline:
+            socketio.sleep(0.25)
+        etag = current_etag()
+        if request.if_none_match.contains(etag) or job_id not in analysis_jobs:
+            response = make_response('', 304)
+            response.set_etag(etag)
+            return response
+    
+    snapshot = job_snapshot(job_id)
+    body = json.dumps(snapshot).encode('utf-8')
+    response = make_response(body)
+    response.mimetype = 'application/json'
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = 'no-cache'
+    response.headers['Vary'] = 'Accept-Encoding'
+    if snapshot['status'] in ('completed', 'failed') and request.accept_encodings['gzip']:
+        response.set_data(gzip.compress(body, 6))
+        response.headers['Content-Encoding'] = 'gzip'
+    return response
+
+
+@app.route('/api/analyses/<job_id>', methods=['DELETE'])
+def cancel_analysis_job(job_id):
+    """Cancel a running REST job."""
+    if job_id not in analysis_jobs:
+        return jsonify({'error': 'Analysis job not found'}), 404
+    job = analysis_jobs[job_id]
+    if job_snapshot(job_id)['status'] in ('completed', 'failed', 'cancelled'):
+        return jsonify({'success': False, 'error': 'Analysis job already finished'}), 409
+    cancel_analysis(job_id, 'cancelled through the API')
+    with analysis_jobs_lock:
+        job.update({'cancelled': True, 'finished_at': time.time()})
+    return jsonify({'success': True, 'job_id': job_id, 'status': 'cancelled'})
+
+
+@app.route('/api/assessments/search', methods=['GET'])
+def search_assessments():
+    """
+    Search archived assessments.
+    
+    Query parameters: ``q`` (terms matched against repository, verdict,
+    stack, blockers and assessment text), ``verdict`` (YES/NO/UNDETERMINED),
+    ``repository``, ``limit`` (max 100) and ``offset``.
+    """
+    verdict = request.args.get('verdict')
+    if verdict and verdict.upper() not in ('YES', 'NO', 'UNDETERMINED'):
+        return jsonify({'error': 'verdict must be YES, NO or UNDETERMINED'}), 400
+    limit = min(max(request.args.get('limit', 20, type=int), 1), 100)
+    offset = max(request.args.get('offset', 0, type=int), 0)
+    result = assessment_archive.search(
+        request.args.get('q', ''),
+        verdict=verdict,
+        repository=request.args.get('repository'),
+        limit=limit,
+        offset=offset
+    )
+    return jsonify({**result, 'limit': limit, 'offset': offset})
+
+
+@app.route('/api/assessments/<int:assessment_id>', methods=['GET'])
+def get_assessment(assessment_id):
+    """An archived assessment with its full text."""
+    record = assessment_archive.get(assessment_id)
+    if record is None:
+        return jsonify({'error': 'Assessment not found'}), 404
+    return jsonify(record)
+
+
 @socketio.on('connect')
 def handle_connect():
     """Handle client connection."""
@@ -516,9 +1413,53 @@ def handle_connect():
 def handle_disconnect():
     """Handle client disconnection."""
     print(f"Client disconnected: {request.sid}")
-    # Clean up session data if needed
-    if request.sid in analysis_sessions:
-        del analysis_sessions[request.sid]
+    session_id = session_key()
+    session_aliases.pop(request.sid, None)
+    session = analysis_sessions.get(session_id)
+    if session is None:
+        event_stream.forget(session_id)
+        return
+    # Give the client a chance to reconnect and resume before the work is stopped
+    disconnected_at = time.time()
+    session['disconnected_at'] = disconnected_at
+    socketio.start_background_task(cancel_if_abandoned, session_id, disconnected_at)
+
+
+def cancel_if_abandoned(session_id, disconnected_at):
+    """Cancel a disconnected session that was not resumed within SESSION_RESUME_GRACE seconds."""
+    socketio.sleep(float(os.getenv('SESSION_RESUME_GRACE', '30')))
+    session = analysis_sessions.get(session_id)
+    if session is not None and session.get('disconnected_at') == disconnected_at:
+        # Nobody is left to receive the result: stop the work and drop the session
+        cancel_analysis(session_id, 'client disconnected')
+        event_stream.forget(session_id)
+
+
+@socketio.on('resume_session')
+def handle_resume_session(data):
+    """
+    Reattach a reconnected client to its analysis.
+    
+    The client must present the resume token it was given when the
+    analysis started; knowing the session id alone is not enough. The new
+    socket then joins the old session's room, and the events after
+    ``last_seq`` are replayed so the client only receives what it missed.
+    """
+    data = data or {}
+    old_session_id = data.get('session_id')
+    session = analysis_sessions.get(old_session_id) if old_session_id else None
+    expected = session.get('resume_token') if session else None
+    presented = data.get('resume_token')
+    if (not expected or not isinstance(presented, str)
+            or not hmac.compare_digest(presented.encode(), expected.encode())):
+        emit('session_resumed', {'resumed': False})
+        return
+    session.pop('disconnected_at', None)
+    session_aliases[request.sid] = old_session_id
+    join_room(old_session_id)
+    emit('session_resumed', {'resumed': True, 'session_id': old_session_id, 'status': session.get('status')})
+    replayed = event_stream.replay(old_session_id, int(data.get('last_seq') or 0))
+    logger.info(f"Session {old_session_id} resumed on {request.sid}, {replayed} events replayed")
 
 
 @socketio.on('start_analysis')
@@ -527,27 +1468,46 @@ def handle_start_analysis(data):
     github_url = data.get('github_url')
     user_env_vars = data.get('user_env_vars', {})
     github_token = data.get('github_token')  # Optional GitHub token for private repos
+    incremental = data.get('incremental', True)  # Build on a previous analysis of this repo
     
     if not github_url:
         emit('error', {'message': 'GitHub URL is required'})
         return
     
-    session_id = request.sid
+    session_id = session_key()
+    
+    # A new analysis replaces any that is still running for this client
+    cancel_analysis(session_id, 'superseded by a new analysis')
+    
+    # Only this socket learns the secret needed to resume the session after a reconnect
+    resume_token = secrets.token_urlsafe(32)
+    emit('analysis_started', {'session_id': session_id, 'resume_token': resume_token})
     
-    # Start analysis in background thread
-    socketio.start_background_task(
+    # Start analysis on the executor
+    run_blocking(
         analyze_repository_async, 
         github_url, 
         session_id, 
         user_env_vars,
-        github_token
+        github_token,
+        incremental,
+        True,
+        resume_token
     )
 
 
+@socketio.on('cancel_analysis')
+def handle_cancel_analysis(data=None):
+    """Stop the client's running analysis."""
+    session_id = session_key()
+    if cancel_analysis(session_id, 'cancelled by the user'):
+        emit_status(session_id, 'cancelled', 'Analysis cancelled')
+
+
 @socketio.on('submit_responses')
 def handle_submit_responses(data):
     """Handle user responses to questions."""
-    session_id = request.sid
+    session_id = session_key()
     responses = data.get('responses', [])
     
     if session_id not in analysis_sessions:
@@ -558,22 +1518,21 @@ def handle_submit_responses(data):
     analysis_sessions[session_id]['user_responses'] = responses
     analysis_sessions[session_id]['status'] = 'generating_final'
     
-    # Generate final assessment in background thread
-    thread = threading.Thread(target=generate_final_assessment, args=(session_id,))
-    thread.daemon = True
-    thread.start()
+    # Generate final assessment on the executor
+    run_blocking(generate_final_assessment, session_id)
 
 
 @socketio.on('get_session_status')
 def handle_get_session_status():
     """Get current session status."""
-    session_id = request.sid
+    session_id = session_key()
     if session_id in analysis_sessions:
         session = analysis_sessions[session_id]
         emit('session_status', {
             'status': session['status'],
             'github_url': session.get('github_url'),
-            'phases': list(session.get('phases', {}).keys())
+            'phases': list(session.get('phases', {}).keys()),
+            'partial': session.get('partial', False)
         })
     else:
         emit('session_status', {'status': 'none'})
@@ -586,6 +1545,14 @@ if __name__ == '__main__':
     else:
         print("⚠️ Warning: API key not found. Please configure OPENROUTER_API_KEY in .env")
     
+    # Reclaim checkouts orphaned by crashed or killed workers
+    workspace_registry.manager.start_janitor()
+    
+    # Keep watched repositories analyzed in the background
+    for watched_url in filter(None, (u.strip() for u in os.getenv('WATCHLIST', '').split(','))):
+        watchlist.add(watched_url)
+    watchlist.start()
+    
     print("🚀 Starting GitHub Repository Deployment Analyzer...")
     print("📱 Open your browser and go to: http://localhost:5000")
     
@@ -7,6 +7,10 @@ class DeploymentAnalyzer {
     constructor() {
         this.socket = null;
         this.sessionId = null;
+        this.lastSeq = 0;
+        this.resumeToken = null;
+        this.pendingSessionId = null;
+        this.batchQueue = Promise.resolve();
         this.analysisStartTime = null;
         this.timerInterval = null;
         this.currentPhase = 0;
@@ -42,12 +46,41 @@ class DeploymentAnalyzer {
         });
         
         this.socket.on('connected', (data) => {
+            if (this.sessionId && this.resumeToken && this.sessionId !== data.session_id) {
+                // Reconnected: reattach to the analysis and receive only the events missed meanwhile
+                this.socket.emit('resume_session', {
+                    session_id: this.sessionId,
+                    resume_token: this.resumeToken,
+                    last_seq: this.lastSeq
+                });
+                this.pendingSessionId = data.session_id;
+                return;
+            }
             this.sessionId = data.session_id;
             console.log('Session ID:', this.sessionId);
         });
         
-        this.socket.on('analysis_update', (data) => {
-            this.handleAnalysisUpdate(data);
+        this.socket.on('analysis_started', (data) => {
+            // Secret proving this client owns the session when it reconnects
+            this.sessionId = data.session_id;
+            this.resumeToken = data.resume_token;
+        });
+        
+        this.socket.on('session_resumed', (data) => {
+            if (!data.resumed) {
+                // The server no longer has the session; start fresh on the new connection
+                this.sessionId = this.pendingSessionId;
+                this.resumeToken = null;
+                this.lastSeq = 0;
+            }
+            console.log('Session resumed:', data.resumed, this.sessionId);
+        });
+        
+        this.socket.on('analysis_batch', (batch) => {
+            // Inflating is asynchronous; chain batches so events keep their order
+            this.batchQueue = this.batchQueue
+                .then(() => this.handleAnalysisBatch(batch))
+                .catch((error) => console.error('Failed to handle analysis update:', error));
         });
         
         this.socket.on('error', (data) => {
@@ -917,6 +950,36 @@ class DeploymentAnalyzer {
         }
     }
     
+    async handleAnalysisBatch(batch) {
+        const events = await this.inflatePayload(batch.events);
+        events.forEach((event) => {
+            // Replays can overlap with what already arrived
+            if (event.seq <= this.lastSeq) {
+                return;
+            }
+            this.lastSeq = event.seq;
+            this.handleAnalysisUpdate(event);
+        });
+    }
+    
+    async inflatePayload(value) {
+        // Large text fields arrive as deflated binary attachments: { __deflate__: ArrayBuffer }
+        if (Array.isArray(value)) {
+            return Promise.all(value.map((item) => this.inflatePayload(item)));
+        }
+        if (value && typeof value === 'object') {
+            if (value.__deflate__ !== undefined) {
+                const stream = new Blob([value.__deflate__]).stream().pipeThrough(new DecompressionStream('deflate'));
+                return new Response(stream).text();
+            }
+            const entries = await Promise.all(
+                Object.entries(value).map(async ([key, item]) => [key, await this.inflatePayload(item)])
+            );
+            return Object.fromEntries(entries);
+        }
+        return value;
+    }
+    
     handleAnalysisUpdate(data) {
         console.log('Analysis update:', data);
         
@@ -947,6 +1010,10 @@ class DeploymentAnalyzer {
             case 'error':
                 this.handleAnalysisError(data);
                 break;
+                
+            case 'cancelled':
+                this.stopTimer();
+                break;
         }
     }
     
@@ -1254,6 +1321,9 @@ class DeploymentAnalyzer {
     }
     
     resetAnalysis() {
+        // Stop any analysis still running on the server
+        this.socket.emit('cancel_analysis');
+        
         // Reset all state
         this.resetAnalysisState();
         this.stopTimer();
@@ -0,0 +1,51 @@
+"""
+Shared fixtures for the test suite.
+
+Every on-disk location the tools default to (workspaces, the bare-clone
+object store, the assessment archive) is pointed at a throwaway directory
+before any of them is imported, so tests never touch the real ones.
+"""
+
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+_STATE = tempfile.mkdtemp(prefix="git-agent-tests-")
+os.environ["WORKSPACE_ROOT"] = os.path.join(_STATE, "workspaces")
+os.environ["WORKSPACE_LEGACY_ROOT"] = os.path.join(_STATE, "legacy")
+os.environ["GIT_OBJECT_STORE_ROOT"] = os.path.join(_STATE, "objects")
+os.environ["ASSESSMENT_ARCHIVE_PATH"] = os.path.join(_STATE, "assessments.db")
+for _name in ("GITHUB_ARCHIVE_BASE", "FETCH_STRATEGY", "WATCHLIST_ADMIN_TOKEN", "WATCHLIST_WEBHOOK_SECRET"):
+    os.environ.pop(_name, None)
+
+
+def pytest_sessionfinish(session, exitstatus):
+    shutil.rmtree(_STATE, ignore_errors=True)
+
+
+def _git(cwd, *args):
+    subprocess.run(
+        ["git", "-c", "user.name=test", "-c", "user.email=test@example.com", *args],
+        cwd=cwd, check=True, capture_output=True
+    )
+
+
+@pytest.fixture
+def git_repo(tmp_path):
+    """A local repository with one commit; yields its file:// URL."""
+    path = tmp_path / "origin" / "sample"
+    path.mkdir(parents=True)
+    (path / "README.md").write_text("# sample\n")
+    (path / "app.py").write_text("print('hello')\n")
+    _git(path, "init", "-q", "-b", "main")
+    _git(path, "add", ".")
+    _git(path, "commit", "-q", "-m", "initial")
+    return f"file://{path}"
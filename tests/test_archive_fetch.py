@@ -0,0 +1,103 @@
+"""Streaming archive extraction: what is kept, what is filtered, where the token goes."""
+
+import io
+import tarfile
+import threading
+from http.server import BaseHTTPRequestHandler, HTTPServer
+
+import pytest
+
+from tools.archive_fetch import choose_fetch_strategy, extract_stream, fetch_archive
+
+
+def build_tarball(top="repo-abc123", large_bytes=2048):
+    """A gzipped tarball shaped like GitHub's: everything under one top-level folder."""
+    buffer = io.BytesIO()
+    with tarfile.open(fileobj=buffer, mode="w:gz") as archive:
+        def add_file(name, data):
+            info = tarfile.TarInfo(name)
+            info.size = len(data)
+            archive.addfile(info, io.BytesIO(data))
+
+        def add_entry(name, kind, linkname=""):
+            info = tarfile.TarInfo(name)
+            info.type = kind
+            info.linkname = linkname
+            archive.addfile(info)
+
+        add_entry(top, tarfile.DIRTYPE)
+        add_entry(f"{top}/src", tarfile.DIRTYPE)
+        add_file(f"{top}/README.md", b"# readme\n")
+        add_file(f"{top}/src/main.py", b"print('main')\n")
+        add_file(f"{top}/node_modules/dep/index.js", b"module.exports = 1\n")
+        add_file(f"{top}/src/cache.pyc", b"\x00\x01")
+        add_file(f"{top}/big.bin", b"x" * large_bytes)
+        add_file(f"{top}/../escape.txt", b"outside\n")
+        add_entry(f"{top}/link", tarfile.SYMTYPE, "/etc/passwd")
+        add_entry(f"{top}/hard", tarfile.LNKTYPE, f"{top}/README.md")
+    return buffer.getvalue()
+
+
+def test_extract_stream_keeps_only_safe_regular_files():
+    kept, dirs = {}, []
+
+    def on_file(rel_path, archive, member):
+        kept[rel_path] = archive.extractfile(member).read()
+
+    stats = extract_stream(io.BytesIO(build_tarball()), on_file, dirs.append, max_file_bytes=1024)
+
+    assert kept == {"README.md": b"# readme\n", "src/main.py": b"print('main')\n"}
+    assert dirs == ["src"]
+    assert stats["files"] == 2
+    assert stats["skipped_ignored"] == 2
+    assert stats["skipped_large"] == [{"path": "big.bin", "size": 2048}]
+
+
+def test_choose_fetch_strategy_prefers_cheapest_source(monkeypatch):
+    assert choose_fetch_strategy("https://github.com/o/r") == "archive"
+    assert choose_fetch_strategy("https://github.com/o/r", local_objects=True) == "objects"
+    assert choose_fetch_strategy("https://github.com/o/r", need_history=True) == "clone"
+    assert choose_fetch_strategy("https://gitlab.com/o/r") == "clone"
+    monkeypatch.setenv("FETCH_STRATEGY", "clone")
+    assert choose_fetch_strategy("https://github.com/o/r") == "clone"
+
+
+@pytest.fixture
+def archive_server(monkeypatch):
+    """A local GITHUB_ARCHIVE_BASE stand-in that records the request headers."""
+    payload = build_tarball()
+    requests_seen = []
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            requests_seen.append({"path": self.path, "headers": dict(self.headers)})
+            self.send_response(200)
+            self.send_header("Content-Type", "application/x-gzip")
+            self.send_header("Content-Length", str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+
+        def log_message(self, *args):
+            pass
+
+    server = HTTPServer(("127.0.0.1", 0), Handler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    monkeypatch.setenv("GITHUB_ARCHIVE_BASE", f"http://127.0.0.1:{server.server_port}")
+    yield requests_seen
+    server.shutdown()
+    server.server_close()
+
+
+def test_fetch_archive_extracts_filtered_tree_without_leaking_token(archive_server, tmp_path):
+    dest = tmp_path / "checkout"
+
+    result = fetch_archive("https://github.com/owner/repo", str(dest), "main",
+                           github_token="secret-token", max_file_bytes=1024)
+
+    assert result["success"] is True
+    extracted = sorted(str(p.relative_to(dest)) for p in dest.rglob("*") if p.is_file())
+    assert extracted == ["README.md", "src/main.py"]
+    assert not (tmp_path / "escape.txt").exists()
+    assert archive_server[0]["path"] == "/owner/repo/tar.gz/main"
+    assert "Authorization" not in archive_server[0]["headers"]
@@ -0,0 +1,95 @@
+"""Archived assessments: replacement rules and full-text search input handling."""
+
+import pytest
+
+from tools.assessment_archive import AssessmentArchive, _fts_query
+
+BLOCKED = """ANSWER: NO
+REASON:
+- Requires PostgreSQL but DATABASE_URL is not set
+- Hardcoded localhost in config.py
+"""
+
+DEPLOYABLE = """ANSWER: YES
+REASON:
+- The Dockerfile builds the Flask app
+"""
+
+NATIVE = """ANSWER: NO
+REASON:
+- Needs a C++ toolchain to build the extension
+"""
+
+
+@pytest.fixture
+def archive(tmp_path):
+    archive = AssessmentArchive(str(tmp_path / "assessments.db"))
+    archive.add("https://github.com/acme/api", BLOCKED, sha="a" * 40, file_names=["requirements.txt"])
+    archive.add("https://github.com/acme/web.git", DEPLOYABLE, sha="b" * 40)
+    archive.add("https://github.com/acme/native", NATIVE, sha="c" * 40)
+    return archive
+
+
+def repositories(result):
+    return sorted(record["repository"] for record in result["results"])
+
+
+def test_fts_query_quotes_every_term():
+    assert _fts_query('') == ''
+    assert _fts_query('postgres "db" OR') == '"postgres"* "db" "OR"'
+    assert _fts_query('C++') == '"C"'
+
+
+@pytest.mark.parametrize("query", [
+    '"unbalanced', 'NOT', 'deploy AND', 'NEAR(', ')(', 'repository:api', '*', '^start', '-', "'; DROP TABLE"
+])
+def test_search_never_fails_on_fts_syntax(archive, query):
+    result = archive.search(query)
+
+    assert isinstance(result["total"], int)
+    assert archive.stats() == {"NO": 2, "YES": 1}
+
+
+def test_search_matches_prefixes_and_short_terms_whole(archive):
+    assert repositories(archive.search("postgres")) == ["github.com/acme/api"]
+    assert repositories(archive.search("C++")) == ["github.com/acme/native"]
+    assert repositories(archive.search("localhost config")) == ["github.com/acme/api"]
+    assert archive.search("postgres dockerfile")["total"] == 0
+
+
+def test_search_filters_and_snippets(archive):
+    result = archive.search("flask", verdict="yes", repository="https://github.com/acme/web")
+
+    assert repositories(result) == ["github.com/acme/web"]
+    assert "[Flask]" in result["results"][0]["snippet"]
+    assert "final_assessment" not in result["results"][0]
+    assert repositories(archive.search(verdict="NO")) == ["github.com/acme/api", "github.com/acme/native"]
+
+
+def test_blockers_and_stack_are_extracted(archive):
+    blocked = archive.search("postgres")["results"][0]
+    deployable = archive.search(repository="github.com/acme/web")["results"][0]
+
+    assert blocked["blockers"] == ["Requires PostgreSQL but DATABASE_URL is not set",
+                                   "Hardcoded localhost in config.py"]
+    assert blocked["stack"] == ["Python", "PostgreSQL"]
+    assert deployable["blockers"] == []
+
+
+def test_partial_never_replaces_complete_assessment(archive):
+    complete_id = archive.search("postgres")["results"][0]["id"]
+
+    assert archive.add("https://github.com/acme/api", "ANSWER: UNDETERMINED", sha="a" * 40, partial=True) == complete_id
+
+    replaced_id = archive.add("https://github.com/acme/api", DEPLOYABLE, sha="a" * 40)
+    assert archive.get(complete_id) is None
+    assert archive.get(replaced_id)["verdict"] == "YES"
+    assert archive.search("postgres")["total"] == 0
+
+
+def test_assessments_are_kept_apart_by_environment(archive):
+    with_env = archive.add("https://github.com/acme/api", DEPLOYABLE, sha="a" * 40,
+                           env_vars={"DATABASE_URL": "postgres://db"})
+
+    assert archive.get(with_env)["verdict"] == "YES"
+    assert archive.search(repository="github.com/acme/api")["total"] == 2
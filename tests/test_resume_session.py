@@ -0,0 +1,62 @@
+"""Rejoining an analysis after a reconnect needs the session's resume token."""
+
+import pytest
+
+from app import analysis_sessions, app, event_stream, session_aliases, socketio
+
+SESSION_ID = "analysis-session"
+RESUME_TOKEN = "resume-secret"
+
+
+@pytest.fixture
+def session():
+    analysis_sessions[SESSION_ID] = {"status": "analyzing", "resume_token": RESUME_TOKEN,
+                                     "disconnected_at": 123.0}
+    for step in ("cloning", "scanning", "analyzing"):
+        event_stream.publish(SESSION_ID, {"status": step, "message": step})
+    event_stream.flush(SESSION_ID)
+    yield analysis_sessions[SESSION_ID]
+    analysis_sessions.pop(SESSION_ID, None)
+    event_stream.forget(SESSION_ID)
+
+
+@pytest.fixture
+def client():
+    client = socketio.test_client(app)
+    client.get_received()
+    yield client
+    if client.is_connected():
+        client.disconnect()
+
+
+def resume(client, **data):
+    client.emit("resume_session", data)
+    return {message["name"]: message["args"][0] for message in client.get_received()}
+
+
+@pytest.mark.parametrize("data", [
+    {"session_id": SESSION_ID},
+    {"session_id": SESSION_ID, "resume_token": "guessed"},
+    {"session_id": SESSION_ID, "resume_token": ["resume-secret"]},
+    {"session_id": "unknown", "resume_token": RESUME_TOKEN},
+    {"resume_token": RESUME_TOKEN}
+])
+def test_resume_refused_without_the_sessions_token(session, client, data):
+    received = resume(client, last_seq=0, **data)
+
+    assert received == {"session_resumed": {"resumed": False}}
+    assert session["disconnected_at"] == 123.0
+    socketio.emit("probe", {}, room=SESSION_ID)
+    assert client.get_received() == []
+
+
+def test_resume_with_token_joins_room_and_replays_missed_events(session, client):
+    received = resume(client, session_id=SESSION_ID, resume_token=RESUME_TOKEN, last_seq=1)
+
+    assert received["session_resumed"] == {"resumed": True, "session_id": SESSION_ID, "status": "analyzing"}
+    assert received["analysis_batch"]["replay"] is True
+    assert received["analysis_batch"]["last_seq"] == 3
+    assert "disconnected_at" not in session
+    assert SESSION_ID in session_aliases.values()
+    socketio.emit("probe", {}, room=SESSION_ID)
+    assert [message["name"] for message in client.get_received()] == ["probe"]
@@ -0,0 +1,107 @@
+"""Watchlist admin endpoints and the signed push webhook."""
+
+import hashlib
+import hmac
+import json
+import subprocess
+from urllib.parse import urlparse
+
+import pytest
+
+from app import app, watchlist
+
+ADMIN_TOKEN = "admin-token"
+WEBHOOK_SECRET = "webhook-secret"
+
+
+@pytest.fixture
+def client(monkeypatch):
+    monkeypatch.setenv("WATCHLIST_ADMIN_TOKEN", ADMIN_TOKEN)
+    monkeypatch.setenv("WATCHLIST_WEBHOOK_SECRET", WEBHOOK_SECRET)
+    yield app.test_client()
+    for entry in watchlist.list():
+        watchlist.remove(entry["url"])
+
+
+def admin(token=ADMIN_TOKEN):
+    return {"Authorization": f"Bearer {token}"}
+
+
+def head_sha(url):
+    return subprocess.run(["git", "-C", urlparse(url).path, "rev-parse", "HEAD"],
+                          capture_output=True, text=True, check=True).stdout.strip()
+
+
+def signed_push(client, payload, secret=WEBHOOK_SECRET):
+    body = json.dumps(payload).encode()
+    signature = "sha256=" + hmac.new(secret.encode(), body, hashlib.sha256).hexdigest()
+    return client.post("/api/webhooks/push", data=body, content_type="application/json",
+                       headers={"X-Hub-Signature-256": signature})
+
+
+def push_payload(url, ref="refs/heads/main"):
+    return {"ref": ref, "repository": {"html_url": url, "default_branch": "main"}}
+
+
+def test_watchlist_changes_disabled_without_admin_token(client, monkeypatch, git_repo):
+    monkeypatch.delenv("WATCHLIST_ADMIN_TOKEN")
+
+    response = client.post("/api/watchlist", json={"github_url": git_repo}, headers=admin())
+
+    assert response.status_code == 403
+    assert not watchlist.is_watched(git_repo)
+
+
+@pytest.mark.parametrize("headers", [{}, admin("wrong"), {"Authorization": ADMIN_TOKEN}])
+def test_watchlist_changes_require_admin_token(client, git_repo, headers):
+    assert client.post("/api/watchlist", json={"github_url": git_repo}, headers=headers).status_code == 401
+    assert not watchlist.is_watched(git_repo)
+
+    watchlist.add(git_repo)
+    assert client.delete("/api/watchlist", json={"github_url": git_repo}, headers=headers).status_code == 401
+    assert watchlist.is_watched(git_repo)
+
+
+def test_admin_can_watch_and_unwatch(client, git_repo):
+    response = client.post("/api/watchlist", json={"github_url": git_repo, "github_token": "ghp_secret"},
+                           headers=admin())
+
+    assert response.status_code == 202
+    body = response.get_json()
+    assert body["head_sha"] == head_sha(git_repo)
+    assert body["queued"] is True
+    assert "github_token" not in body["repository"]
+    assert "ghp_secret" not in client.get("/api/watchlist").get_data(as_text=True)
+
+    assert client.delete("/api/watchlist", json={"github_url": git_repo}, headers=admin()).status_code == 200
+    assert client.delete("/api/watchlist", json={"github_url": git_repo}, headers=admin()).status_code == 404
+
+
+def test_webhook_disabled_without_secret(client, monkeypatch, git_repo):
+    monkeypatch.delenv("WATCHLIST_WEBHOOK_SECRET")
+
+    assert signed_push(client, push_payload(git_repo)).status_code == 403
+
+
+def test_webhook_rejects_bad_signatures(client, git_repo):
+    watchlist.add(git_repo)
+    payload = push_payload(git_repo)
+
+    assert signed_push(client, payload, secret="other-secret").status_code == 401
+    unsigned = client.post("/api/webhooks/push", json=payload)
+    assert unsigned.status_code == 401
+    assert watchlist.entry(git_repo)["head_sha"] is None
+
+
+def test_signed_webhook_polls_watched_default_branch_only(client, git_repo):
+    assert "ignored" in signed_push(client, push_payload(git_repo)).get_json()
+
+    watchlist.add(git_repo)
+    assert "ignored" in signed_push(client, push_payload(git_repo, "refs/heads/feature")).get_json()
+    assert watchlist.entry(git_repo)["head_sha"] is None
+
+    response = signed_push(client, push_payload(git_repo))
+    assert response.status_code == 202
+    # The new HEAD comes from the repository, not from the payload
+    assert response.get_json()["head_sha"] == head_sha(git_repo)
+    assert watchlist.entry(git_repo)["status"] == "queued"
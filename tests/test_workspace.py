@@ -0,0 +1,89 @@
+"""Shared checkouts: reuse between callers, access checks and failed checkouts."""
+
+import os
+import subprocess
+from urllib.parse import urlparse
+
+import pytest
+
+from tools.workspace import WorkspaceRegistry
+from tools.workspace_manager import WorkspaceManager
+
+
+@pytest.fixture
+def registry(tmp_path):
+    return WorkspaceRegistry(WorkspaceManager(root=str(tmp_path / "workspaces")), ref_ttl=60)
+
+
+def acquire(registry, url, **kwargs):
+    kwargs.setdefault("strategy", "clone")
+    return registry.acquire(url, **kwargs)
+
+
+def unreachable(url):
+    """A clone URL that cannot read the repository."""
+    return url.replace("/origin/", "/missing/")
+
+
+def commit_change(url):
+    path = urlparse(url).path
+    with open(os.path.join(path, "CHANGELOG.md"), "a") as f:
+        f.write("change\n")
+    git = ["git", "-C", path, "-c", "user.name=test", "-c", "user.email=test@example.com"]
+    subprocess.run(git + ["add", "."], check=True, capture_output=True)
+    subprocess.run(git + ["commit", "-q", "-m", "change"], check=True, capture_output=True)
+    return subprocess.run(git + ["rev-parse", "HEAD"], check=True, capture_output=True, text=True).stdout.strip()
+
+
+def test_callers_share_one_checkout_until_the_last_release(registry, git_repo):
+    first = acquire(registry, git_repo)
+    second = acquire(registry, git_repo)
+
+    assert first["success"] and second["success"]
+    assert second["workspace_key"] == first["workspace_key"]
+    assert second["local_path"] == first["local_path"]
+    assert (first["shared"], second["shared"]) == (False, True)
+    assert os.path.isfile(os.path.join(first["local_path"], "README.md"))
+
+    assert registry.release(first["workspace_key"])["removed"] is False
+    assert os.path.isdir(first["local_path"])
+    assert registry.release(second["workspace_key"])["removed"] is True
+    assert not os.path.exists(first["temp_directory"])
+    assert registry.list_workspaces() == []
+
+
+def test_reuse_requires_access_with_the_callers_url(registry, git_repo):
+    holder = acquire(registry, git_repo)
+
+    refused = acquire(registry, git_repo, clone_url=unreachable(git_repo))
+    assert "error" in refused
+
+    by_sha = acquire(registry, git_repo, clone_url=unreachable(git_repo), ref=holder["sha"])
+    assert "error" in by_sha
+    assert registry.list_workspaces()[0]["refcount"] == 1
+
+    allowed = acquire(registry, git_repo, ref=holder["sha"])
+    assert allowed["workspace_key"] == holder["workspace_key"]
+
+
+def test_branch_is_resolved_again_after_ref_ttl(registry, git_repo):
+    first = acquire(registry, git_repo)
+    new_sha = commit_change(git_repo)
+
+    assert acquire(registry, git_repo)["sha"] == first["sha"]
+    registry.ref_ttl = 0
+    moved = acquire(registry, git_repo)
+    assert moved["sha"] == new_sha
+    assert moved["workspace_key"] != first["workspace_key"]
+
+
+def test_failed_checkout_is_not_shared(registry, git_repo):
+    def broken_cleaner(path):
+        raise OSError("disk full")
+
+    failed = acquire(registry, git_repo, cleaner=broken_cleaner)
+    assert failed["error"] == "disk full"
+    assert registry.list_workspaces() == []
+
+    retried = acquire(registry, git_repo)
+    assert retried["success"] and retried["shared"] is False
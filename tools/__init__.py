@@ -3,10 +3,14 @@ Tools package for the GitHub Repository Analyzer Agent
 """
 
 from .repo_cloner import RepositoryCloner
+from .workspace import WorkspaceRegistry, get_shared_workspace_registry
+from .workspace_manager import WorkspaceManager, WorkspaceQuotaError, get_shared_workspace_manager
 from .langchain_tools import (
     CloneRepositoryTool,
     GetRepositoryStructureTool,
+    ListDirectoryTool,
     FlexibleReadFileTool,
+    ReadFileTool,
     ListClonedRepositoriesTool,
     AnalyzeRepositoryTool,
     CleanupRepositoryTool
@@ -14,9 +18,16 @@ from .langchain_tools import (
 
 __all__ = [
     'RepositoryCloner',
+    'WorkspaceRegistry',
+    'get_shared_workspace_registry',
+    'WorkspaceManager',
+    'WorkspaceQuotaError',
+    'get_shared_workspace_manager',
     'CloneRepositoryTool',
     'GetRepositoryStructureTool', 
+    'ListDirectoryTool',
     'FlexibleReadFileTool',
+    'ReadFileTool',
     'ListClonedRepositoriesTool',
     'AnalyzeRepositoryTool',
     'CleanupRepositoryTool'
@@ -0,0 +1,124 @@
+"""
+Per-commit analysis artifacts for incremental re-analysis.
+
+Each completed analysis is stored under (repository, commit SHA): the file
+index, the extracted structure and per-file summaries, the findings and the
+final verdict. A later analysis of a newer commit starts from the most
+recent artifacts, diffs the two commits and only recomputes what the changed
+paths affect.
+"""
+
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import time
+from typing import Dict, List, Optional
+from .workspace import normalize_repo_url
+
+
+def env_fingerprint(user_env_vars: Optional[Dict]) -> str:
+    """Stable hash of user-provided environment variables (values are not stored)."""
+    items = sorted((user_env_vars or {}).items())
+    return hashlib.sha256(json.dumps(items).encode()).hexdigest()[:16]
+
+
+class AnalysisStore:
+    """
+    JSON artifact files on disk, one directory per repository.
+
+    Args:
+        root: Storage directory (ANALYSIS_STORE_ROOT, default tmp/git-agent-analyses)
+        keep: Artifacts kept per repository (ANALYSIS_STORE_KEEP, default 5)
+    """
+
+    def __init__(self, root: Optional[str] = None, keep: Optional[int] = None):
+        self.root = root or os.getenv(
+            "ANALYSIS_STORE_ROOT", os.path.join(tempfile.gettempdir(), "git-agent-analyses")
+        )
+        self.keep = keep or int(os.getenv("ANALYSIS_STORE_KEEP", "5"))
+        self._lock = threading.Lock()
+        os.makedirs(self.root, exist_ok=True)
+
+    def _repo_dir(self, repo_url: str) -> str:
+        repo = normalize_repo_url(repo_url)
+        digest = hashlib.sha1(repo.encode()).hexdigest()[:16]
+        return os.path.join(self.root, f"{repo.rsplit('/', 1)[-1] or 'repo'}-{digest}")
+
+    def _write_json(self, path: str, data) -> None:
+        tmp = f"{path}.{os.getpid()}.tmp"
+        with open(tmp, 'w', encoding='utf-8') as f:
+            json.dump(data, f)
+        os.replace(tmp, path)
+
+    def _history(self, repo_dir: str) -> List[Dict]:
+        try:
+            with open(os.path.join(repo_dir, "history.json"), encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return []
+
+    def save(self, repo_url: str, sha: str, artifacts: Dict) -> None:
+        """Store the artifacts of an analysis of ``repo_url`` at ``sha``."""
+        repo_dir = self._repo_dir(repo_url)
+        record = {
+            **artifacts,
+            "repository": normalize_repo_url(repo_url),
+            "sha": sha,
+            "saved_at": time.time()
+        }
+        with self._lock:
+            os.makedirs(repo_dir, exist_ok=True)
+            self._write_json(os.path.join(repo_dir, f"{sha}.json"), record)
+            history = [h for h in self._history(repo_dir) if h["sha"] != sha]
+            history.append({
+                "sha": sha,
+                "saved_at": record["saved_at"],
+                "env_fingerprint": artifacts.get("env_fingerprint")
+            })
+            for stale in history[:-self.keep]:
+                try:
+                    os.remove(os.path.join(repo_dir, f"{stale['sha']}.json"))
+                except OSError:
+                    pass
+            self._write_json(os.path.join(repo_dir, "history.json"), history[-self.keep:])
+
+    def load(self, repo_url: str, sha: str) -> Optional[Dict]:
+        """Artifacts stored for ``repo_url`` at ``sha``, or None."""
+        try:
+            with open(os.path.join(self._repo_dir(repo_url), f"{sha}.json"), encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def latest(self, repo_url: str, fingerprint: Optional[str] = None,
+               without_answers: bool = False) -> Optional[Dict]:
+        """
+        Most recent artifacts for ``repo_url``, optionally restricted to
+        analyses run with the same environment-variable fingerprint and, with
+        ``without_answers``, to verdicts that no user's answers went into.
+        """
+        repo_dir = self._repo_dir(repo_url)
+        with self._lock:
+            history = self._history(repo_dir)
+        for entry in reversed(history):
+            if fingerprint is None or entry.get("env_fingerprint") == fingerprint:
+                artifacts = self.load(repo_url, entry["sha"])
+                if artifacts is not None and not (without_answers and artifacts.get("user_responses")):
+                    return artifacts
+        return None
+
+
+# Shared AnalysisStore instance
+_shared_analysis_store = None
+_shared_store_lock = threading.Lock()
+
+
+def get_shared_analysis_store() -> AnalysisStore:
+    """Get or create the process-wide AnalysisStore instance."""
+    global _shared_analysis_store
+    with _shared_store_lock:
+        if _shared_analysis_store is None:
+            _shared_analysis_store = AnalysisStore()
+        return _shared_analysis_store
@@ -0,0 +1,200 @@
+"""
+Archive-download fetch strategy.
+
+Instead of cloning, stream a tarball of a single ref and extract it on the fly.
+Ignore rules and a per-file size cap are applied while streaming, so excluded
+trees and oversized files are never written to disk.
+"""
+
+import os
+import tarfile
+from typing import Callable, Dict, Optional
+from urllib.parse import urlparse
+from .ignore_rules import is_ignored
+
+# Default per-file cap; larger files are skipped during extraction (and reported)
+DEFAULT_MAX_FILE_BYTES = int(os.getenv("ARCHIVE_MAX_FILE_KB", "1024")) * 1024
+
+# Hosts that may receive the GitHub token
+GITHUB_HOSTS = {"github.com", "api.github.com", "codeload.github.com"}
+
+CHUNK_SIZE = 64 * 1024
+
+
+def _owner_repo(url: str) -> Optional[tuple]:
+    parsed = urlparse(url)
+    parts = parsed.path.strip("/").split("/")
+    if len(parts) < 2:
+        return None
+    repo = parts[1][:-4] if parts[1].endswith(".git") else parts[1]
+    return parts[0], repo
+
+
+def archive_url(url: str, ref: str, github_token: Optional[str] = None) -> Optional[str]:
+    """
+    Build the tarball URL for ``ref`` of a repository.
+
+    ``GITHUB_ARCHIVE_BASE`` overrides the host (e.g. a local HTTP stand-in);
+    the archive is then fetched from ``<base>/<owner>/<repo>/tar.gz/<ref>``.
+    """
+    owner_repo = _owner_repo(url)
+    if not owner_repo:
+        return None
+    owner, repo = owner_repo
+    base = os.getenv("GITHUB_ARCHIVE_BASE")
+    if base:
+        return f"{base.rstrip('/')}/{owner}/{repo}/tar.gz/{ref}"
+    if urlparse(url).hostname != "github.com":
+        return None
+    if github_token:
+        # Private repositories are only reachable through the API endpoint
+        return f"https://api.github.com/repos/{owner}/{repo}/tarball/{ref}"
+    return f"https://codeload.github.com/{owner}/{repo}/tar.gz/{ref}"
+
+
+def choose_fetch_strategy(url: str, need_history: bool = False, requested: Optional[str] = None,
+                          local_objects: bool = False) -> str:
+    """
+    Pick 'archive', 'objects' or 'clone' for a repository by what each downloads.
+
+    - 'objects' with a bare clone already in the shared object store
+      (``local_objects``): only the commits since its last fetch
+    - 'archive': the compressed snapshot of one ref, if the host serves archives
+    - 'clone' (or 'objects' without a bare clone): the whole history
+
+    The cheapest available one is used, so a repository analyzed before is
+    served from its bare clone, and otherwise an archive beats a clone.
+    Callers that need history always clone. ``FETCH_STRATEGY`` (or
+    ``requested``) can force any strategy.
+    """
+    requested = (requested or os.getenv("FETCH_STRATEGY", "auto")).lower()
+    if need_history:
+        return "clone"
+    if requested in ("archive", "objects", "clone"):
+        return requested
+    if local_objects:
+        return "objects"
+    if os.getenv("GITHUB_ARCHIVE_BASE") or urlparse(url).hostname == "github.com":
+        return "archive"
+    return "clone"
+
+
+def _safe_member_path(name: str) -> Optional[str]:
+    """Strip the archive's top-level folder and reject unsafe paths."""
+    parts = [p for p in name.replace('\\', '/').split('/') if p and p != '.']
+    if len(parts) < 2 or any(p == '..' for p in parts):
+        return None
+    return '/'.join(parts[1:])
+
+
+def extract_stream(fileobj, on_file: Callable[[str, tarfile.TarFile, tarfile.TarInfo], None],
+                   on_dir: Optional[Callable[[str], None]] = None,
+                   max_file_bytes: int = DEFAULT_MAX_FILE_BYTES) -> Dict:
+    """
+    Walk a streamed tarball once, handing each kept regular file to ``on_file``.
+
+    Returns:
+        Dict with counts of kept, ignored and oversized entries
+    """
+    stats = {"files": 0, "bytes": 0, "skipped_ignored": 0, "skipped_large": []}
+    with tarfile.open(fileobj=fileobj, mode="r|*") as archive:
+        for member in archive:
+            rel_path = _safe_member_path(member.name)
+            if not rel_path:
+                continue
+            if is_ignored(rel_path):
+                stats["skipped_ignored"] += 1
+                continue
+            if member.isdir():
+                if on_dir:
+                    on_dir(rel_path)
+                continue
+            if not member.isfile():
+                # Symlinks, devices and hardlinks are never materialized
+                continue
+            if member.size > max_file_bytes:
+                stats["skipped_large"].append({"path": rel_path, "size": member.size})
+                continue
+            on_file(rel_path, archive, member)
+            stats["files"] += 1
+            stats["bytes"] += member.size
+    return stats
+
+
+def open_archive(url: str, ref: str, github_token: Optional[str] = None, timeout: int = 300):
+    """
+    Start a streaming archive download.
+
+    Returns:
+        (response, source URL) on success, or (None, error message)
+    """
+    source = archive_url(url, ref, github_token)
+    if not source:
+        return None, f"No archive endpoint available for {url}"
+
+    headers = {"Accept": "application/vnd.github+json"}
+    if github_token and urlparse(source).hostname in GITHUB_HOSTS:
+        # Never hand the token to a GITHUB_ARCHIVE_BASE stand-in
+        headers["Authorization"] = f"Bearer {github_token}"
+
+    try:
+        import requests
+        response = requests.get(source, headers=headers, stream=True, timeout=timeout)
+    except Exception as e:
+        return None, f"Archive download failed: {str(e)}"
+
+    if response.status_code != 200:
+        response.close()
+        return None, f"Archive download failed with HTTP {response.status_code}"
+
+    response.raw.decode_content = True
+    return response, source
+
+
+def fetch_archive(url: str, dest: str, ref: str, github_token: Optional[str] = None,
+                  max_file_bytes: int = DEFAULT_MAX_FILE_BYTES, timeout: int = 300) -> Dict:
+    """
+    Download and extract a repository snapshot into ``dest``.
+
+    Args:
+        url: Repository URL
+        dest: Directory to extract into (created if missing)
+        ref: Commit SHA, branch or tag
+        github_token: Optional token for private repositories
+        max_file_bytes: Files larger than this are skipped
+        timeout: Network timeout in seconds
+
+    Returns:
+        Dict with success status and extraction statistics
+    """
+    response, source = open_archive(url, ref, github_token, timeout)
+    if response is None:
+        return {"error": source}
+
+    dest_root = os.path.realpath(dest)
+    os.makedirs(dest_root, exist_ok=True)
+
+    def write_dir(rel_path):
+        os.makedirs(os.path.join(dest_root, rel_path), exist_ok=True)
+
+    def write_file(rel_path, archive, member):
+        target = os.path.realpath(os.path.join(dest_root, rel_path))
+        if not target.startswith(dest_root + os.sep):
+            return
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        source_file = archive.extractfile(member)
+        with open(target, "wb") as out:
+            while True:
+                chunk = source_file.read(CHUNK_SIZE)
+                if not chunk:
+                    break
+                out.write(chunk)
+
+    try:
+        stats = extract_stream(response.raw, write_file, write_dir, max_file_bytes)
+    except (tarfile.TarError, OSError) as e:
+        return {"error": f"Archive extraction failed: {str(e)}"}
+    finally:
+        response.close()
+
+    return {"success": True, "source": source, **stats}
@@ -0,0 +1,294 @@
+"""
+Searchable archive of completed assessments.
+
+Every finished verdict is written to a SQLite database together with the
+fields people search by: repository, verdict, detected stack and the blocker
+text from the REASON section. An FTS5 index over those fields (and the full
+assessment) answers queries such as "all repositories with hardcoded
+localhost blockers" without re-running anything, and archived assessments
+can be served again by id.
+"""
+
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+from typing import Dict, Iterable, List, Optional
+from .workspace import normalize_repo_url
+
+# Marker files that identify parts of a repository's stack
+STACK_MARKERS = {
+    'package.json': 'Node.js',
+    'requirements.txt': 'Python',
+    'pyproject.toml': 'Python',
+    'setup.py': 'Python',
+    'Pipfile': 'Python',
+    'Gemfile': 'Ruby',
+    'composer.json': 'PHP',
+    'go.mod': 'Go',
+    'Cargo.toml': 'Rust',
+    'pom.xml': 'Java',
+    'build.gradle': 'Java',
+    'Dockerfile': 'Docker',
+    'docker-compose.yml': 'Docker Compose',
+    'docker-compose.yaml': 'Docker Compose'
+}
+
+# Frameworks and services recognized in the assessment text
+STACK_KEYWORDS = [
+    'Django', 'Flask', 'FastAPI', 'Express', 'Next.js', 'React', 'Vue', 'Angular',
+    'Rails', 'Laravel', 'Spring', 'PostgreSQL', 'MySQL', 'MongoDB', 'Redis', 'SQLite'
+]
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS assessments (
+    id INTEGER PRIMARY KEY,
+    repository TEXT NOT NULL,
+    sha TEXT,
+    verdict TEXT NOT NULL,
+    stack TEXT NOT NULL,
+    blockers TEXT NOT NULL,
+    final_assessment TEXT NOT NULL,
+    partial INTEGER NOT NULL DEFAULT 0,
+    env_fingerprint TEXT NOT NULL DEFAULT '',
+    source TEXT,
+    created_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS assessments_repository ON assessments (repository, created_at);
+CREATE VIRTUAL TABLE IF NOT EXISTS assessments_fts USING fts5(
+    repository, verdict, stack, blockers, final_assessment,
+    content='assessments', content_rowid='id', tokenize='porter unicode61'
+);
+CREATE TRIGGER IF NOT EXISTS assessments_ai AFTER INSERT ON assessments BEGIN
+    INSERT INTO assessments_fts (rowid, repository, verdict, stack, blockers, final_assessment)
+    VALUES (new.id, new.repository, new.verdict, new.stack, new.blockers, new.final_assessment);
+END;
+CREATE TRIGGER IF NOT EXISTS assessments_ad AFTER DELETE ON assessments BEGIN
+    INSERT INTO assessments_fts (assessments_fts, rowid, repository, verdict, stack, blockers, final_assessment)
+    VALUES ('delete', old.id, old.repository, old.verdict, old.stack, old.blockers, old.final_assessment);
+END;
+"""
+
+
+def parse_verdict(assessment: str) -> str:
+    """YES, NO or UNDETERMINED from the assessment's ANSWER line."""
+    match = re.search(r'ANSWER:\W*(YES|NO|UNDETERMINED)\b', assessment or '', re.IGNORECASE)
+    return match.group(1).upper() if match else 'UNDETERMINED'
+
+
+def parse_blockers(assessment: str) -> List[str]:
+    """Bullet points of the assessment's REASON section."""
+    blockers = []
+    in_reason = False
+    for line in (assessment or '').splitlines():
+        stripped = line.strip()
+        if re.match(r'\**REASONS?\**:\**$', stripped, re.IGNORECASE):
+            in_reason = True
+            continue
+        if not in_reason:
+            continue
+        if stripped.startswith('#') or re.match(r'\*\*[^*]+:\*\*$', stripped):
+            break
+        bullet = re.match(r'(?:[-*•]|\d+[.)])\s+(.*)', stripped)
+        if bullet:
+            blockers.append(bullet.group(1).strip())
+    return blockers
+
+
+def detect_stack(file_names: Iterable[str], assessment: str = '') -> List[str]:
+    """Stack components from marker files and frameworks named in the assessment."""
+    stack = []
+    for path in file_names or ():
+        label = STACK_MARKERS.get(path.rsplit('/', 1)[-1])
+        if label and label not in stack:
+            stack.append(label)
+    for keyword in STACK_KEYWORDS:
+        if keyword not in stack and re.search(rf'(?<![\w.]){re.escape(keyword)}(?![\w])', assessment or ''):
+            stack.append(keyword)
+    return stack
+
+
+def _fts_query(query: str) -> str:
+    """
+    Quote each term so user input never breaks FTS5 syntax. Terms of three
+    or more characters match as prefixes (so "postgres" finds PostgreSQL);
+    shorter ones only match whole words, or "C++" would find every github.com URL.
+    """
+    terms = re.findall(r'[\w.\-]+', query)
+    return ' '.join('"' + term.replace('"', '""') + ('"*' if len(term) >= 3 else '"') for term in terms)
+
+
+def env_fingerprint(env_vars: Optional[Dict[str, str]]) -> str:
+    """Short digest of the user-provided environment variables ('' when there are none)."""
+    if not env_vars:
+        return ''
+    encoded = json.dumps(sorted((str(k), str(v)) for k, v in env_vars.items())).encode()
+    return hashlib.sha256(encoded).hexdigest()[:16]
+
+
+def default_archive_path() -> str:
+    """Per-user data directory ($XDG_DATA_HOME/git-agent, default ~/.local/share/git-agent)."""
+    data_home = os.getenv("XDG_DATA_HOME") or os.path.join(os.path.expanduser("~"), ".local", "share")
+    return os.path.join(data_home, "git-agent", "assessments.db")
+
+
+class AssessmentArchive:
+    """
+    SQLite store of completed assessments with an FTS5 index.
+
+    Args:
+        path: Database file (ASSESSMENT_ARCHIVE_PATH, default see default_archive_path)
+    """
+
+    def __init__(self, path: Optional[str] = None):
+        self.path = path or os.getenv("ASSESSMENT_ARCHIVE_PATH") or default_archive_path()
+        directory = os.path.dirname(os.path.abspath(self.path))
+        if not os.path.isdir(directory):
+            # Assessments can quote repository internals; keep them private to this user
+            os.makedirs(directory, mode=0o700, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.path, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        with self._lock, self._conn:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.executescript(SCHEMA)
+            columns = {row["name"] for row in self._conn.execute("PRAGMA table_info(assessments)")}
+            if "env_fingerprint" not in columns:
+                # Archives created before verdicts were kept apart by environment
+                self._conn.execute("ALTER TABLE assessments ADD COLUMN env_fingerprint TEXT NOT NULL DEFAULT ''")
+
+    def add(self, repo_url: str, final_assessment: str, sha: Optional[str] = None,
+            file_names: Optional[Iterable[str]] = None, partial: bool = False,
+            source: Optional[str] = None, env_vars: Optional[Dict[str, str]] = None) -> int:
+        """
+        Archive a finished assessment.
+
+        An earlier assessment of the same commit with the same environment
+        variables is replaced, except that a partial one never replaces a
+        complete one (the complete one is kept and its id returned).
+
+        Args:
+            repo_url: Repository URL or local path
+            final_assessment: Verdict text
+            sha: Analyzed commit, when known
+            file_names: Repository paths used to detect the stack
+            partial: The analysis stopped early
+            source: Where the analysis ran ("web", "api", "batch", ...)
+            env_vars: User-provided environment variables the verdict is based on
+                (only a digest is stored)
+
+        Returns:
+            Id of the archived assessment
+        """
+        repository = normalize_repo_url(repo_url) if repo_url.startswith('http') else repo_url
+        verdict = parse_verdict(final_assessment)
+        # A deployable verdict's REASON list explains why it works, not what blocks it
+        blockers = parse_blockers(final_assessment) if verdict != 'YES' else []
+        fingerprint = env_fingerprint(env_vars)
+        with self._lock, self._conn:
+            if sha:
+                earlier = self._conn.execute(
+                    "SELECT id, partial FROM assessments WHERE repository = ? AND sha = ? AND env_fingerprint = ?",
+                    (repository, sha, fingerprint)
+                ).fetchall()
+                complete = [row["id"] for row in earlier if not row["partial"]]
+                if partial and complete:
+                    return complete[0]
+                self._conn.executemany("DELETE FROM assessments WHERE id = ?", [(row["id"],) for row in earlier])
+            cursor = self._conn.execute(
+                "INSERT INTO assessments (repository, sha, verdict, stack, blockers, final_assessment,"
+                " partial, env_fingerprint, source, created_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (repository, sha, verdict, ', '.join(detect_stack(file_names, final_assessment)),
+                 '\n'.join(blockers), final_assessment, int(partial), fingerprint, source, time.time())
+            )
+            return cursor.lastrowid
+
+    def get(self, assessment_id: int) -> Optional[Dict]:
+        """The archived assessment with ``assessment_id``, or None."""
+        with self._lock:
+            row = self._conn.execute("SELECT * FROM assessments WHERE id = ?", (assessment_id,)).fetchone()
+        return self._record(row) if row else None
+
+    def search(self, query: str = '', verdict: Optional[str] = None, repository: Optional[str] = None,
+               limit: int = 20, offset: int = 0) -> Dict:
+        """
+        Full-text search over archived assessments.
+
+        Args:
+            query: Terms matched against repository, verdict, stack, blockers and
+                the assessment (all must match; empty lists the newest)
+            verdict: Only YES, NO or UNDETERMINED verdicts
+            repository: Only this repository
+            limit: Maximum results
+            offset: Results to skip
+
+        Returns:
+            Dict with total count and results (best match first, newest first without a query)
+        """
+        conditions, params = [], []
+        match = _fts_query(query or '')
+        if match:
+            source = "assessments_fts JOIN assessments a ON a.id = assessments_fts.rowid"
+            conditions.append("assessments_fts MATCH ?")
+            params.append(match)
+            # Blocker hits weigh most; the snippet comes from the best-matching column
+            columns = "a.*, snippet(assessments_fts, -1, '[', ']', '…', 16) AS snippet"
+            order = "bm25(assessments_fts, 2.0, 1.0, 2.0, 4.0, 1.0), a.created_at DESC"
+        else:
+            source = "assessments a"
+            columns = "a.*"
+            order = "a.created_at DESC"
+        if verdict:
+            conditions.append("a.verdict = ?")
+            params.append(verdict.upper())
+        if repository:
+            conditions.append("a.repository = ?")
+            params.append(normalize_repo_url(repository) if repository.startswith('http') else repository)
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+        with self._lock:
+            total = self._conn.execute(f"SELECT COUNT(*) FROM {source} {where}", params).fetchone()[0]
+            rows = self._conn.execute(
+                f"SELECT {columns} FROM {source} {where} ORDER BY {order} LIMIT ? OFFSET ?",
+                params + [limit, offset]
+            ).fetchall()
+        return {"total": total, "results": [self._record(row, full=False) for row in rows]}
+
+    def _record(self, row: sqlite3.Row, full: bool = True) -> Dict:
+        record = {
+            "id": row["id"],
+            "repository": row["repository"],
+            "sha": row["sha"],
+            "verdict": row["verdict"],
+            "stack": [part for part in row["stack"].split(', ') if part],
+            "blockers": [line for line in row["blockers"].split('\n') if line],
+            "partial": bool(row["partial"]),
+            "source": row["source"],
+            "created_at": row["created_at"]
+        }
+        if full:
+            record["final_assessment"] = row["final_assessment"]
+        if "snippet" in row.keys():
+            record["snippet"] = row["snippet"]
+        return record
+
+    def stats(self) -> Dict:
+        with self._lock:
+            rows = self._conn.execute("SELECT verdict, COUNT(*) FROM assessments GROUP BY verdict").fetchall()
+        return {verdict: count for verdict, count in rows}
+
+
+# Shared AssessmentArchive instance
+_shared_archive = None
+_shared_archive_lock = threading.Lock()
+
+
+def get_shared_assessment_archive() -> AssessmentArchive:
+    """Get or create the process-wide AssessmentArchive instance."""
+    global _shared_archive
+    with _shared_archive_lock:
+        if _shared_archive is None:
+            _shared_archive = AssessmentArchive()
+        return _shared_archive
@@ -0,0 +1,132 @@
+"""
+Cooperative cancellation for analyses.
+
+A CancellationToken is created per analysis and handed to everything that
+can block for long: the clone subprocess, rate limiter waits and LLM calls.
+Cancelling it (e.g. when the client disconnects) kills registered
+subprocesses, aborts in-flight requests through their callbacks, and makes
+every later checkpoint raise AnalysisCancelled so the pipeline unwinds and
+releases its workspace and slots.
+"""
+
+import os
+import signal
+import subprocess
+import threading
+import time
+from typing import Callable, Dict, List, Optional
+
+
+class AnalysisCancelled(Exception):
+    """The analysis was cancelled; nobody is waiting for its result."""
+
+
+class CancellationToken:
+    """Cancellation flag with callbacks that run once when it is set."""
+
+    def __init__(self):
+        self._event = threading.Event()
+        self._lock = threading.Lock()
+        self._callbacks: List[Callable[[], None]] = []
+        self.reason: Optional[str] = None
+
+    @property
+    def cancelled(self) -> bool:
+        return self._event.is_set()
+
+    def cancel(self, reason: str = "cancelled") -> None:
+        """Set the token and run the registered callbacks (idempotent)."""
+        with self._lock:
+            if self._event.is_set():
+                return
+            self.reason = reason
+            self._event.set()
+            callbacks, self._callbacks = self._callbacks, []
+        for callback in callbacks:
+            try:
+                callback()
+            except Exception:
+                pass
+
+    def on_cancel(self, callback: Callable[[], None]) -> Callable[[], None]:
+        """
+        Run ``callback`` when the token is cancelled (immediately if it
+        already is). Returns a function that unregisters it.
+        """
+        with self._lock:
+            if not self._event.is_set():
+                self._callbacks.append(callback)
+                return lambda: self._unregister(callback)
+        callback()
+        return lambda: None
+
+    def _unregister(self, callback: Callable[[], None]) -> None:
+        with self._lock:
+            if callback in self._callbacks:
+                self._callbacks.remove(callback)
+
+    def raise_if_cancelled(self) -> None:
+        if self._event.is_set():
+            raise AnalysisCancelled(self.reason)
+
+    def wait(self, timeout: Optional[float] = None) -> bool:
+        """Sleep up to ``timeout`` seconds; returns True as soon as the token is cancelled."""
+        return self._event.wait(timeout)
+
+
+def check_cancelled(token: Optional[CancellationToken]) -> None:
+    """Checkpoint that accepts a missing token."""
+    if token is not None:
+        token.raise_if_cancelled()
+
+
+def sleep(seconds: float, token: Optional[CancellationToken] = None) -> None:
+    """time.sleep that wakes up and raises AnalysisCancelled when ``token`` is cancelled."""
+    if token is None:
+        time.sleep(seconds)
+    elif token.wait(seconds):
+        token.raise_if_cancelled()
+
+
+def run_cancellable(args: List[str], timeout: Optional[float] = None,
+                    token: Optional[CancellationToken] = None,
+                    should_kill: Optional[Callable[[], bool]] = None,
+                    env: Optional[Dict[str, str]] = None, text: bool = True) -> subprocess.CompletedProcess:
+    """
+    subprocess.run(capture_output=True, text=text, env=env) that kills the
+    process (and its children, e.g. git's remote helpers) when ``token`` is
+    cancelled.
+
+    Args:
+        args: Command line
+        timeout: Seconds before subprocess.TimeoutExpired is raised
+        token: Cancellation token; cancelling it raises AnalysisCancelled
+        should_kill: Consulted on cancellation; returning False lets the
+            process finish (e.g. a clone other analyses are waiting for)
+    """
+    process = subprocess.Popen(
+        args, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=text, env=env, start_new_session=True
+    )
+
+    def kill():
+        try:
+            os.killpg(process.pid, signal.SIGKILL)
+        except (ProcessLookupError, PermissionError):
+            pass
+
+    def on_cancel():
+        if should_kill is None or should_kill():
+            kill()
+
+    unregister = token.on_cancel(on_cancel) if token is not None else (lambda: None)
+    try:
+        stdout, stderr = process.communicate(timeout=timeout)
+    except subprocess.TimeoutExpired:
+        kill()
+        process.communicate()
+        raise
+    finally:
+        unregister()
+    if token is not None and token.cancelled and process.returncode < 0:
+        raise AnalysisCancelled(token.reason)
+    return subprocess.CompletedProcess(args, process.returncode, stdout, stderr)
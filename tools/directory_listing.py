@@ -0,0 +1,206 @@
+"""
+One-level directory listings with per-subtree aggregates.
+
+Instead of a whole tree at a fixed depth, the agent lists one directory at a
+time. Every child directory carries the file count, bytes and dominant
+languages of its whole subtree, so the agent can tell which subtrees are
+worth expanding. Aggregates for all directories are computed in one pass
+over the commit's file index. Listings are cached per (commit SHA, path) and
+paged with cursors.
+"""
+
+import os
+import threading
+from collections import Counter, OrderedDict, defaultdict
+from typing import Dict, List, Optional, Tuple
+from .language_detection import AMBIGUOUS_EXTENSIONS, HEAD_BYTES, classify_path, resolve_language
+from .tree_walk import order_dirs, order_files
+
+# Languages named per directory
+TOP_LANGUAGES = 3
+
+
+def classify_files(paths: List[str], snapshot=None, max_content_reads: Optional[int] = None) -> Dict[str, Optional[str]]:
+    """
+    Language of every path, decided as detect_languages decides it.
+
+    Ambiguous extensions (``.h``, ``.m``, ...) and extension-less scripts are
+    resolved from their first bytes, up to ``max_content_reads`` files
+    (LANGUAGE_MAX_CONTENT_READS, default 400). Files past that budget, or all
+    of them without a snapshot, get the language most often found for their
+    group; an ambiguous extension never read falls back to its usual language.
+    """
+    max_content_reads = max_content_reads if max_content_reads is not None else int(
+        os.getenv("LANGUAGE_MAX_CONTENT_READS", "400"))
+    languages: Dict[str, Optional[str]] = {}
+    found: Dict[str, Counter] = defaultdict(Counter)
+    pending: Dict[str, List[str]] = defaultdict(list)
+    reads = 0
+    for path in paths:
+        group = classify_path(path)
+        if group.startswith('lang:'):
+            languages[path] = group[5:]
+        elif group == 'other':
+            languages[path] = None
+        elif snapshot is not None and reads < max_content_reads:
+            reads += 1
+            try:
+                language = resolve_language(group, snapshot.read_bytes(path, HEAD_BYTES))
+            except OSError:
+                language = None
+            languages[path] = language
+            if language:
+                found[group][language] += 1
+        else:
+            pending[group].append(path)
+    for group, members in pending.items():
+        if found[group]:
+            language = found[group].most_common(1)[0][0]
+        else:
+            language = AMBIGUOUS_EXTENSIONS.get(group[4:]) if group.startswith('ext:') else None
+        languages.update((path, language) for path in members)
+    return languages
+
+
+class DirectoryIndex:
+    """
+    Directory tree of one commit with subtree aggregates.
+
+    Args:
+        file_index: ``path -> size`` of every file in the commit
+        snapshot: The commit's snapshot, read to resolve ambiguous languages
+            (see classify_files)
+    """
+
+    def __init__(self, file_index: Dict[str, int], snapshot=None):
+        self.subdirs: Dict[str, set] = defaultdict(set)
+        self.files: Dict[str, Dict[str, int]] = defaultdict(dict)
+        self.file_counts: Dict[str, int] = defaultdict(int)
+        self.bytes: Dict[str, int] = defaultdict(int)
+        self.language_bytes: Dict[str, Dict[str, int]] = defaultdict(lambda: defaultdict(int))
+        self.subdirs.setdefault("", set())
+        paths = [path for path in file_index if path != '.git' and not path.startswith('.git/')]
+        languages = classify_files(paths, snapshot)
+        for path in paths:
+            size = file_index[path]
+            parent, _, name = path.rpartition('/')
+            self.files[parent][name] = size
+            language = languages[path]
+            # Charge the file to every directory above it
+            directory = parent
+            while True:
+                self.file_counts[directory] += 1
+                self.bytes[directory] += size
+                if language:
+                    self.language_bytes[directory][language] += size
+                if not directory:
+                    break
+                up, _, name = directory.rpartition('/')
+                self.subdirs[up].add(name)
+                directory = up
+
+    def is_dir(self, path: str) -> bool:
+        return path in self.subdirs or path in self.files
+
+    def summary(self, path: str) -> Dict:
+        """File count, bytes and dominant languages of the subtree at ``path``."""
+        languages = self.language_bytes.get(path, {})
+        counted = sum(languages.values())
+        top = sorted(languages.items(), key=lambda item: item[1], reverse=True)[:TOP_LANGUAGES]
+        return {
+            "files": self.file_counts.get(path, 0),
+            "bytes": self.bytes.get(path, 0),
+            "languages": [f"{language} {100.0 * size / counted:.0f}%" for language, size in top]
+        }
+
+    def entries(self, path: str) -> List[Dict]:
+        """Children of ``path``: directories (high-signal first) with aggregates, then files."""
+        entries = []
+        for name in order_dirs(self.subdirs.get(path, ())):
+            child = f"{path}/{name}" if path else name
+            entries.append({"name": f"{name}/", "type": "directory", **self.summary(child)})
+        files = self.files.get(path, {})
+        for name in order_files(files):
+            entries.append({"name": name, "type": "file", "size": files[name]})
+        return entries
+
+
+class ListingCache:
+    """
+    LRU of directory listings keyed by (commit SHA, path).
+
+    Args:
+        max_entries: Listings kept (DIRECTORY_LISTING_CACHE, default 1024)
+    """
+
+    def __init__(self, max_entries: Optional[int] = None):
+        self.max_entries = max_entries or int(os.getenv("DIRECTORY_LISTING_CACHE", "1024"))
+        self._lock = threading.Lock()
+        self._listings: "OrderedDict[Tuple[str, str], Dict]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, sha: str, path: str) -> Optional[Dict]:
+        with self._lock:
+            listing = self._listings.get((sha, path))
+            if listing is None:
+                self.misses += 1
+                return None
+            self._listings.move_to_end((sha, path))
+            self.hits += 1
+            return listing
+
+    def put(self, sha: str, path: str, listing: Dict) -> None:
+        with self._lock:
+            self._listings[(sha, path)] = listing
+            self._listings.move_to_end((sha, path))
+            while len(self._listings) > self.max_entries:
+                self._listings.popitem(last=False)
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {"listings": len(self._listings), "hits": self.hits, "misses": self.misses}
+
+
+def encode_listing_cursor(sha: str, path: str, offset: int) -> str:
+    return f"{sha[:12]}:{offset}:{path}"
+
+
+def decode_listing_cursor(cursor: str, sha: str, path: str) -> int:
+    """Offset stored in ``cursor``; raises ValueError if it belongs to another commit or directory."""
+    try:
+        cursor_sha, offset, cursor_path = cursor.split(':', 2)
+        offset = int(offset)
+    except ValueError:
+        raise ValueError(f"Invalid cursor: {cursor}")
+    if cursor_sha != sha[:12] or cursor_path != path:
+        raise ValueError("Cursor belongs to another listing; list the directory again without a cursor")
+    return offset
+
+
+def page_listing(listing: Dict, sha: str, path: str, cursor: Optional[str], limit: int) -> Dict:
+    """Slice one page out of a cached listing."""
+    offset = decode_listing_cursor(cursor, sha, path) if cursor else 0
+    entries = listing["entries"]
+    end = offset + limit
+    return {
+        "path": path or "/",
+        "directory": listing["directory"],
+        "entries": entries[offset:end],
+        "total_entries": len(entries),
+        "next_cursor": encode_listing_cursor(sha, path, end) if end < len(entries) else None
+    }
+
+
+# Shared ListingCache instance
+_shared_listing_cache = None
+_shared_listing_cache_lock = threading.Lock()
+
+
+def get_shared_listing_cache() -> ListingCache:
+    """Get or create the process-wide ListingCache instance."""
+    global _shared_listing_cache
+    with _shared_listing_cache_lock:
+        if _shared_listing_cache is None:
+            _shared_listing_cache = ListingCache()
+        return _shared_listing_cache
@@ -0,0 +1,253 @@
+"""
+Coalesced, sequenced delivery of analysis events.
+
+Events published for a session within a short flush window go out as one
+``analysis_batch`` message instead of one message each. Every event gets a
+per-session sequence number and is kept in a bounded log, so a client that
+reconnects can ask for everything after the last sequence it saw and
+receive just the events it missed. Large text fields are deflated and sent as
+binary attachments, which Socket.IO transmits without base64 or JSON escaping.
+"""
+
+import logging
+import os
+import queue
+import socket
+import threading
+import time
+import zlib
+from collections import deque
+from typing import Any, Callable, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# Statuses that end a wait on the client; they are flushed without delay
+URGENT_STATUSES = {"questions_ready", "completed", "error", "cancelled"}
+
+# Marker of a deflated field in an encoded payload
+DEFLATE_KEY = "__deflate__"
+
+
+def encode_payload(value: Any, threshold: int) -> Any:
+    """Replace strings of at least ``threshold`` bytes with ``{DEFLATE_KEY: <deflated bytes>}``."""
+    if isinstance(value, str):
+        raw = value.encode("utf-8")
+        if len(raw) >= threshold:
+            return {DEFLATE_KEY: zlib.compress(raw, 6)}
+        return value
+    if isinstance(value, dict):
+        return {key: encode_payload(item, threshold) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [encode_payload(item, threshold) for item in value]
+    return value
+
+
+def decode_payload(value: Any) -> Any:
+    """Inverse of encode_payload (the browser does the same with DecompressionStream)."""
+    if isinstance(value, dict):
+        if set(value) == {DEFLATE_KEY}:
+            return zlib.decompress(value[DEFLATE_KEY]).decode("utf-8")
+        return {key: decode_payload(item) for key, item in value.items()}
+    if isinstance(value, list):
+        return [decode_payload(item) for item in value]
+    return value
+
+
+class _Room:
+    def __init__(self, history: int):
+        self.seq = 0
+        self.log: deque = deque(maxlen=history)
+        self.pending: List[Dict] = []
+        self.flush_scheduled = False
+        self.touched = time.time()
+
+
+class EventStream:
+    """
+    Per-session event log with coalesced flushing.
+
+    Args:
+        send: Called as ``send(room, batch)`` to deliver a batch
+        spawn: Runs a callable in the background (e.g. socketio.start_background_task)
+        sleep: Sleep function matching ``spawn``'s concurrency model
+        flush_interval: Coalescing window in seconds (EVENT_FLUSH_MS, default 100 ms)
+        binary_threshold: Deflate text fields of at least this many bytes
+            (EVENT_BINARY_THRESHOLD, default 2048; 0 disables)
+        history: Events kept per session for replay (EVENT_HISTORY, default 200)
+    """
+
+    def __init__(self, send: Callable[[str, Dict], None],
+                 spawn: Optional[Callable[[Callable[[], None]], Any]] = None,
+                 sleep: Optional[Callable[[float], None]] = None,
+                 flush_interval: Optional[float] = None, binary_threshold: Optional[int] = None,
+                 history: Optional[int] = None):
+        self.send = send
+        self.spawn = spawn or (lambda fn: threading.Thread(target=fn, daemon=True).start())
+        self.sleep = sleep or time.sleep
+        self.flush_interval = flush_interval if flush_interval is not None else (
+            int(os.getenv("EVENT_FLUSH_MS", "100")) / 1000.0)
+        self.binary_threshold = binary_threshold if binary_threshold is not None else int(
+            os.getenv("EVENT_BINARY_THRESHOLD", "2048"))
+        self.history = history or int(os.getenv("EVENT_HISTORY", "200"))
+        self._rooms: Dict[str, _Room] = {}
+        self._lock = threading.Lock()
+        # Held from taking a room's pending events until they are sent, so batches stay in order
+        self._send_lock = threading.Lock()
+        self.counters = {"events": 0, "batches": 0, "bytes_in": 0, "bytes_out": 0, "replays": 0}
+
+    def publish(self, room: str, event: Dict) -> int:
+        """Queue ``event`` for ``room`` and return its sequence number."""
+        with self._lock:
+            state = self._rooms.setdefault(room, _Room(self.history))
+            state.seq += 1
+            event = {**event, "seq": state.seq}
+            state.log.append(event)
+            state.pending.append(event)
+            state.touched = time.time()
+            self.counters["events"] += 1
+            urgent = event.get("status") in URGENT_STATUSES or self.flush_interval <= 0
+            schedule = not urgent and not state.flush_scheduled
+            if schedule:
+                state.flush_scheduled = True
+        if urgent:
+            self.flush(room)
+        elif schedule:
+            self.spawn(lambda: self._delayed_flush(room))
+        return event["seq"]
+
+    def _delayed_flush(self, room: str) -> None:
+        self.sleep(self.flush_interval)
+        self.flush(room)
+
+    def flush(self, room: str) -> None:
+        """Send everything pending for ``room`` as one batch."""
+        with self._send_lock:
+            with self._lock:
+                state = self._rooms.get(room)
+                if state is None or not state.pending:
+                    if state is not None:
+                        state.flush_scheduled = False
+                    return
+                events, state.pending = state.pending, []
+                state.flush_scheduled = False
+            self._deliver(room, events)
+
+    def replay(self, room: str, after_seq: int) -> int:
+        """
+        Resend the events after ``after_seq`` that are still in the log.
+
+        Returns:
+            Number of events resent
+        """
+        with self._send_lock:
+            with self._lock:
+                state = self._rooms.get(room)
+                # Pending events go out with the replay instead of in a later batch
+                events = [e for e in state.log if e["seq"] > after_seq] if state else []
+                if state:
+                    state.pending = []
+                self.counters["replays"] += 1
+            if events:
+                self._deliver(room, events, replay=True)
+        return len(events)
+
+    def _deliver(self, room: str, events: List[Dict], replay: bool = False) -> None:
+        batch = {
+            "events": encode_payload(events, self.binary_threshold) if self.binary_threshold else events,
+            "last_seq": events[-1]["seq"],
+            "replay": replay
+        }
+        with self._lock:
+            self.counters["batches"] += 1
+            self.counters["bytes_in"] += _size(events)
+            self.counters["bytes_out"] += _size(batch["events"])
+        self.send(room, batch)
+
+    def last_seq(self, room: str) -> int:
+        with self._lock:
+            state = self._rooms.get(room)
+            return state.seq if state else 0
+
+    def last_event(self, room: str) -> Optional[Dict]:
+        with self._lock:
+            state = self._rooms.get(room)
+            return state.log[-1] if state and state.log else None
+
+    def forget(self, room: str) -> None:
+        with self._lock:
+            self._rooms.pop(room, None)
+
+    def stats(self) -> Dict:
+        with self._lock:
+            counters = dict(self.counters)
+            rooms = len(self._rooms)
+        counters["sessions"] = rooms
+        counters["events_per_batch"] = round(counters["events"] / counters["batches"], 2) if counters["batches"] else 0.0
+        return counters
+
+
+def _size(value: Any) -> int:
+    """Approximate wire size: text as UTF-8, binary attachments as-is."""
+    if isinstance(value, bytes):
+        return len(value)
+    if isinstance(value, str):
+        return len(value.encode("utf-8"))
+    if isinstance(value, dict):
+        return sum(_size(k) + _size(v) for k, v in value.items())
+    if isinstance(value, (list, tuple)):
+        return sum(_size(v) for v in value)
+    return len(str(value))
+
+
+class LoopBridge:
+    """
+    Runs calls made from worker threads on the server's event loop.
+
+    Under eventlet or gevent, socket writes must happen on the loop's own
+    thread. Analysis workers are native threads, so their emits are queued
+    here and a background task on the loop drains the queue. The task blocks
+    on a socket pair (cooperative once the socket module is patched), and a
+    worker writes one wake-up byte when the queue needs draining, so an idle
+    loop is never woken.
+
+    Args:
+        spawn: Starts a task on the event loop (socketio.start_background_task)
+    """
+
+    def __init__(self, spawn: Callable[..., Any]):
+        self.spawn = spawn
+        self._queue: "queue.Queue" = queue.Queue()
+        self._wake_reader, self._wake_writer = socket.socketpair()
+        # At most one wake-up byte is in flight, so writing it never blocks a worker
+        self._wake_lock = threading.Lock()
+        self._wake_pending = False
+        self._started = False
+
+    def call(self, fn: Callable[..., Any], *args, **kwargs) -> None:
+        """Queue ``fn(*args, **kwargs)`` to run on the loop."""
+        self._queue.put((fn, args, kwargs))
+        with self._wake_lock:
+            if self._wake_pending:
+                return
+            self._wake_pending = True
+        self._wake_writer.send(b"\0")
+
+    def start(self) -> None:
+        if not self._started:
+            self._started = True
+            self.spawn(self._run)
+
+    def _run(self) -> None:
+        while True:
+            self._wake_reader.recv(64)
+            with self._wake_lock:
+                self._wake_pending = False
+            while True:
+                try:
+                    fn, args, kwargs = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                try:
+                    fn(*args, **kwargs)
+                except Exception:
+                    logger.exception("Bridged call failed")
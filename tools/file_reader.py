@@ -0,0 +1,186 @@
+"""
+Paged, range-based file reads over repository snapshots.
+
+Reads work on a byte buffer (an mmap for files on disk, the blob itself for
+in-memory and object-store snapshots) and only decode the window that is
+returned. Binary and minified files are detected from a small sample, and
+every response carries a cursor to continue from where it stopped.
+"""
+
+import codecs
+import os
+from typing import Dict, Optional
+
+SNIFF_BYTES = 8192
+
+# Extensions whose files are routinely minified into a few huge lines
+MINIFIABLE_EXTENSIONS = {'.js', '.mjs', '.css', '.json', '.svg', '.map', '.html'}
+
+
+def sniff(sample: bytes, file_path: str = "") -> Dict:
+    """
+    Classify a file from its first bytes.
+
+    Returns:
+        Dict with 'encoding', 'binary' and 'minified' keys
+    """
+    if sample.startswith(codecs.BOM_UTF8):
+        encoding = "utf-8-sig"
+    elif sample.startswith(codecs.BOM_UTF16_LE) or sample.startswith(codecs.BOM_UTF16_BE):
+        return {"encoding": "utf-16", "binary": False, "minified": False}
+    else:
+        encoding = "utf-8"
+
+    if b"\0" in sample:
+        return {"encoding": None, "binary": True, "minified": False}
+
+    try:
+        sample.decode(encoding)
+    except UnicodeDecodeError as e:
+        # A multi-byte character cut off at the end of the sample is fine
+        if e.start < len(sample) - 4:
+            encoding = "latin-1"
+            control = sum(1 for b in sample if b < 32 and b not in (9, 10, 12, 13))
+            if sample and control / len(sample) > 0.1:
+                return {"encoding": None, "binary": True, "minified": False}
+
+    minified = False
+    ext = os.path.splitext(file_path)[1].lower()
+    if ext in MINIFIABLE_EXTENSIONS or file_path.endswith(('.min.js', '.min.css')):
+        lines = sample.count(b"\n") + 1
+        minified = len(sample) >= 1024 and len(sample) / lines > 500
+
+    return {"encoding": encoding, "binary": False, "minified": minified}
+
+
+def encode_cursor(offset: int, line: int, stop: Optional[int] = None) -> str:
+    cursor = f"{offset}:{line}"
+    return f"{cursor}:{stop}" if stop is not None else cursor
+
+
+def decode_cursor(cursor: str) -> tuple:
+    offset, line, stop = (str(cursor).split(":") + ["", ""])[:3]
+    return int(offset), int(line or 0), int(stop) if stop else None
+
+
+def _line_offset(buf, size: int, line: int, start: int = 0, start_line: int = 1) -> int:
+    """Byte offset at which 1-based ``line`` begins, scanning forward from ``start``."""
+    pos = start
+    current = start_line
+    while current < line and pos < size:
+        newline = buf.find(b"\n", pos)
+        if newline < 0:
+            return size
+        pos = newline + 1
+        current += 1
+    return pos
+
+
+def _tail_offset(buf, size: int, lines: int) -> int:
+    """Byte offset at which the last ``lines`` lines begin."""
+    end = size - 1 if size and buf[size - 1:size] == b"\n" else size
+    pos = end
+    for _ in range(lines):
+        newline = buf.rfind(b"\n", 0, pos)
+        if newline < 0:
+            return 0
+        pos = newline
+    return pos + 1
+
+
+def _char_boundary(buf, pos: int, size: int) -> int:
+    """Move ``pos`` back so it doesn't split a UTF-8 multi-byte sequence."""
+    while 0 < pos < size and (buf[pos] & 0xC0) == 0x80:
+        pos -= 1
+    return pos
+
+
+def read_range(snapshot, file_path: str, max_chars: int = 10000,
+               start_line: Optional[int] = None, end_line: Optional[int] = None,
+               offset: Optional[int] = None, length: Optional[int] = None,
+               tail_lines: Optional[int] = None, cursor: Optional[str] = None,
+               force: bool = False) -> Dict:
+    """
+    Read a window of a file without decoding the rest of it.
+
+    Exactly one way of positioning is used, in this order of precedence:
+    ``cursor`` (from a previous response), ``tail_lines``, ``start_line``
+    (optionally bounded by ``end_line``), ``offset`` (bytes), else the start.
+    ``length`` bounds the range to that many bytes from where it starts.
+    At most ``max_chars`` characters are returned per read.
+    Binary files, and minified files read without an explicit range, are
+    skipped unless ``force`` is set.
+
+    Returns:
+        Dict with the decoded content, byte/line positions, detected encoding
+        and 'next_cursor' (None once the end of the requested range is reached)
+    """
+    size = snapshot.getsize(file_path)
+    with snapshot.buffer(file_path) as buf:
+        info = sniff(bytes(buf[:SNIFF_BYTES]), file_path)
+        result = {
+            "file_path": file_path,
+            "total_bytes": size,
+            "encoding": info["encoding"],
+            "binary": info["binary"],
+            "minified": info["minified"]
+        }
+        if info["binary"] and not force:
+            return {**result, "content": "", "skipped": "binary file", "next_cursor": None}
+        explicit_range = any(v is not None for v in (cursor, tail_lines, start_line, offset, length))
+        if info["minified"] and not (force or explicit_range):
+            return {**result, "content": "", "skipped": "minified file", "next_cursor": None}
+
+        line = None
+        stop = size
+        if cursor:
+            start, line, bound = decode_cursor(cursor)
+            line = line or None
+            if bound is not None:
+                stop = min(bound, size)
+            elif end_line and line:
+                stop = _line_offset(buf, size, end_line + 1, start, line)
+        elif tail_lines:
+            start = _tail_offset(buf, size, tail_lines)
+        elif start_line:
+            start = _line_offset(buf, size, start_line)
+            line = start_line
+            if end_line:
+                stop = _line_offset(buf, size, end_line + 1, start, start_line)
+        else:
+            start = min(max(offset or 0, 0), size)
+            line = 1 if start == 0 else None
+        if length and not cursor:
+            # Carried in next_cursor so continuing stays inside the range
+            stop = min(stop, start + max(length, 0))
+
+        # UTF-8 text needs at most 4 bytes per character
+        window = max_chars * 4
+        end = min(stop, start + window)
+        if end < stop:
+            end = _char_boundary(buf, end, size)
+        raw = bytes(buf[start:end])
+
+    encoding = info["encoding"] or "utf-8"
+    text = raw.decode(encoding, errors="replace")
+    if len(text) > max_chars:
+        text = text[:max_chars]
+        bom = len(codecs.BOM_UTF8) if encoding == "utf-8-sig" and start == 0 else 0
+        plain = "utf-8" if encoding == "utf-8-sig" else encoding
+        end = start + bom + len(text.encode(plain, errors="replace"))
+    truncated = end < stop
+
+    result.update({
+        "content": text,
+        "start_offset": start,
+        "end_offset": end,
+        "truncated": truncated,
+        "next_cursor": None
+    })
+    if line is not None:
+        result["start_line"] = line
+        result["end_line"] = line + text.count("\n") - (1 if text.endswith("\n") else 0)
+    if truncated:
+        next_line = (line + text.count("\n")) if line is not None else 0
+        result["next_cursor"] = encode_cursor(end, next_line, stop if stop < size else None)
+    return result
@@ -0,0 +1,518 @@
+"""
+Read repository files straight from the git object store.
+
+Each repository is kept as a (blob-less) bare clone with one long-lived
+``git cat-file --batch`` process. Paths are resolved against a pinned commit
+with a single ``git ls-tree``, and blob contents go through a process-wide
+LRU cache keyed by blob SHA, so identical blobs (e.g. across forks) are read
+once no matter which repository asks for them.
+
+Credentials never reach the clones' config: the remote is stored without
+them and every git command (including the lazy blob fetches of cat-file)
+gets them through its environment. A clone is shared across callers, so
+each caller must reach the remote with its own URL (a fetch, or ``git
+ls-remote`` when nothing needs fetching) before it is served from it. Clone sizes count towards the
+WorkspaceManager quota, and its janitor removes clones that have been idle
+for WORKSPACE_ORPHAN_AGE seconds.
+"""
+
+import atexit
+import base64
+import hashlib
+import os
+import posixpath
+import subprocess
+import tempfile
+import threading
+import time
+import weakref
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Optional, Tuple
+from urllib.parse import unquote, urlparse
+from .cancellation import CancellationToken, run_cancellable
+from .ignore_rules import is_ignored
+from .workspace_manager import WorkspaceManager, directory_size, estimate_repo_size, get_shared_workspace_manager
+
+OBJECTS_PREFIX = "objects://"
+
+
+def split_credentials(url: str) -> Tuple[str, Dict[str, str]]:
+    """
+    Separate the credentials embedded in an https URL from the URL.
+
+    Returns:
+        (URL without credentials, environment that passes them to git as an
+        Authorization header scoped to the URL's host)
+    """
+    parsed = urlparse(url)
+    if parsed.scheme not in ("http", "https") or not parsed.username:
+        return url, {}
+    user, password = unquote(parsed.username), unquote(parsed.password or "")
+    if not password:
+        # A bare token in the user field (https://<token>@github.com/...)
+        user, password = "x-access-token", user
+    host = parsed.hostname + (f":{parsed.port}" if parsed.port else "")
+    credentials = base64.b64encode(f"{user}:{password}".encode()).decode()
+    return parsed._replace(netloc=host).geturl(), {
+        "GIT_CONFIG_COUNT": "1",
+        "GIT_CONFIG_KEY_0": f"http.{parsed.scheme}://{host}/.extraHeader",
+        "GIT_CONFIG_VALUE_0": f"Authorization: Basic {credentials}"
+    }
+
+
+class BlobCache:
+    """Byte-bounded LRU cache of blob contents keyed by blob SHA."""
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self._blobs: "OrderedDict[str, bytes]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, sha: str) -> Optional[bytes]:
+        with self._lock:
+            data = self._blobs.get(sha)
+            if data is None:
+                self.misses += 1
+                return None
+            self._blobs.move_to_end(sha)
+            self.hits += 1
+            return data
+
+    def put(self, sha: str, data: bytes) -> None:
+        if len(data) > self.max_bytes:
+            return
+        with self._lock:
+            if sha in self._blobs:
+                self._blobs.move_to_end(sha)
+                return
+            self._blobs[sha] = data
+            self._bytes += len(data)
+            while self._bytes > self.max_bytes:
+                _, evicted = self._blobs.popitem(last=False)
+                self._bytes -= len(evicted)
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {
+                "blobs": len(self._blobs),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses
+            }
+
+
+class CatFileProcess:
+    """A persistent ``git cat-file --batch`` process for one repository."""
+
+    def __init__(self, git_dir: str, env: Optional[Dict[str, str]] = None):
+        self.git_dir = git_dir
+        self.env = env
+        self._lock = threading.Lock()
+        self._process: Optional[subprocess.Popen] = None
+
+    def _ensure(self) -> subprocess.Popen:
+        if self._process is None or self._process.poll() is not None:
+            self._process = subprocess.Popen(
+                ['git', '--git-dir', self.git_dir, 'cat-file', '--batch'],
+                stdin=subprocess.PIPE,
+                stdout=subprocess.PIPE,
+                stderr=subprocess.DEVNULL,
+                env=self.env
+            )
+        return self._process
+
+    def read(self, sha: str) -> bytes:
+        """Return the raw contents of an object."""
+        with self._lock:
+            process = self._ensure()
+            process.stdin.write(sha.encode() + b"\n")
+            process.stdin.flush()
+            header = process.stdout.readline().decode().split()
+            if len(header) < 3 or header[1] == "missing":
+                raise FileNotFoundError(f"Object {sha} not found in {self.git_dir}")
+            size = int(header[2])
+            data = process.stdout.read(size)
+            process.stdout.read(1)  # trailing newline
+            return data
+
+    def close(self) -> None:
+        with self._lock:
+            if self._process and self._process.poll() is None:
+                try:
+                    self._process.stdin.close()
+                    self._process.wait(timeout=5)
+                except Exception:
+                    self._process.kill()
+            self._process = None
+
+
+class GitTreeSnapshot:
+    """Snapshot API over a commit in a bare repository; nothing is checked out."""
+
+    in_memory = False
+
+    def __init__(self, store: "GitObjectStore", git_dir: str, commit: str, root: str):
+        self.store = store
+        self.git_dir = git_dir
+        self.commit = commit
+        self.root = root
+        self.entries: Dict[str, Tuple[str, int]] = {}
+        self._children: Dict[str, Tuple[set, set]] = {"": (set(), set())}
+        self._load_index()
+
+    def _load_index(self) -> None:
+        result = self.store.git(self.git_dir, 'ls-tree', '-r', '-t', '-l', '-z', self.commit)
+        if result.returncode != 0:
+            raise RuntimeError(f"git ls-tree failed: {result.stderr.decode(errors='ignore')}")
+        for record in result.stdout.split(b"\0"):
+            if not record:
+                continue
+            meta, path = record.split(b"\t", 1)
+            mode, obj_type, sha, size = meta.decode().split()
+            path = path.decode("utf-8", errors="surrogateescape")
+            if is_ignored(path):
+                continue
+            parent, name = posixpath.split(path)
+            if parent not in self._children:
+                continue  # parent tree was ignored
+            if obj_type == "tree":
+                self._children[path] = (set(), set())
+                self._children[parent][0].add(name)
+            elif obj_type == "blob" and not mode.startswith("12"):
+                # Symlinks (mode 120000) are not followed, matching archive extraction
+                self.entries[path] = (sha, int(size))
+                self._children[parent][1].add(name)
+
+    @staticmethod
+    def _norm(rel_path: str) -> str:
+        rel_path = posixpath.normpath((rel_path or "").replace("\\", "/").strip("/"))
+        return "" if rel_path == "." else rel_path
+
+    def exists(self, rel_path: str) -> bool:
+        rel_path = self._norm(rel_path)
+        return rel_path in self.entries or rel_path in self._children
+
+    def isfile(self, rel_path: str) -> bool:
+        return self._norm(rel_path) in self.entries
+
+    def isdir(self, rel_path: str) -> bool:
+        return self._norm(rel_path) in self._children
+
+    def getsize(self, rel_path: str) -> int:
+        try:
+            return self.entries[self._norm(rel_path)][1]
+        except KeyError:
+            raise FileNotFoundError(rel_path)
+
+    def blob_sha(self, rel_path: str) -> str:
+        try:
+            return self.entries[self._norm(rel_path)][0]
+        except KeyError:
+            raise FileNotFoundError(rel_path)
+
+    def listdir(self, rel_path: str = "") -> List[str]:
+        try:
+            dirs, files = self._children[self._norm(rel_path)]
+        except KeyError:
+            raise FileNotFoundError(rel_path)
+        return list(dirs) + list(files)
+
+    def walk(self) -> Iterator[Tuple[str, List[str], List[str]]]:
+        stack = [""]
+        while stack:
+            rel_root = stack.pop()
+            dir_set, file_set = self._children[rel_root]
+            dirs, files = sorted(dir_set), sorted(file_set)
+            yield rel_root, dirs, files
+            for name in reversed(dirs):
+                stack.append(posixpath.join(rel_root, name) if rel_root else name)
+
+    def read_bytes(self, rel_path: str, limit: Optional[int] = None, offset: int = 0) -> bytes:
+        data = self.store.read_blob(self.git_dir, self.blob_sha(rel_path))
+        end = None if limit is None else offset + limit
+        return data[offset:end]
+
+    def read_text(self, rel_path: str, max_chars: Optional[int] = None, errors: str = "ignore") -> str:
+        limit = None if max_chars is None else max_chars * 4
+        text = self.read_bytes(rel_path, limit).decode("utf-8", errors=errors)
+        return text if max_chars is None else text[:max_chars]
+
+    @contextmanager
+    def buffer(self, rel_path: str):
+        yield self.store.read_blob(self.git_dir, self.blob_sha(rel_path))
+
+
+class GitObjectStore:
+    """
+    Keeps bare clones and their cat-file processes, one per repository.
+
+    Bare repositories live under GIT_OBJECT_STORE_ROOT and are reused across
+    sessions; a later request for a commit that is not present fetches it.
+    """
+
+    def __init__(self, root: Optional[str] = None, blob_cache: Optional[BlobCache] = None,
+                 manager: Optional[WorkspaceManager] = None):
+        self.root = root or os.getenv(
+            "GIT_OBJECT_STORE_ROOT", os.path.join(tempfile.gettempdir(), "git-agent-objects")
+        )
+        self.blob_cache = blob_cache or BlobCache(int(os.getenv("GIT_BLOB_CACHE_MB", "128")) * 1024 * 1024)
+        self.manager = manager or get_shared_workspace_manager()
+        self._readers: Dict[str, CatFileProcess] = {}
+        self._repo_locks: Dict[str, threading.Lock] = {}
+        self._credentials: Dict[str, Dict[str, str]] = {}
+        self._last_used: Dict[str, float] = {}
+        self._snapshots: Dict[str, "weakref.WeakSet[GitTreeSnapshot]"] = {}
+        self._lock = threading.Lock()
+        os.makedirs(self.root, exist_ok=True)
+        self.manager.add_reclaimer(self.evict_idle)
+
+    def _git_dir(self, repo: str) -> str:
+        digest = hashlib.sha1(repo.encode()).hexdigest()[:16]
+        name = repo.rsplit('/', 1)[-1] or 'repo'
+        return os.path.join(self.root, f"{name}-{digest}.git")
+
+    def _repo_lock(self, git_dir: str) -> threading.Lock:
+        with self._lock:
+            return self._repo_locks.setdefault(git_dir, threading.Lock())
+
+    def _env(self, git_dir: str, credentials: Optional[Dict[str, str]] = None) -> Dict[str, str]:
+        if credentials is None:
+            with self._lock:
+                credentials = self._credentials.get(git_dir, {})
+        return {**os.environ, "GIT_TERMINAL_PROMPT": "0", **credentials}
+
+    def git(self, git_dir: str, *args: str, timeout: Optional[float] = None,
+            text: bool = False, credentials: Optional[Dict[str, str]] = None,
+            cancel_token: Optional[CancellationToken] = None) -> subprocess.CompletedProcess:
+        """Run a git command against a bare clone with its credentials (or the given ones)."""
+        return run_cancellable(
+            ['git', '--git-dir', git_dir, *args],
+            timeout=timeout,
+            token=cancel_token,
+            env=self._env(git_dir, credentials),
+            text=text
+        )
+
+    def _set_credentials(self, git_dir: str, credentials: Dict[str, str]) -> None:
+        """Use the last authorized caller's credentials (possibly none) for lazy blob fetches."""
+        with self._lock:
+            if self._credentials.get(git_dir, {}) == credentials:
+                return
+            if credentials:
+                self._credentials[git_dir] = credentials
+            else:
+                del self._credentials[git_dir]
+            # The running cat-file picks the new credentials up when it restarts
+            reader = self._readers.pop(git_dir, None)
+        if reader:
+            reader.close()
+
+    def has_repository(self, repo: str) -> bool:
+        """Whether a bare clone of ``repo`` is already on disk."""
+        return os.path.isdir(self._git_dir(repo))
+
+    def _has_commit(self, git_dir: str, commit: str) -> bool:
+        return self.git(git_dir, 'cat-file', '-e', f"{commit}^{{commit}}").returncode == 0
+
+    def ensure(self, repo: str, clone_url: str, commit: Optional[str] = None,
+               timeout: float = 300, cancel_token: Optional[CancellationToken] = None) -> Tuple[str, str]:
+        """
+        Make sure ``commit`` (default HEAD) is present in the bare clone.
+
+        Args:
+            repo: Repository identity (see normalize_repo_url)
+            clone_url: URL to fetch from; credentials in it are only passed
+                to git through the environment
+            commit: Commit to fetch when missing
+            timeout: Clone or fetch timeout in seconds
+            cancel_token: Cancelling it kills the clone or fetch
+
+        Returns:
+            (git_dir, resolved commit SHA)
+
+        Raises:
+            AnalysisCancelled: ``cancel_token`` was cancelled
+            WorkspaceQuotaError: If the clone does not fit in the workspace quota
+            RuntimeError: If ``clone_url`` cannot reach the repository, even
+                when the commit is already in the store
+        """
+        git_dir = self._git_dir(repo)
+        url, credentials = split_credentials(clone_url)
+        with self._repo_lock(git_dir):
+            self._last_used[git_dir] = time.time()
+            target = commit or 'HEAD'
+            fetched = False
+            try:
+                if not os.path.isdir(git_dir):
+                    # Trees only, so a tenth of the full repository size is plenty to reserve
+                    self.manager.reserve(git_dir, (estimate_repo_size(clone_url) or 0) // 10)
+                    try:
+                        result = run_cancellable(
+                            ['git', 'clone', '--bare', '--filter=blob:none', '--quiet', url, git_dir],
+                            timeout=timeout,
+                            token=cancel_token,
+                            env=self._env(git_dir, credentials)
+                        )
+                        if result.returncode != 0:
+                            raise RuntimeError(f"Git clone failed: {result.stderr}")
+                    except Exception:
+                        # A failed or killed clone must not be mistaken for a usable one later
+                        from .workspace import force_rmtree
+                        self.manager.forget(git_dir)
+                        force_rmtree(git_dir)
+                        raise
+                    fetched = True
+                elif not commit or not self._has_commit(git_dir, commit):
+                    # Clones made before credentials were kept out of the config
+                    self.git(git_dir, 'remote', 'set-url', 'origin', url)
+                    result = self.git(git_dir, 'fetch', '--quiet', '--filter=blob:none', url, target,
+                                      timeout=timeout, text=True, credentials=credentials,
+                                      cancel_token=cancel_token)
+                    if result.returncode != 0:
+                        raise RuntimeError(f"Git fetch failed: {result.stderr}")
+                    if not commit:
+                        target = 'FETCH_HEAD'
+                    fetched = True
+                else:
+                    # Nothing to fetch, but the caller must still be able to reach the repository
+                    result = run_cancellable(
+                        ['git', 'ls-remote', url, 'HEAD'],
+                        timeout=timeout,
+                        token=cancel_token,
+                        env=self._env(git_dir, credentials)
+                    )
+                    if result.returncode != 0:
+                        raise RuntimeError(f"Access to {repo} could not be verified: {result.stderr}")
+            except subprocess.TimeoutExpired:
+                raise RuntimeError(f"Repository fetch timed out ({timeout} seconds)")
+            except FileNotFoundError:
+                raise RuntimeError("Git is not installed or not found in PATH")
+            self._set_credentials(git_dir, credentials)
+            if fetched:
+                # Raises once the store pushes usage past the quota; the next sweep can free it
+                self.manager.commit(git_dir)
+
+            resolved = self.git(git_dir, 'rev-parse', f"{target}^{{commit}}", text=True)
+            if resolved.returncode != 0:
+                raise RuntimeError(f"Commit {target} not found: {resolved.stderr}")
+            return git_dir, resolved.stdout.strip()
+
+    def evict_idle(self, now: float, max_idle: float) -> List[Tuple[str, int]]:
+        """
+        Remove bare clones that no live snapshot uses and that have been idle
+        for ``max_idle`` seconds (WorkspaceManager reclaimer).
+
+        Returns:
+            ``(git_dir, bytes)`` of every removed clone
+        """
+        from .workspace import force_rmtree
+
+        removed = []
+        for entry in os.scandir(self.root):
+            git_dir = entry.path
+            if not entry.is_dir(follow_symlinks=False) or not git_dir.endswith('.git'):
+                continue
+            lock = self._repo_lock(git_dir)
+            if not lock.acquire(blocking=False):
+                continue
+            try:
+                with self._lock:
+                    in_use = len(self._snapshots.get(git_dir, ()))
+                    last_used = self._last_used.get(git_dir) or entry.stat().st_mtime
+                if in_use or now - last_used < max_idle:
+                    continue
+                with self._lock:
+                    reader = self._readers.pop(git_dir, None)
+                    self._last_used.pop(git_dir, None)
+                if reader:
+                    reader.close()
+                size = directory_size(git_dir)
+                force_rmtree(git_dir)
+                self.manager.forget(git_dir)
+                removed.append((git_dir, size))
+            except OSError:
+                continue
+            finally:
+                lock.release()
+        return removed
+
+    def snapshot(self, repo: str, clone_url: str, commit: Optional[str] = None,
+                 timeout: float = 300, cancel_token: Optional[CancellationToken] = None) -> GitTreeSnapshot:
+        """Get a snapshot of ``repo`` at ``commit`` served from the object store."""
+        git_dir, sha = self.ensure(repo, clone_url, commit, timeout, cancel_token)
+        snapshot = GitTreeSnapshot(self, git_dir, sha, f"{OBJECTS_PREFIX}{repo}@{sha}")
+        with self._lock:
+            self._snapshots.setdefault(git_dir, weakref.WeakSet()).add(snapshot)
+        return snapshot
+
+    def diff(self, repo: str, clone_url: str, base: str, head: str,
+             timeout: float = 300, cancel_token: Optional[CancellationToken] = None) -> List[Dict[str, str]]:
+        """
+        List the paths that differ between two commits.
+
+        Only trees are compared, so no file contents are downloaded. Rename
+        detection would have to fetch the blobs of every added and deleted
+        file, so renames are reported as a deletion plus an addition.
+
+        Returns:
+            List of dicts with 'status' (A/M/D/T) and 'path'
+        """
+        self.ensure(repo, clone_url, base, timeout, cancel_token)
+        git_dir, head = self.ensure(repo, clone_url, head, timeout, cancel_token)
+        result = self.git(git_dir, 'diff-tree', '-r', '-z', '--no-renames', '--name-status', base, head,
+                          cancel_token=cancel_token)
+        if result.returncode != 0:
+            raise RuntimeError(f"git diff-tree failed: {result.stderr.decode(errors='ignore')}")
+
+        fields = [f.decode("utf-8", errors="surrogateescape") for f in result.stdout.split(b"\0")]
+        return [{"status": status[0], "path": path} for status, path in zip(fields[0:-1:2], fields[1::2]) if status]
+
+    def read_blob(self, git_dir: str, sha: str) -> bytes:
+        """Read a blob, consulting the shared cache first."""
+        data = self.blob_cache.get(sha)
+        if data is not None:
+            return data
+        with self._lock:
+            self._last_used[git_dir] = time.time()
+            reader = self._readers.get(git_dir)
+            if reader is None:
+                credentials = self._credentials.get(git_dir, {})
+                reader = self._readers[git_dir] = CatFileProcess(
+                    git_dir, {**os.environ, "GIT_TERMINAL_PROMPT": "0", **credentials}
+                )
+        data = reader.read(sha)
+        self.blob_cache.put(sha, data)
+        return data
+
+    def close(self) -> None:
+        """Stop every cat-file process."""
+        with self._lock:
+            readers = list(self._readers.values())
+            self._readers.clear()
+        for reader in readers:
+            reader.close()
+
+    def stats(self) -> Dict:
+        with self._lock:
+            processes = len(self._readers)
+        return {"root": self.root, "cat_file_processes": processes, "blob_cache": self.blob_cache.stats()}
+
+
+# Shared GitObjectStore instance
+_shared_object_store = None
+_shared_store_lock = threading.Lock()
+
+
+def get_shared_object_store() -> GitObjectStore:
+    """Get or create the process-wide GitObjectStore instance."""
+    global _shared_object_store
+    with _shared_store_lock:
+        if _shared_object_store is None:
+            _shared_object_store = GitObjectStore()
+            atexit.register(_shared_object_store.close)
+        return _shared_object_store
@@ -0,0 +1,43 @@
+"""
+Ignore rules shared by every fetch strategy.
+
+Cloned checkouts are pruned after the fact; archive and snapshot fetchers
+apply the same rules while streaming so ignored paths are never written.
+"""
+
+import fnmatch
+
+# Files and folders stripped from checkouts before analysis
+UNNECESSARY_ITEMS = [
+    '.git',
+    'node_modules',
+    '__pycache__',
+    '.pytest_cache',
+    '.vscode',
+    '.idea',
+    '*.pyc',
+    '*.pyo',
+    '*.log',
+    'dist',
+    'build',
+    '.DS_Store',
+    'Thumbs.db'
+]
+
+_NAMES = [item for item in UNNECESSARY_ITEMS if '*' not in item]
+_PATTERNS = [item for item in UNNECESSARY_ITEMS if '*' in item]
+
+
+def is_ignored(rel_path: str) -> bool:
+    """
+    Check a repository-relative path against the ignore rules.
+
+    Plain names match at the repository root (as the post-clone cleaner does);
+    glob patterns match file names at any depth.
+    """
+    parts = [p for p in rel_path.replace('\\', '/').split('/') if p]
+    if not parts:
+        return False
+    if parts[0] in _NAMES:
+        return True
+    return any(fnmatch.fnmatch(parts[-1], pattern) for pattern in _PATTERNS)
@@ -1,6 +1,7 @@
 """
 LangChain-compatible tools for the GitHub Repository Analyzer.
 These tools convert the functionality of RepositoryCloner into individual BaseTool implementations.
+Observations are encoded by observation_format (compact text by default).
 """
 
 import json
@@ -8,6 +9,7 @@ import os
 from typing import Dict, Any, List, Optional, Type
 from pydantic import BaseModel, Field
 from langchain_core.tools import BaseTool
+from .observation_format import observe
 from .repo_cloner import RepositoryCloner
 
 # Shared RepositoryCloner instance
@@ -41,13 +43,13 @@ class CloneRepositoryTool(BaseTool):
             result = repo_cloner.clone_repository(github_url, cleanup=cleanup)
             
             if "error" in result:
-                return json.dumps({
+                return observe(self.name, {
                     "success": False,
                     "error": result["error"],
                     "repository_url": github_url
                 })
             
-            return json.dumps({
+            return observe(self.name, {
                 "success": True,
                 "repository_url": github_url,
                 "local_path": result.get("local_path"),
@@ -57,7 +59,7 @@ class CloneRepositoryTool(BaseTool):
                 "message": "Repository cloned successfully"
             })
         except Exception as e:
-            return json.dumps({
+            return observe(self.name, {
                 "success": False,
                 "error": str(e),
                 "repository_url": github_url
@@ -78,7 +80,8 @@ class GetRepositoryStructureTool(BaseTool):
     """Tool for getting the structure of a cloned repository."""
     name: str = "get_repository_structure"
     description: str = """Get the directory structure of a cloned repository.
-    Input should be the repository full name. Returns JSON tree structure."""
+    Input should be the repository full name. Returns the directory tree
+    (indented, with file counts per directory)."""
     args_schema: Type[BaseModel] = GetRepositoryStructureInput
     
     def _run(self, repo_full_name: str, max_depth: int = 3) -> str:
@@ -88,19 +91,19 @@ class GetRepositoryStructureTool(BaseTool):
             result = repo_cloner.get_repository_structure(repo_full_name, max_depth)
             
             if "error" in result:
-                return json.dumps({
+                return observe(self.name, {
                     "success": False,
                     "error": result["error"],
                     "repo_full_name": repo_full_name
                 })
             
-            return json.dumps({
+            return observe(self.name, {
                 "success": True,
                 "repo_full_name": repo_full_name,
                 "structure": result.get("structure")
             })
         except Exception as e:
-            return json.dumps({
+            return observe(self.name, {
                 "success": False,
                 "error": str(e),
                 "repo_full_name": repo_full_name
@@ -111,11 +114,82 @@ class GetRepositoryStructureTool(BaseTool):
         return self._run(repo_full_name, max_depth)
 
 
+class ListDirectoryInput(BaseModel):
+    """Input for listing one directory of a repository."""
+    repo_full_name: str = Field(description="Full repository name (e.g., 'user/repo')")
+    path: str = Field(default="", description="Directory within the repository (empty for the root)")
+    cursor: Optional[str] = Field(default=None, description="next_cursor from a previous page to continue")
+    limit: int = Field(default=50, description="Entries per page")
+
+
+def _parse_text_input(text: str) -> Dict[str, Any]:
+    """Parameters from a ReAct text input: JSON or key=value pairs."""
+    text = text.strip()
+    if text.startswith('{'):
+        try:
+            return json.loads(text)
+        except json.JSONDecodeError:
+            return {}
+    params = {}
+    for part in text.split():
+        if '=' in part:
+            key, value = part.split('=', 1)
+            params[key] = value.strip('"\'')
+    return params
+
+
+class ListDirectoryTool(BaseTool):
+    """Tool for listing a repository one directory level at a time."""
+    name: str = "list_directory"
+    description: str = """List one directory of a cloned repository (the root by default).
+    Each subdirectory shows the file count, size and main languages of
+    everything below it, so expand only the subtrees that matter by calling
+    list_directory again with their path. Long listings are paged; pass the
+    next_cursor to continue.
+    Example: repo_full_name="owner/repo" path="src" """
+    args_schema: Type[BaseModel] = ListDirectoryInput
+    
+    def _run(self, repo_full_name: str, path: str = "", cursor: Optional[str] = None, limit: int = 50) -> str:
+        """List a directory synchronously."""
+        # ReAct agents send a single string with every parameter in it
+        if '=' in repo_full_name or repo_full_name.strip().startswith('{'):
+            params = _parse_text_input(repo_full_name)
+            repo_full_name = params.get('repo_full_name', repo_full_name)
+            path = params.get('path', path)
+            cursor = params.get('cursor', cursor)
+            limit = params.get('limit', limit)
+        try:
+            repo_cloner = get_shared_repo_cloner()
+            result = repo_cloner.list_directory(repo_full_name, path or "", cursor=cursor, limit=int(limit))
+            return observe(self.name, {
+                "success": True,
+                "repo_full_name": repo_full_name,
+                **result
+            })
+        except Exception as e:
+            return observe(self.name, {
+                "success": False,
+                "error": str(e),
+                "repo_full_name": repo_full_name,
+                "path": path
+            })
+    
+    async def _arun(self, repo_full_name: str, path: str = "", cursor: Optional[str] = None, limit: int = 50) -> str:
+        """List a directory asynchronously."""
+        return self._run(repo_full_name, path, cursor, limit)
+
+
 class ReadFileInput(BaseModel):
     """Input for reading a file from repository."""
     repo_full_name: str = Field(description="Full repository name (e.g., 'user/repo')")
     file_path: str = Field(description="Path to file within repository")
     max_chars: int = Field(default=10000, description="Maximum characters to read")
+    start_line: Optional[int] = Field(default=None, description="First line to read (1-based)")
+    end_line: Optional[int] = Field(default=None, description="Last line to read (inclusive)")
+    offset: Optional[int] = Field(default=None, description="Byte offset to start reading at")
+    length: Optional[int] = Field(default=None, description="Number of bytes to read from offset (or the start)")
+    tail_lines: Optional[int] = Field(default=None, description="Read only the last N lines")
+    cursor: Optional[str] = Field(default=None, description="next_cursor from a previous read to continue")
 
     @classmethod
     def parse_from_string(cls, input_str: str):
@@ -130,13 +204,37 @@ class ReadFileInput(BaseModel):
         return None
 
 
+# Optional read_file parameters and how to coerce them from text input
+READ_RANGE_PARAMS = {
+    'start_line': int,
+    'end_line': int,
+    'offset': int,
+    'length': int,
+    'tail_lines': int,
+    'cursor': str
+}
+
+
+def _range_args(params: Dict[str, Any]) -> Dict[str, Any]:
+    """Pick the paging/range arguments out of parsed read_file parameters."""
+    args = {}
+    for key, cast in READ_RANGE_PARAMS.items():
+        value = params.get(key)
+        if value not in (None, ''):
+            args[key] = cast(value)
+    return args
+
+
 class FlexibleReadFileTool(BaseTool):
     """Tool for reading files with flexible input parsing."""
     name: str = "read_file"
     description: str = """Read a specific file from a cloned repository.
     Input: repo_full_name and file_path
     Example: repo_full_name="owner/repo" file_path="README.md"
-    Or: {"repo_full_name": "owner/repo", "file_path": "README.md"}"""
+    Or: {"repo_full_name": "owner/repo", "file_path": "README.md"}
+    Optional: start_line/end_line for a line range, offset (and length) for
+    a byte range, tail_lines=N for the end of a file, or cursor=<next_cursor> to continue
+    a truncated read. Binary files are skipped."""
     
     def _run(self, tool_input: str = None, **kwargs) -> str:
         """Read file with flexible input parsing."""
@@ -145,9 +243,11 @@ class FlexibleReadFileTool(BaseTool):
             repo_full_name = None
             file_path = None
             max_chars = 10000
+            params = {}
             
             # Method 1: Direct parameters in kwargs
             if 'repo_full_name' in kwargs and 'file_path' in kwargs:
+                params = kwargs
                 repo_full_name = kwargs['repo_full_name']
                 file_path = kwargs['file_path']
                 max_chars = kwargs.get('max_chars', 10000)
@@ -157,7 +257,6 @@ class FlexibleReadFileTool(BaseTool):
                 # Try to parse as key=value format
                 if '=' in tool_input:
                     parts = tool_input.split()
-                    params = {}
                     for part in parts:
                         if '=' in part:
                             key, value = part.split('=', 1)
@@ -172,10 +271,10 @@ class FlexibleReadFileTool(BaseTool):
                 # Try to parse as JSON
                 elif tool_input.strip().startswith('{'):
                     try:
-                        parsed = json.loads(tool_input)
-                        repo_full_name = parsed.get('repo_full_name')
-                        file_path = parsed.get('file_path')
-                        max_chars = parsed.get('max_chars', 10000)
+                        params = json.loads(tool_input)
+                        repo_full_name = params.get('repo_full_name')
+                        file_path = params.get('file_path')
+                        max_chars = params.get('max_chars', 10000)
                     except json.JSONDecodeError:
                         pass
             
@@ -184,36 +283,47 @@ class FlexibleReadFileTool(BaseTool):
                 input_str = kwargs['repo_full_name']
                 if input_str.strip().startswith('{'):
                     try:
-                        parsed = json.loads(input_str)
-                        repo_full_name = parsed.get('repo_full_name')
-                        file_path = parsed.get('file_path')
-                        max_chars = parsed.get('max_chars', 10000)
+                        params = json.loads(input_str)
+                        repo_full_name = params.get('repo_full_name')
+                        file_path = params.get('file_path')
+                        max_chars = params.get('max_chars', 10000)
                     except json.JSONDecodeError:
                         pass
                 
                 # If not JSON, treat as normal repo name
                 if not file_path:
+                    params = kwargs
                     repo_full_name = input_str
                     file_path = kwargs.get('file_path', '')
             
             if not repo_full_name or not file_path:
-                return json.dumps({
+                return observe(self.name, {
                     "success": False,
                     "error": f"Missing required parameters. Got tool_input: {tool_input}, kwargs: {kwargs}",
                     "expected": "repo_full_name and file_path"
                 })
             
             repo_cloner = get_shared_repo_cloner()
-            content = repo_cloner.read_file(repo_full_name, file_path, max_chars)
-            return json.dumps({
+            result = repo_cloner.read_file_range(
+                repo_full_name, file_path, int(max_chars), **_range_args(params)
+            )
+            response = {
                 "success": True,
                 "repo_full_name": repo_full_name,
                 "file_path": file_path,
-                "content": content,
-                "chars_read": len(content)
-            })
+                "content": result["content"],
+                "chars_read": len(result["content"]),
+                "total_bytes": result["total_bytes"],
+                "next_cursor": result["next_cursor"]
+            }
+            for key in ("start_line", "end_line", "skipped"):
+                if key in result:
+                    response[key] = result[key]
+            if result.get("minified"):
+                response["minified"] = True
+            return observe(self.name, response)
         except Exception as e:
-            return json.dumps({
+            return observe(self.name, {
                 "success": False,
                 "error": str(e),
                 "input_received": f"tool_input: {tool_input}, kwargs: {kwargs}"
@@ -224,6 +334,21 @@ class FlexibleReadFileTool(BaseTool):
         return self._run(tool_input, **kwargs)
 
 
+class ReadFileTool(FlexibleReadFileTool):
+    """read_file with a structured argument schema, for function-calling agents."""
+    description: str = """Read a specific file from a cloned repository.
+    Use start_line/end_line for a line range, offset and length for a byte
+    range, tail_lines for the end of a file, or cursor (the next_cursor of a
+    previous read) to continue a truncated read. Binary files are skipped."""
+    args_schema: Type[BaseModel] = ReadFileInput
+    
+    def _run(self, repo_full_name: str, file_path: str, max_chars: int = 10000, **range_args) -> str:
+        return super()._run(repo_full_name=repo_full_name, file_path=file_path, max_chars=max_chars, **range_args)
+    
+    async def _arun(self, repo_full_name: str, file_path: str, max_chars: int = 10000, **range_args) -> str:
+        return self._run(repo_full_name, file_path, max_chars, **range_args)
+
+
 class ListClonedRepositoriesInput(BaseModel):
     """Input for listing cloned repositories."""
     pass
@@ -241,13 +366,13 @@ class ListClonedRepositoriesTool(BaseTool):
         try:
             repo_cloner = get_shared_repo_cloner()
             repos = repo_cloner.list_cloned_repositories()
-            return json.dumps({
+            return observe(self.name, {
                 "success": True,
                 "repositories": repos,
                 "count": len(repos)
             })
         except Exception as e:
-            return json.dumps({
+            return observe(self.name, {
                 "success": False,
                 "error": str(e)
             })
@@ -274,13 +399,13 @@ class AnalyzeRepositoryTool(BaseTool):
         try:
             repo_cloner = get_shared_repo_cloner()
             analysis = repo_cloner.analyze_repository(repo_full_name)
-            return json.dumps({
+            return observe(self.name, {
                 "success": True,
                 "repo_full_name": repo_full_name,
                 "analysis": analysis
             })
         except Exception as e:
-            return json.dumps({
+            return observe(self.name, {
                 "success": False,
                 "error": str(e),
                 "repo_full_name": repo_full_name
@@ -308,14 +433,14 @@ class CleanupRepositoryTool(BaseTool):
         try:
             repo_cloner = get_shared_repo_cloner()
             result = repo_cloner.cleanup_repository(repo_full_name)
-            return json.dumps({
+            return observe(self.name, {
                 "success": True,
                 "repo_full_name": repo_full_name,
                 "message": f"Repository {repo_full_name} cleaned up successfully",
                 "freed_space": result.get("freed_space", "Unknown")
             })
         except Exception as e:
-            return json.dumps({
+            return observe(self.name, {
                 "success": False,
                 "error": str(e),
                 "repo_full_name": repo_full_name
@@ -0,0 +1,293 @@
+"""
+Byte-weighted language detection over repository snapshots.
+
+Languages are identified from file names, extensions and, for files
+without an extension or with an ambiguous one (.m, .h, .r, .pl, .ts), from
+the shebang or a few lines of content. Each language is weighted by its
+bytes, so a single large module outweighs a directory of stubs. Vendored
+and generated files are left out of the breakdown.
+
+Large repositories are sampled: past a file-count threshold only a
+deterministic, per-group sample of files is sized and read, and the totals
+are scaled up from it. I/O stays bounded no matter how big the tree is.
+"""
+
+import os
+import re
+import zlib
+from collections import defaultdict
+from typing import Dict, List, Optional
+
+# Extensions that name one language
+EXTENSION_LANGUAGES = {
+    '.py': 'Python', '.pyw': 'Python', '.pyi': 'Python',
+    '.js': 'JavaScript', '.mjs': 'JavaScript', '.cjs': 'JavaScript', '.jsx': 'JavaScript',
+    '.tsx': 'TypeScript', '.mts': 'TypeScript', '.cts': 'TypeScript',
+    '.java': 'Java', '.kt': 'Kotlin', '.kts': 'Kotlin', '.scala': 'Scala',
+    '.groovy': 'Groovy', '.gradle': 'Groovy',
+    '.go': 'Go', '.rs': 'Rust', '.rb': 'Ruby', '.php': 'PHP', '.pm': 'Perl',
+    '.cs': 'C#', '.fs': 'F#', '.c': 'C',
+    '.cc': 'C++', '.cpp': 'C++', '.cxx': 'C++', '.hpp': 'C++', '.hh': 'C++', '.hxx': 'C++',
+    '.mm': 'Objective-C++', '.swift': 'Swift', '.dart': 'Dart', '.lua': 'Lua',
+    '.ex': 'Elixir', '.exs': 'Elixir', '.erl': 'Erlang', '.hs': 'Haskell',
+    '.clj': 'Clojure', '.jl': 'Julia', '.zig': 'Zig', '.nim': 'Nim',
+    '.sh': 'Shell', '.bash': 'Shell', '.zsh': 'Shell', '.ps1': 'PowerShell',
+    '.sql': 'SQL', '.tf': 'HCL',
+    '.html': 'HTML', '.htm': 'HTML', '.css': 'CSS', '.scss': 'SCSS', '.sass': 'Sass',
+    '.less': 'Less', '.vue': 'Vue', '.svelte': 'Svelte', '.ipynb': 'Jupyter Notebook'
+}
+
+# Extensions shared by several languages; resolved from content, else the default
+AMBIGUOUS_EXTENSIONS = {
+    '.m': 'Objective-C',
+    '.h': 'C',
+    '.r': 'R',
+    '.pl': 'Perl',
+    '.ts': 'TypeScript'
+}
+
+# Files recognized by name alone
+FILENAME_LANGUAGES = {
+    'Makefile': 'Makefile', 'GNUmakefile': 'Makefile', 'makefile': 'Makefile',
+    'CMakeLists.txt': 'CMake', 'Rakefile': 'Ruby', 'Gemfile': 'Ruby', 'Vagrantfile': 'Ruby',
+    'Jenkinsfile': 'Groovy', 'BUILD.bazel': 'Starlark', 'WORKSPACE': 'Starlark'
+}
+
+# Shebang interpreters (version suffixes are stripped first)
+INTERPRETER_LANGUAGES = {
+    'python': 'Python', 'pypy': 'Python',
+    'node': 'JavaScript', 'nodejs': 'JavaScript', 'deno': 'TypeScript', 'ts-node': 'TypeScript',
+    'sh': 'Shell', 'bash': 'Shell', 'zsh': 'Shell', 'dash': 'Shell', 'ksh': 'Shell',
+    'ruby': 'Ruby', 'perl': 'Perl', 'php': 'PHP', 'Rscript': 'R', 'lua': 'Lua', 'swipl': 'Prolog'
+}
+
+# Directories and files that are vendored or generated rather than written
+VENDORED_DIRS = {'node_modules', 'vendor', 'third_party', 'bower_components', 'dist', 'build', '.git'}
+VENDORED_SUFFIXES = ('.min.js', '.min.css', '.bundle.js', '-lock.json', '.lock', '.map')
+
+HEAD_BYTES = 4096
+
+_OBJC = re.compile(rb'^\s*(@interface|@implementation|@protocol|@end\b|#import\b)', re.MULTILINE)
+_CPP = re.compile(rb'^\s*(class\s+\w+|namespace\b|template\s*<)|std::|\bpublic:', re.MULTILINE)
+_MATLAB = re.compile(rb'^\s*(function\b.*=|function\s+\w+\s*\(|classdef\b|%\s|end\s*$)', re.MULTILINE)
+_R = re.compile(rb'<-|\blibrary\(|\bfunction\s*\(')
+_PROLOG = re.compile(rb'^\s*:-|^[a-z]\w*\([^)]*\)\s*:-', re.MULTILINE)
+_PERL = re.compile(rb'^\s*(use\s+(strict|warnings)|my\s+[$@%]|sub\s+\w+|package\s+\w+)', re.MULTILINE)
+
+
+def _resolve_ambiguous(ext: str, head: bytes) -> Optional[str]:
+    """Pick the language of a file with an ambiguous extension from its first bytes."""
+    if ext == '.h':
+        if _OBJC.search(head):
+            return 'Objective-C'
+        if _CPP.search(head):
+            return 'C++'
+        return 'C'
+    if ext == '.m':
+        if _OBJC.search(head):
+            return 'Objective-C'
+        if _MATLAB.search(head):
+            return 'MATLAB'
+        return AMBIGUOUS_EXTENSIONS[ext]
+    if ext == '.r':
+        if head.lstrip().upper().startswith(b'REBOL'):
+            return 'Rebol'
+        return 'R'
+    if ext == '.pl':
+        if _PROLOG.search(head) and not _PERL.search(head):
+            return 'Prolog'
+        return 'Perl'
+    if ext == '.ts':
+        # Qt Linguist translation files share the extension
+        if b'<!DOCTYPE TS>' in head or re.search(rb'<TS\b', head):
+            return None
+        return 'TypeScript'
+    return AMBIGUOUS_EXTENSIONS.get(ext)
+
+
+def _from_shebang(head: bytes) -> Optional[str]:
+    """Language named by a ``#!`` line, e.g. ``#!/usr/bin/env python3``."""
+    if not head.startswith(b'#!'):
+        return None
+    words = head[2:].split(b'\n', 1)[0].decode('utf-8', errors='ignore').split()
+    if not words:
+        return None
+    interpreter = os.path.basename(words[0])
+    if interpreter == 'env':
+        # Skip env's own options (e.g. -S)
+        args = [word for word in words[1:] if not word.startswith('-') and '=' not in word]
+        interpreter = args[0] if args else ''
+    interpreter = re.sub(r'[\d.]+$', '', interpreter)
+    return INTERPRETER_LANGUAGES.get(interpreter)
+
+
+def is_vendored(path: str) -> bool:
+    """Check whether a repository path is vendored or generated code."""
+    parts = path.split('/')
+    return any(part in VENDORED_DIRS for part in parts[:-1]) or parts[-1].endswith(VENDORED_SUFFIXES)
+
+
+def classify_path(path: str) -> str:
+    """
+    Group a path by what is needed to know its language.
+
+    Returns:
+        ``lang:<language>`` when the name decides it, ``ext:<ext>`` for an
+        ambiguous extension, ``shebang`` for a file without an extension, or
+        ``other`` (not counted as a language)
+    """
+    if is_vendored(path):
+        return 'other'
+    name = path.rsplit('/', 1)[-1]
+    if name in FILENAME_LANGUAGES:
+        return f'lang:{FILENAME_LANGUAGES[name]}'
+    if name == 'Dockerfile' or name.startswith('Dockerfile.'):
+        return 'lang:Dockerfile'
+    base, ext = os.path.splitext(name)
+    ext = ext.lower()
+    if ext in EXTENSION_LANGUAGES:
+        return f'lang:{EXTENSION_LANGUAGES[ext]}'
+    if ext in AMBIGUOUS_EXTENSIONS:
+        return f'ext:{ext}'
+    if not ext and not base.startswith('.'):
+        return 'shebang'
+    return 'other'
+
+
+def resolve_language(group: str, head: bytes) -> Optional[str]:
+    """
+    Language of a file whose ``classify_path`` group needs content.
+
+    Args:
+        group: ``ext:<ext>`` or ``shebang``
+        head: The file's first HEAD_BYTES bytes
+    """
+    if b'\0' in head:
+        return None
+    if group == 'shebang':
+        return _from_shebang(head)
+    return _resolve_ambiguous(group[4:], head)
+
+
+def _sample(paths: List[str], count: int) -> List[str]:
+    """Deterministic pseudo-random sample (the same tree always gives the same sample)."""
+    if count >= len(paths):
+        return paths
+    return sorted(paths, key=lambda p: zlib.crc32(p.encode('utf-8', errors='surrogateescape')))[:count]
+
+
+def detect_languages(snapshot, file_index: Optional[Dict[str, int]] = None,
+                     sample_threshold: Optional[int] = None, sample_size: Optional[int] = None,
+                     max_content_reads: Optional[int] = None, paths: Optional[List[str]] = None) -> Dict:
+    """
+    Byte-weighted language breakdown of a snapshot.
+
+    Args:
+        snapshot: Repository snapshot (disk checkout, archive or git tree)
+        file_index: Known ``path -> size`` map; sizes in it are not looked up again
+        sample_threshold: Sample once the tree has more files than this
+            (LANGUAGE_SAMPLE_THRESHOLD, default 5000)
+        sample_size: Files sized when sampling (LANGUAGE_SAMPLE_SIZE, default 2000)
+        max_content_reads: Upper bound on files whose first bytes are read
+            (LANGUAGE_MAX_CONTENT_READS, default 400)
+        paths: Files of the tree when the caller has already walked it
+            (``.git`` excluded); the snapshot is not walked again
+
+    Returns:
+        Dict with 'languages' (language, bytes, files, percentage; largest
+        first), 'primary', 'total_bytes' (all files), 'files', and how much
+        was sampled and read
+    """
+    sample_threshold = sample_threshold or int(os.getenv("LANGUAGE_SAMPLE_THRESHOLD", "5000"))
+    sample_size = sample_size or int(os.getenv("LANGUAGE_SAMPLE_SIZE", "2000"))
+    max_content_reads = max_content_reads if max_content_reads is not None else int(
+        os.getenv("LANGUAGE_MAX_CONTENT_READS", "400"))
+
+    if file_index is not None:
+        paths = list(file_index)
+    elif paths is not None:
+        paths = list(paths)
+    else:
+        paths = []
+        for root, dirs, files in snapshot.walk():
+            if '.git' in dirs:
+                dirs.remove('.git')
+            paths.extend(f"{root}/{name}" if root else name for name in files)
+
+    groups: Dict[str, List[str]] = defaultdict(list)
+    for path in paths:
+        groups[classify_path(path)].append(path)
+
+    sampled = len(paths) > sample_threshold
+    content_reads = 0
+    sized = 0
+    language_bytes: Dict[str, float] = defaultdict(float)
+    language_files: Dict[str, float] = defaultdict(float)
+    total_bytes = 0.0
+
+    def size_of(path: str) -> Optional[int]:
+        nonlocal sized
+        if file_index is not None and path in file_index:
+            return file_index[path]
+        sized += 1
+        try:
+            return snapshot.getsize(path)
+        except OSError:
+            return None
+
+    # Groups that need content go first so they get the read budget
+    for key in sorted(groups, key=lambda k: (k.startswith('lang:') or k == 'other', k)):
+        members = groups[key]
+        if sampled:
+            # Every group gets its share of the sample, and small groups a few files at least
+            share = max(min(len(members), 20), round(sample_size * len(members) / len(paths)))
+            members = _sample(members, share)
+        needs_content = key == 'shebang' or key.startswith('ext:')
+        observed = []
+        attempted = 0
+        for path in members:
+            if needs_content and content_reads >= max_content_reads:
+                break
+            attempted += 1
+            if needs_content:
+                content_reads += 1
+                try:
+                    head = snapshot.read_bytes(path, HEAD_BYTES)
+                except OSError:
+                    continue
+                language = resolve_language(key, head)
+            else:
+                language = key[5:] if key.startswith('lang:') else None
+            size = size_of(path)
+            if size is not None:
+                observed.append((language, size))
+        if not observed:
+            continue
+        # Only a sample, or the files the read budget reached, stand in for the
+        # whole group; files that could not be read are not extrapolated over
+        scale = len(groups[key]) / attempted if attempted < len(groups[key]) else 1.0
+        for language, size in observed:
+            total_bytes += size * scale
+            if language:
+                language_bytes[language] += size * scale
+                language_files[language] += scale
+
+    counted = sum(language_bytes.values())
+    languages = [
+        {
+            "language": language,
+            "bytes": int(round(size)),
+            "files": int(round(language_files[language])),
+            "percentage": round(100.0 * size / counted, 1) if counted else 0.0
+        }
+        for language, size in sorted(language_bytes.items(), key=lambda item: item[1], reverse=True)
+    ]
+    return {
+        "languages": languages,
+        "primary": languages[0]["language"] if languages else None,
+        "total_bytes": int(round(total_bytes)),
+        "files": len(paths),
+        "sampled": sampled,
+        "files_sized": sized,
+        "content_reads": content_reads
+    }
@@ -0,0 +1,185 @@
+"""
+Observation formatting for the repository tools.
+
+Tool results end up verbatim in the agent scratchpad, so their encoding
+drives prompt size. The compact format renders trees as indented text with
+single-child directory chains collapsed and per-directory counts, emits file
+bodies raw between delimiters instead of JSON-escaped, and flattens
+everything else to ``key: value`` lines. Set OBSERVATION_FORMAT=json to get
+the previous JSON observations.
+"""
+
+import json
+import logging
+import os
+import threading
+from typing import Any, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+try:
+    import tiktoken
+    _encoding = tiktoken.get_encoding("cl100k_base")
+except Exception:
+    _encoding = None
+
+# Keys rendered as raw, delimited bodies rather than inline values
+BODY_KEYS = ("content", "readme_content")
+
+
+def count_tokens(text: str) -> int:
+    """Token count with tiktoken when available, else a 4-chars-per-token estimate."""
+    if _encoding is not None:
+        try:
+            return len(_encoding.encode(text, disallowed_special=()))
+        except Exception:
+            pass
+    return (len(text) + 3) // 4
+
+
+def observation_format() -> str:
+    return os.getenv("OBSERVATION_FORMAT", "compact").lower()
+
+
+def _human_size(size: int) -> str:
+    for unit in ("B", "KB", "MB"):
+        if size < 1024:
+            return f"{size:.0f}{unit}" if unit == "B" else f"{size:.1f}{unit}"
+        size /= 1024.0
+    return f"{size:.1f}GB"
+
+
+def _count_files(children: Dict) -> int:
+    total = 0
+    for node in children.values():
+        if node.get("type") == "directory":
+            total += _count_files(node.get("children", {}))
+        else:
+            total += 1
+    return total
+
+
+def render_tree(structure: Dict, indent: int = 0) -> List[str]:
+    """
+    Render a get_repo_structure tree as indented lines.
+
+    Directories show the number of files below them (within the traversed
+    depth); chains of directories with a single subdirectory collapse into
+    one ``a/b/c/`` line.
+    """
+    lines = []
+    pad = "  " * indent
+    dirs = [(n, v) for n, v in structure.items() if v.get("type") == "directory"]
+    files = [(n, v) for n, v in structure.items() if v.get("type") != "directory"]
+    for name, node in dirs:
+        path = name
+        children = node.get("children", {})
+        while len(children) == 1:
+            (child_name, child), = children.items()
+            if child.get("type") != "directory":
+                break
+            path = f"{path}/{child_name}"
+            children = child.get("children", {})
+        count = _count_files(children)
+        lines.append(f"{pad}{path}/ ({count} file{'s' if count != 1 else ''})" if children else f"{pad}{path}/")
+        lines.extend(render_tree(children, indent + 1))
+    for name, node in files:
+        size = node.get("size")
+        lines.append(f"{pad}{name}" + (f" {_human_size(size)}" if size is not None else ""))
+    return lines
+
+
+def _inline(value: Any) -> str:
+    if isinstance(value, dict):
+        return ", ".join(f"{k}={_inline(v)}" for k, v in value.items())
+    if isinstance(value, list):
+        return ", ".join(_inline(v) for v in value) if value else "-"
+    if value is None:
+        return "-"
+    return str(value)
+
+
+def render_compact(tool_name: str, payload: Dict) -> str:
+    """Render a tool payload in the compact text format."""
+    if payload.get("success") is False:
+        lines = [f"{tool_name} ERROR: {payload.get('error', 'unknown error')}"]
+        for key, value in payload.items():
+            if key not in ("success", "error"):
+                lines.append(f"{key}: {_inline(value)}")
+        return "\n".join(lines)
+
+    lines = [tool_name]
+    bodies = []
+    trees = []
+
+    def collect(data: Dict, prefix: str = "") -> None:
+        for key, value in data.items():
+            if key == "success":
+                continue
+            if key == "structure" and isinstance(value, dict):
+                trees.append(value)
+            elif key in BODY_KEYS and isinstance(value, str):
+                bodies.append((prefix + key, value))
+            elif isinstance(value, dict) and key == "analysis":
+                collect(value, "")
+            elif isinstance(value, list) and value and isinstance(value[0], dict):
+                lines.append(f"{prefix}{key}:")
+                lines.extend(f"  - {_inline(item)}" for item in value)
+            else:
+                lines.append(f"{prefix}{key}: {_inline(value)}")
+
+    collect(payload)
+    for tree in trees:
+        lines.append("tree:")
+        lines.extend(render_tree(tree, 1))
+    for key, body in bodies:
+        label = payload.get("file_path", key)
+        lines.append(f"<<<{label}")
+        lines.append(body.rstrip("\n"))
+        lines.append(f">>>{label}")
+    return "\n".join(lines)
+
+
+class ObservationStats:
+    """Running token totals per tool for the JSON and compact formats."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._tools: Dict[str, Dict[str, int]] = {}
+
+    def record(self, tool_name: str, json_tokens: int, compact_tokens: int) -> None:
+        with self._lock:
+            entry = self._tools.setdefault(
+                tool_name, {"calls": 0, "json_tokens": 0, "compact_tokens": 0}
+            )
+            entry["calls"] += 1
+            entry["json_tokens"] += json_tokens
+            entry["compact_tokens"] += compact_tokens
+
+    def snapshot(self) -> Dict:
+        with self._lock:
+            tools = {name: dict(entry) for name, entry in self._tools.items()}
+        json_total = sum(e["json_tokens"] for e in tools.values())
+        compact_total = sum(e["compact_tokens"] for e in tools.values())
+        return {
+            "format": observation_format(),
+            "tools": tools,
+            "json_tokens": json_total,
+            "compact_tokens": compact_total,
+            "saved_percent": round(100.0 * (json_total - compact_total) / json_total, 1) if json_total else 0.0
+        }
+
+
+observation_stats = ObservationStats()
+
+
+def observe(tool_name: str, payload: Dict, fmt: Optional[str] = None) -> str:
+    """
+    Encode a tool result for the agent and record its token cost in both formats.
+    """
+    as_json = json.dumps(payload)
+    compact = render_compact(tool_name, payload)
+    json_tokens, compact_tokens = count_tokens(as_json), count_tokens(compact)
+    observation_stats.record(tool_name, json_tokens, compact_tokens)
+    logger.debug(f"{tool_name} observation: json={json_tokens} tokens, compact={compact_tokens} tokens")
+    return as_json if (fmt or observation_format()) == "json" else compact
@@ -1,14 +1,42 @@
 import os
 import tempfile
 import shutil
-import subprocess
 from typing import Dict, Optional
 from urllib.parse import urlparse
+from .file_reader import read_range
+from .ignore_rules import UNNECESSARY_ITEMS
+from .directory_listing import DirectoryIndex, get_shared_listing_cache, page_listing
+from .language_detection import detect_languages
+from .repo_context import build_file_index
+from .tree_walk import bounded_walk
+from .workspace import get_shared_workspace_registry
+
+
+def clean_unnecessary_files(repo_path: str) -> None:
+    """Remove unnecessary files and folders from cloned repository."""
+    for item in UNNECESSARY_ITEMS:
+        item_path = os.path.join(repo_path, item)
+        try:
+            if os.path.isdir(item_path):
+                shutil.rmtree(item_path)
+            elif os.path.isfile(item_path):
+                os.remove(item_path)
+            # Handle glob patterns
+            elif '*' in item:
+                import glob
+                for file_path in glob.glob(os.path.join(repo_path, '**', item), recursive=True):
+                    if os.path.isfile(file_path):
+                        os.remove(file_path)
+        except Exception as e:
+            # Silently continue if we can't remove some files
+            pass
+
 
 class RepositoryCloner:
     def __init__(self):
         self.temp_base_dir = tempfile.gettempdir()
         self.cloned_repos = {}  # Track cloned repositories
+        self.workspaces = get_shared_workspace_registry()
     
     def _validate_github_url(self, url: str) -> bool:
         """Validate if the provided URL is a valid GitHub repository URL."""
@@ -33,46 +61,17 @@ class RepositoryCloner:
     
     def _clean_unnecessary_files(self, repo_path: str) -> None:
         """Remove unnecessary files and folders from cloned repository."""
-        unnecessary_items = [
-            '.git',
-            'node_modules',
-            '__pycache__',
-            '.pytest_cache',
-            '.vscode',
-            '.idea',
-            '*.pyc',
-            '*.pyo',
-            '*.log',
-            'dist',
-            'build',
-            '.DS_Store',
-            'Thumbs.db'
-        ]
-        
-        for item in unnecessary_items:
-            item_path = os.path.join(repo_path, item)
-            try:
-                if os.path.isdir(item_path):
-                    shutil.rmtree(item_path)
-                elif os.path.isfile(item_path):
-                    os.remove(item_path)
-                # Handle glob patterns
-                elif '*' in item:
-                    import glob
-                    for file_path in glob.glob(os.path.join(repo_path, '**', item), recursive=True):
-                        if os.path.isfile(file_path):
-                            os.remove(file_path)
-            except Exception as e:
-                # Silently continue if we can't remove some files
-                pass
+        clean_unnecessary_files(repo_path)
     
-    def clone_repository(self, github_url: str, cleanup: bool = True) -> Dict:
+    def clone_repository(self, github_url: str, cleanup: bool = True,
+                         fetch_strategy: Optional[str] = None) -> Dict:
         """
         Clone a GitHub repository to a temporary folder.
         
         Args:
             github_url: GitHub repository URL
             cleanup: Whether to remove unnecessary files after cloning
+            fetch_strategy: 'archive', 'clone' or None to pick the cheaper one
             
         Returns:
             Dict with success status, local path, and repository info
@@ -85,37 +84,30 @@ class RepositoryCloner:
             if not repo_info:
                 return {"error": "Could not extract repository information from URL"}
             
-            # Create a unique temporary directory for this repository
-            temp_dir = tempfile.mkdtemp(prefix=f"repo_{repo_info['repo']}_")
-            repo_path = os.path.join(temp_dir, repo_info['repo'])
-            
-            # Clone the repository
-            try:
-                result = subprocess.run(
-                    ['git', 'clone', github_url, repo_path],
-                    capture_output=True,
-                    text=True,
-                    timeout=300  # 5 minute timeout
-                )
-                
-                if result.returncode != 0:
-                    return {"error": f"Git clone failed: {result.stderr}"}
-                
-            except subprocess.TimeoutExpired:
-                return {"error": "Repository clone timed out (5 minutes)"}
-            except FileNotFoundError:
-                return {"error": "Git is not installed or not found in PATH"}
+            # Acquire a shared checkout; concurrent clones of the same commit reuse it
+            workspace = self.workspaces.acquire(
+                github_url,
+                cleanup=cleanup,
+                cleaner=self._clean_unnecessary_files,
+                strategy=fetch_strategy
+            )
+            if "error" in workspace:
+                return {"error": workspace["error"]}
             
-            # Clean unnecessary files if requested
-            if cleanup:
-                self._clean_unnecessary_files(repo_path)
+            repo_path = workspace["local_path"]
+            temp_dir = workspace["temp_directory"]
             
-            # Store repository information
+            # Store repository information; every clone holds its own lease
+            previous = self.cloned_repos.get(repo_info['full_name'], {})
+            leases = previous.get("leases", []) + [workspace["workspace_key"]]
             self.cloned_repos[repo_info['full_name']] = {
                 "path": repo_path,
                 "temp_dir": temp_dir,
                 "url": github_url,
-                "cleaned": cleanup
+                "cleaned": cleanup,
+                "sha": workspace["sha"],
+                "workspace_key": workspace["workspace_key"],
+                "leases": leases
             }
             
             return {
@@ -125,7 +117,11 @@ class RepositoryCloner:
                 "temp_directory": temp_dir,
                 "cleaned": cleanup,
                 "owner": repo_info['owner'],
-                "repo_name": repo_info['repo']
+                "repo_name": repo_info['repo'],
+                "sha": workspace["sha"],
+                "shared": workspace["shared"],
+                "fetch_strategy": workspace["strategy"],
+                "skipped_files": workspace["skipped_files"]
             }
             
         except Exception as e:
@@ -152,17 +148,21 @@ class RepositoryCloner:
             repo_data = self.cloned_repos[repo_full_name]
             temp_dir = repo_data['temp_dir']
             
-            # Remove the temporary directory
-            if os.path.exists(temp_dir):
-                shutil.rmtree(temp_dir)
+            # Release our lease; the checkout is removed once no one else holds it
+            leases = repo_data.get('leases', [])
+            workspace_key = leases.pop() if leases else repo_data.get('workspace_key')
+            released = self.workspaces.release(workspace_key) if workspace_key else {}
+            removed = released.get("removed", False)
             
-            # Remove from tracking
-            del self.cloned_repos[repo_full_name]
+            # Remove from tracking once every lease has been released
+            if not leases:
+                del self.cloned_repos[repo_full_name]
             
             return {
                 "success": True,
                 "message": f"Successfully cleaned up {repo_full_name}",
-                "removed_path": temp_dir
+                "removed_path": temp_dir if removed else None,
+                "still_shared": not removed
             }
             
         except Exception as e:
@@ -175,11 +175,15 @@ class RepositoryCloner:
             errors = []
             
             for repo_name in list(self.cloned_repos.keys()):
-                result = self.cleanup_repo(repo_name)
-                if "success" in result:
-                    cleaned_repos.append(repo_name)
+                # Release every lease this cloner holds on the repository
+                while repo_name in self.cloned_repos:
+                    result = self.cleanup_repo(repo_name)
+                    if "success" not in result:
+                        errors.append(f"{repo_name}: {result.get('error', 'Unknown error')}")
+                        self.cloned_repos.pop(repo_name, None)
+                        break
                 else:
-                    errors.append(f"{repo_name}: {result.get('error', 'Unknown error')}")
+                    cleaned_repos.append(repo_name)
             
             return {
                 "success": True,
@@ -191,13 +195,19 @@ class RepositoryCloner:
         except Exception as e:
             return {"error": f"Cleanup all failed: {str(e)}"}
     
-    def get_repo_structure(self, repo_full_name: str, max_depth: int = 3) -> Dict:
+    def get_repo_structure(self, repo_full_name: str, max_depth: int = 3,
+                           max_entries: Optional[int] = None) -> Dict:
         """
         Get the directory structure of a cloned repository.
         
+        Shallow and high-signal directories are walked first and the walk stops
+        at ``max_entries``; directories it did not reach are marked truncated and
+        the files and bytes left out are estimated.
+        
         Args:
             repo_full_name: Repository name in format "owner/repo"
             max_depth: Maximum depth to traverse
+            max_entries: Files and directories returned (REPO_STRUCTURE_MAX_ENTRIES, default 500)
             
         Returns:
             Dict with repository structure
@@ -206,41 +216,43 @@ class RepositoryCloner:
             if repo_full_name not in self.cloned_repos:
                 return {"error": f"Repository {repo_full_name} not found in cloned repositories"}
             
-            repo_path = self.cloned_repos[repo_full_name]['path']
+            snapshot = self._snapshot(repo_full_name)
+            max_entries = max_entries or int(os.getenv("REPO_STRUCTURE_MAX_ENTRIES", "500"))
+            walk = bounded_walk(snapshot, max_entries, max_depth=max_depth, skip_hidden=True)
             
-            def get_structure(path, current_depth=0):
+            def get_structure(path):
+                node = walk["dirs"][path]
                 items = {}
-                if current_depth >= max_depth:
-                    return items
-                
-                try:
-                    for item in sorted(os.listdir(path)):
-                        if item.startswith('.'):
-                            continue
-                        
-                        item_path = os.path.join(path, item)
-                        if os.path.isdir(item_path):
-                            items[item] = {
-                                "type": "directory",
-                                "children": get_structure(item_path, current_depth + 1)
-                            }
-                        else:
-                            items[item] = {
-                                "type": "file",
-                                "size": os.path.getsize(item_path)
-                            }
-                except PermissionError:
-                    pass
-                
+                for item in sorted(node["dirs"]):
+                    item_path = f"{path}/{item}" if path else item
+                    child = walk["dirs"][item_path]
+                    items[item] = {"type": "directory", "children": get_structure(item_path) if child["listed"] else {}}
+                    # Not reached by the walk (depth limit or budget)
+                    if not child["listed"]:
+                        items[item]["truncated"] = True
+                for item in sorted(node["files"]):
+                    item_path = f"{path}/{item}" if path else item
+                    try:
+                        items[item] = {"type": "file", "size": snapshot.getsize(item_path)}
+                    except OSError:
+                        continue
+                if node["hidden_files"] or node["hidden_dirs"]:
+                    items["..."] = {
+                        "type": "truncated",
+                        "files": node["hidden_files"],
+                        "directories": node["hidden_dirs"]
+                    }
                 return items
             
-            structure = get_structure(repo_path)
+            structure = get_structure("") if walk["dirs"][""]["listed"] else {}
             
             return {
                 "success": True,
                 "repository": repo_full_name,
                 "structure": structure,
-                "max_depth": max_depth
+                "max_depth": max_depth,
+                "truncated": walk["truncated"],
+                "remaining": walk["remaining"]
             }
             
         except Exception as e:
@@ -253,11 +265,54 @@ class RepositoryCloner:
         except:
             pass
     
+    def _snapshot(self, repo_full_name: str):
+        """Get the snapshot (on disk or in memory) backing a cloned repository."""
+        return self.workspaces.snapshot_for(self.cloned_repos[repo_full_name]['path'])
+    
     def get_repository_structure(self, repo_full_name: str, max_depth: int = 3) -> Dict:
         """Alias for get_repo_structure for LangChain compatibility."""
         return self.get_repo_structure(repo_full_name, max_depth)
     
-    def read_file(self, repo_full_name: str, file_path: str, max_chars: int = 10000) -> str:
+    def list_directory(self, repo_full_name: str, path: str = "", cursor: Optional[str] = None,
+                       limit: int = 50) -> Dict:
+        """
+        List one directory level; child directories carry aggregates of their subtree.
+        
+        Args:
+            repo_full_name: Repository name in format "owner/repo"
+            path: Directory within the repository ("" for the root)
+            cursor: 'next_cursor' from a previous page
+            limit: Entries per page
+            
+        Returns:
+            Dict with the directory's own aggregates, one page of entries
+            (directories with files, bytes and languages; files with size),
+            total_entries and next_cursor
+        """
+        if repo_full_name not in self.cloned_repos:
+            raise Exception(f"Repository {repo_full_name} not found in cloned repositories")
+        
+        repo = self.cloned_repos[repo_full_name]
+        path = path.replace('\\', '/').strip().strip('/')
+        if path == '.':
+            path = ''
+        # The same commit lists the same way, so listings outlive the checkout
+        sha = repo.get("sha") or repo["path"]
+        cache = get_shared_listing_cache()
+        listing = cache.get(sha, path)
+        if listing is None:
+            snapshot = self._snapshot(repo_full_name)
+            file_index = self.workspaces.cached(repo["path"], 'file_index', lambda: build_file_index(snapshot))
+            index = self.workspaces.cached(repo["path"], 'directory_index', lambda: DirectoryIndex(file_index, snapshot))
+            if not index.is_dir(path):
+                if path in file_index:
+                    raise Exception(f"{path} is a file; use read_file")
+                raise Exception(f"Directory {path} not found in repository {repo_full_name}")
+            listing = {"directory": index.summary(path), "entries": index.entries(path)}
+            cache.put(sha, path, listing)
+        return page_listing(listing, sha, path, cursor, max(1, limit))
+    
+    def read_file(self, repo_full_name: str, file_path: str, max_chars: int = 10000, **range_args) -> str:
         """
         Read contents of a specific file from a cloned repository.
         
@@ -265,26 +320,53 @@ class RepositoryCloner:
             repo_full_name: Repository name in format "owner/repo"
             file_path: Relative path to file within repository
             max_chars: Maximum characters to read
+            **range_args: start_line, end_line, offset, length, tail_lines or
+                cursor, as accepted by read_file_range
             
         Returns:
             File contents as string
         """
+        return self.read_file_range(repo_full_name, file_path, max_chars, **range_args)["content"]
+    
+    def read_file_range(self, repo_full_name: str, file_path: str, max_chars: int = 10000,
+                        start_line: Optional[int] = None, end_line: Optional[int] = None,
+                        offset: Optional[int] = None, length: Optional[int] = None,
+                        tail_lines: Optional[int] = None, cursor: Optional[str] = None) -> Dict:
+        """
+        Read a window of a file: a line range, a byte range, the tail, or the
+        continuation of a previous read.
+        
+        Args:
+            repo_full_name: Repository name in format "owner/repo"
+            file_path: Relative path to file within repository
+            max_chars: Maximum characters to return
+            start_line: First line to return (1-based)
+            end_line: Last line to return (inclusive)
+            offset: Byte offset to start at
+            length: Maximum bytes to return
+            tail_lines: Return the last N lines
+            cursor: 'next_cursor' from a previous response
+            
+        Returns:
+            Dict with content, positions, encoding, binary/minified flags and next_cursor
+        """
         if repo_full_name not in self.cloned_repos:
             raise Exception(f"Repository {repo_full_name} not found in cloned repositories")
         
-        repo_path = self.cloned_repos[repo_full_name]['path']
-        full_file_path = os.path.join(repo_path, file_path)
+        snapshot = self._snapshot(repo_full_name)
         
-        if not os.path.exists(full_file_path):
+        if not snapshot.exists(file_path):
             raise Exception(f"File {file_path} not found in repository {repo_full_name}")
         
-        if not os.path.isfile(full_file_path):
+        if not snapshot.isfile(file_path):
             raise Exception(f"{file_path} is not a file")
         
         try:
-            with open(full_file_path, 'r', encoding='utf-8', errors='ignore') as f:
-                content = f.read(max_chars)
-            return content
+            return read_range(
+                snapshot, file_path, max_chars,
+                start_line=start_line, end_line=end_line, offset=offset,
+                length=length, tail_lines=tail_lines, cursor=cursor
+            )
         except Exception as e:
             raise Exception(f"Failed to read file {file_path}: {str(e)}")
     
@@ -301,7 +383,7 @@ class RepositoryCloner:
         if repo_full_name not in self.cloned_repos:
             raise Exception(f"Repository {repo_full_name} not found in cloned repositories")
         
-        repo_path = self.cloned_repos[repo_full_name]['path']
+        snapshot = self._snapshot(repo_full_name)
         
         analysis = {
             "total_files": 0,
@@ -325,71 +407,33 @@ class RepositoryCloner:
             'LICENSE', 'LICENSE.txt', 'MIT-LICENSE', 'COPYING'
         ]
         
-        # Technology indicators
-        tech_indicators = {
-            '.py': 'Python',
-            '.js': 'JavaScript',
-            '.ts': 'TypeScript',
-            '.jsx': 'React',
-            '.tsx': 'React TypeScript',
-            '.java': 'Java',
-            '.cpp': 'C++',
-            '.c': 'C',
-            '.cs': 'C#',
-            '.php': 'PHP',
-            '.rb': 'Ruby',
-            '.go': 'Go',
-            '.rs': 'Rust',
-            '.swift': 'Swift',
-            '.kt': 'Kotlin',
-            '.scala': 'Scala',
-            '.html': 'HTML',
-            '.css': 'CSS',
-            '.scss': 'SASS',
-            '.less': 'LESS',
-            '.vue': 'Vue.js',
-            '.r': 'R',
-            '.m': 'MATLAB/Objective-C',
-            '.sql': 'SQL'
-        }
-        
         try:
-            # Walk through directory structure
-            for root, dirs, files in os.walk(repo_path):
+            # Walk through directory structure once; language detection reuses the paths
+            paths = []
+            for root, dirs, files in snapshot.walk():
+                if '.git' in dirs:
+                    dirs.remove('.git')
                 analysis["total_directories"] += len(dirs)
                 analysis["total_files"] += len(files)
                 
                 for file in files:
-                    file_path = os.path.join(root, file)
-                    
-                    # Add file size
-                    try:
-                        analysis["size_bytes"] += os.path.getsize(file_path)
-                    except:
-                        pass
+                    file_path = f"{root}/{file}" if root else file
+                    paths.append(file_path)
                     
                     # Track file extensions
                     ext = os.path.splitext(file)[1].lower()
                     if ext:
                         analysis["file_extensions"][ext] = analysis["file_extensions"].get(ext, 0) + 1
-                        
-                        # Track technology indicators
-                        if ext in tech_indicators:
-                            tech = tech_indicators[ext]
-                            if tech not in analysis["technology_indicators"]:
-                                analysis["technology_indicators"].append(tech)
                     
                     # Check for important files
                     if file in important_files:
-                        analysis["key_files"].append(os.path.relpath(file_path, repo_path))
+                        analysis["key_files"].append(file_path)
             
             # Try to read README content
             for readme_file in ['README.md', 'README.txt', 'README.rst', 'README']:
-                readme_path = os.path.join(repo_path, readme_file)
-                if os.path.exists(readme_path):
+                if snapshot.isfile(readme_file):
                     try:
-                        with open(readme_path, 'r', encoding='utf-8', errors='ignore') as f:
-                            analysis["readme_content"] = f.read()[:2000]  # First 2000 chars
+                        analysis["readme_content"] = snapshot.read_text(readme_file, 2000)  # First 2000 chars
                         break
                     except:
                         continue
@@ -399,6 +443,13 @@ class RepositoryCloner:
                 sorted(analysis["file_extensions"].items(), key=lambda x: x[1], reverse=True)
             )
             
+            # Byte-weighted languages; sizes are estimated from a sample on large trees
+            detection = detect_languages(snapshot, paths=paths)
+            analysis["languages"] = detection["languages"]
+            analysis["technology_indicators"] = [entry["language"] for entry in detection["languages"]]
+            analysis["size_bytes"] = detection["total_bytes"]
+            analysis["size_estimated"] = detection["sampled"]
+            
         except Exception as e:
             analysis["error"] = str(e)
         
@@ -418,7 +469,9 @@ class RepositoryCloner:
                 "path": repo_data["path"],
                 "url": repo_data["url"],
                 "cleaned": repo_data["cleaned"],
-                "temp_dir": repo_data["temp_dir"]
+                "temp_dir": repo_data["temp_dir"],
+                "sha": repo_data.get("sha"),
+                "leases": len(repo_data.get("leases", []))
             })
         return repos
     
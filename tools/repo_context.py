@@ -0,0 +1,138 @@
+"""
+Repository context shared by the web app and the command-line analyzer.
+
+Everything here works on the snapshot API, so the same context is produced
+for disk checkouts, in-memory archives and object-store snapshots.
+"""
+
+from typing import Callable, Dict, Iterable, List, Optional
+from .file_reader import read_range
+from .tree_walk import bounded_walk, describe_remaining
+
+# Key files to analyze
+KEY_FILES = [
+    'package.json', 'requirements.txt', 'Dockerfile', 'docker-compose.yml',
+    'app.py', 'main.py', 'index.js', 'server.js', 'app.js',
+    'README.md', '.env.example', 'config.py', 'settings.py'
+]
+
+# Files indexed between budget checks
+INDEX_CHECK_INTERVAL = 256
+
+
+def render_structure(snapshot, max_lines: int = 100, max_files_per_dir: int = 10) -> str:
+    """
+    Render the directory tree of a snapshot.
+
+    Only what fits in ``max_lines`` is walked (shallow and high-signal
+    directories first); a last line estimates what was left out.
+    """
+    walk = bounded_walk(snapshot, max_lines, max_files_per_dir=max_files_per_dir)
+    dirs = walk["dirs"]
+    structure = []
+
+    def render(path: str, level: int) -> None:
+        node = dirs[path]
+        if path:
+            suffix = "" if node["listed"] else " ..."
+            structure.append(f"{' ' * 2 * level}{path.rsplit('/', 1)[-1]}/{suffix}")
+        if not node["listed"]:
+            return
+        subindent = ' ' * 2 * (level + 1)
+        for file in node["files"]:
+            structure.append(f"{subindent}{file}")
+        if node["hidden_files"]:
+            structure.append(f"{subindent}... and {node['hidden_files']} more files")
+        for name in sorted(node["dirs"]):
+            render(f"{path}/{name}" if path else name, level + 1)
+
+    render("", 0)
+    # Directories that were not walked; hidden files already have their own lines
+    if walk["remaining"]["estimated"]:
+        structure.append(describe_remaining(walk["remaining"]))
+    return '\n'.join(structure)
+
+
+def summarize_key_files(snapshot, file_names: Iterable[str]) -> Dict[str, str]:
+    """Excerpt each of ``file_names`` present in the snapshot, keyed by path."""
+    summaries = {}
+    for file_name in file_names:
+        if snapshot.isfile(file_name):
+            try:
+                # Only the first 2000 characters are decoded; binaries are skipped
+                result = read_range(snapshot, file_name, max_chars=2000)
+                if result.get("skipped"):
+                    continue
+                summaries[file_name] = result['content']
+            except Exception as e:
+                summaries[file_name] = f"Error reading file: {str(e)}"
+    return summaries
+
+
+def format_file_summaries(summaries: Dict[str, str]) -> str:
+    """Render key-file excerpts in KEY_FILES order."""
+    return '\n'.join(f"\n--- {name} ---\n{summaries[name]}" for name in KEY_FILES if name in summaries)
+
+
+def build_file_index(snapshot, check: Optional[Callable[[], None]] = None) -> Dict[str, int]:
+    """
+    Map every file in the snapshot to its size (``.git`` is not walked).
+
+    ``check`` is called every INDEX_CHECK_INTERVAL files and may raise to
+    abandon the walk, e.g. when the analysis runs out of time.
+    """
+    index = {}
+    seen = 0
+    for root, dirs, files in snapshot.walk():
+        if '.git' in dirs:
+            dirs.remove('.git')
+        for name in files:
+            if check and seen % INDEX_CHECK_INTERVAL == 0:
+                check()
+            seen += 1
+            path = f"{root}/{name}" if root else name
+            try:
+                index[path] = snapshot.getsize(path)
+            except OSError:
+                continue
+    return index
+
+
+def format_skipped_files(skipped_files: List[Dict], limit: int = 50) -> str:
+    """One line per skipped file (largest first), capped at ``limit`` lines."""
+    ordered = sorted(skipped_files, key=lambda entry: (-entry["size"], entry["path"]))
+    lines = [f"- {entry['path']} ({entry['size'] // 1024} KB)" for entry in ordered[:limit]]
+    if len(ordered) > limit:
+        lines.append(f"- ... and {len(ordered) - limit} more")
+    return "\n".join(lines)
+
+
+def build_context_prefix(github_url: str, repo_structure: str = "", repo_content: str = "",
+                         user_env_vars: Optional[Dict] = None,
+                         skipped_files: Optional[List[Dict]] = None) -> str:
+    """
+    Build the repository context shared by every analysis phase.
+
+    The result has to be byte-identical across phases for the provider's
+    prompt cache to hit, so it contains nothing time- or phase-dependent and
+    environment variables are listed in sorted order. ``skipped_files``
+    (``{"path", "size"}`` entries) names files that exist in the repository
+    but were not downloaded, so the agent does not take them for missing.
+    """
+    sections = [f"REPOSITORY: {github_url}"]
+    if repo_structure:
+        sections.append(f"STRUCTURE:\n{repo_structure}")
+    if skipped_files:
+        sections.append(f"FILES NOT DOWNLOADED (over the size cap; they exist but cannot be read):\n"
+                        f"{format_skipped_files(skipped_files)}")
+    if repo_content:
+        sections.append(f"CONTENT ANALYSIS:\n{repo_content}")
+    if user_env_vars:
+        env_vars_list = [f"- {key}={user_env_vars[key]}" for key in sorted(user_env_vars)]
+        sections.append(
+            "USER PROVIDED ENVIRONMENT VARIABLES:\n" + "\n".join(env_vars_list) +
+            "\n\nThese environment variables should be considered when analyzing deployment feasibility."
+        )
+    else:
+        sections.append("USER PROVIDED ENVIRONMENT VARIABLES: None provided")
+    return "\n\n".join(sections)
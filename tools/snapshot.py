@@ -0,0 +1,230 @@
+"""
+Repository snapshots behind a small filesystem-like interface.
+
+``DiskSnapshot`` serves a checkout directory; ``MemorySnapshot`` holds a small
+repository entirely in memory so analysis never touches the filesystem.
+Both expose the same read-only API with repository-relative, '/'-separated
+paths, so scanners and tools do not care where the bytes live.
+"""
+
+import codecs
+import mmap
+import os
+import posixpath
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Optional, Tuple
+from .archive_fetch import DEFAULT_MAX_FILE_BYTES, extract_stream, open_archive
+
+MEMORY_PREFIX = "mem://"
+
+# Repositories whose kept files fit under this many bytes stay in memory
+DEFAULT_MEMORY_MAX_BYTES = int(os.getenv("SNAPSHOT_MEMORY_MAX_MB", "16")) * 1024 * 1024
+
+
+def _norm(rel_path: str) -> str:
+    rel_path = (rel_path or "").replace("\\", "/").strip("/")
+    rel_path = posixpath.normpath(rel_path) if rel_path else ""
+    if rel_path in (".", ""):
+        return ""
+    if rel_path.startswith("../") or rel_path == "..":
+        raise ValueError(f"Path {rel_path} escapes the repository")
+    return rel_path
+
+
+class DiskSnapshot:
+    """Snapshot API over a checkout directory."""
+
+    in_memory = False
+
+    def __init__(self, root: str):
+        self.root = root
+
+    def _abs(self, rel_path: str) -> str:
+        return os.path.join(self.root, _norm(rel_path))
+
+    def exists(self, rel_path: str) -> bool:
+        return os.path.exists(self._abs(rel_path))
+
+    def isfile(self, rel_path: str) -> bool:
+        return os.path.isfile(self._abs(rel_path))
+
+    def isdir(self, rel_path: str) -> bool:
+        return os.path.isdir(self._abs(rel_path))
+
+    def getsize(self, rel_path: str) -> int:
+        return os.path.getsize(self._abs(rel_path))
+
+    def listdir(self, rel_path: str = "") -> List[str]:
+        return os.listdir(self._abs(rel_path))
+
+    def walk(self) -> Iterator[Tuple[str, List[str], List[str]]]:
+        """Like os.walk, but yields repository-relative roots ('' for the top)."""
+        for root, dirs, files in os.walk(self.root):
+            rel_root = os.path.relpath(root, self.root)
+            yield ("" if rel_root == "." else rel_root.replace(os.sep, "/")), dirs, files
+
+    def read_bytes(self, rel_path: str, limit: Optional[int] = None, offset: int = 0) -> bytes:
+        with open(self._abs(rel_path), "rb") as f:
+            if offset:
+                f.seek(offset)
+            return f.read() if limit is None else f.read(limit)
+
+    def read_text(self, rel_path: str, max_chars: Optional[int] = None, errors: str = "ignore") -> str:
+        with open(self._abs(rel_path), "r", encoding="utf-8", errors=errors) as f:
+            return f.read() if max_chars is None else f.read(max_chars)
+
+    @contextmanager
+    def buffer(self, rel_path: str):
+        """Memory-map a file so ranges can be sliced without reading it whole."""
+        with open(self._abs(rel_path), "rb") as f:
+            if os.fstat(f.fileno()).st_size == 0:
+                yield b""
+                return
+            mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            try:
+                yield mapped
+            finally:
+                mapped.close()
+
+
+class MemorySnapshot:
+    """A compact in-memory tree of file contents."""
+
+    in_memory = True
+
+    def __init__(self, name: str = "repo"):
+        self.root = f"{MEMORY_PREFIX}{name}"
+        self.files: Dict[str, bytes] = {}
+        self._children: Dict[str, Tuple[set, set]] = {"": (set(), set())}
+        self.total_bytes = 0
+
+    def _ensure_dir(self, rel_dir: str) -> None:
+        while rel_dir not in self._children:
+            self._children[rel_dir] = (set(), set())
+            parent, name = posixpath.split(rel_dir)
+            self._children.setdefault(parent, (set(), set()))[0].add(name)
+            rel_dir = parent
+
+    def add_dir(self, rel_path: str) -> None:
+        rel_path = _norm(rel_path)
+        if rel_path:
+            self._ensure_dir(rel_path)
+
+    def add_file(self, rel_path: str, data: bytes) -> None:
+        rel_path = _norm(rel_path)
+        parent, name = posixpath.split(rel_path)
+        self._ensure_dir(parent)
+        self._children[parent][1].add(name)
+        self.total_bytes += len(data) - len(self.files.get(rel_path, b""))
+        self.files[rel_path] = data
+
+    def exists(self, rel_path: str) -> bool:
+        rel_path = _norm(rel_path)
+        return rel_path in self.files or rel_path in self._children
+
+    def isfile(self, rel_path: str) -> bool:
+        return _norm(rel_path) in self.files
+
+    def isdir(self, rel_path: str) -> bool:
+        return _norm(rel_path) in self._children
+
+    def getsize(self, rel_path: str) -> int:
+        try:
+            return len(self.files[_norm(rel_path)])
+        except KeyError:
+            raise FileNotFoundError(rel_path)
+
+    def listdir(self, rel_path: str = "") -> List[str]:
+        try:
+            dirs, files = self._children[_norm(rel_path)]
+        except KeyError:
+            raise FileNotFoundError(rel_path)
+        return list(dirs) + list(files)
+
+    def walk(self) -> Iterator[Tuple[str, List[str], List[str]]]:
+        """Top-down walk; callers may prune ``dirs`` in place as with os.walk."""
+        stack = [""]
+        while stack:
+            rel_root = stack.pop()
+            dir_set, file_set = self._children[rel_root]
+            dirs, files = sorted(dir_set), sorted(file_set)
+            yield rel_root, dirs, files
+            for name in reversed(dirs):
+                stack.append(posixpath.join(rel_root, name) if rel_root else name)
+
+    def read_bytes(self, rel_path: str, limit: Optional[int] = None, offset: int = 0) -> bytes:
+        try:
+            data = self.files[_norm(rel_path)]
+        except KeyError:
+            raise FileNotFoundError(rel_path)
+        end = None if limit is None else offset + limit
+        return data[offset:end]
+
+    def read_text(self, rel_path: str, max_chars: Optional[int] = None, errors: str = "ignore") -> str:
+        # UTF-8 uses at most 4 bytes per character, so decode only what's needed
+        limit = None if max_chars is None else max_chars * 4
+        data = self.read_bytes(rel_path, limit)
+        # A character cut off by the limit is dropped, not reported as invalid
+        truncated = limit is not None and len(data) == limit
+        text = codecs.getincrementaldecoder("utf-8")(errors).decode(data, final=not truncated)
+        return text if max_chars is None else text[:max_chars]
+
+    @contextmanager
+    def buffer(self, rel_path: str):
+        yield self.read_bytes(rel_path)
+
+    def spill(self, dest: str) -> DiskSnapshot:
+        """Write the snapshot to ``dest`` and return a disk-backed equivalent."""
+        for rel_dir in self._children:
+            os.makedirs(os.path.join(dest, rel_dir), exist_ok=True)
+        for rel_path, data in self.files.items():
+            with open(os.path.join(dest, rel_path), "wb") as f:
+                f.write(data)
+        return DiskSnapshot(dest)
+
+
+def load_archive_snapshot(url: str, ref: str, spill_dir: str, github_token: Optional[str] = None,
+                          memory_max_bytes: int = DEFAULT_MEMORY_MAX_BYTES,
+                          max_file_bytes: int = DEFAULT_MAX_FILE_BYTES, timeout: int = 300) -> Dict:
+    """
+    Stream a repository archive into memory, spilling to ``spill_dir`` once the
+    kept files exceed ``memory_max_bytes``.
+
+    Returns:
+        Dict with success status, the resulting snapshot and extraction statistics
+    """
+    response, source = open_archive(url, ref, github_token, timeout)
+    if response is None:
+        return {"error": source}
+
+    name = url.rstrip("/").rsplit("/", 1)[-1].replace(".git", "") or "repo"
+    state = {"snapshot": MemorySnapshot(name)}
+
+    def on_dir(rel_path):
+        snapshot = state["snapshot"]
+        if snapshot.in_memory:
+            snapshot.add_dir(rel_path)
+        else:
+            os.makedirs(os.path.join(snapshot.root, rel_path), exist_ok=True)
+
+    def on_file(rel_path, archive, member):
+        data = archive.extractfile(member).read()
+        snapshot = state["snapshot"]
+        if snapshot.in_memory and snapshot.total_bytes + len(data) > memory_max_bytes:
+            snapshot = state["snapshot"] = snapshot.spill(spill_dir)
+        if snapshot.in_memory:
+            snapshot.add_file(rel_path, data)
+            return
+        target = os.path.join(snapshot.root, rel_path)
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        with open(target, "wb") as f:
+            f.write(data)
+
+    try:
+        stats = extract_stream(response.raw, on_file, on_dir, max_file_bytes)
+    except Exception as e:
+        return {"error": f"Archive extraction failed: {str(e)}"}
+    finally:
+        response.close()
+
+    return {"success": True, "source": source, "snapshot": state["snapshot"], **stats}
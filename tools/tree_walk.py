@@ -0,0 +1,250 @@
+"""
+Budgeted, priority-ordered directory walks.
+
+The structure views only show a bounded number of entries, so walking the
+whole tree wastes almost all of its I/O on huge monorepos. These walks go
+breadth-first and take shallow, high-signal directories (src, app, config,
+deploy, ...) before low-signal ones (tests, docs, examples, vendored code).
+They stop listing once the entry budget is spent. What was not walked is
+estimated from the directories that were: the mean files and subdirectories
+per directory at each depth, and the mean size of a sample of files.
+"""
+
+import heapq
+from typing import Dict, Iterable, List, Optional, Tuple
+
+# Directory names listed before their siblings
+HIGH_SIGNAL_DIRS = {
+    'src', 'app', 'apps', 'api', 'server', 'backend', 'frontend', 'web', 'lib', 'cmd',
+    'services', 'packages', 'config', 'configs', 'deploy', 'deployment', 'docker', 'k8s',
+    'helm', 'infra', '.github'
+}
+
+# Directory names listed after their siblings
+LOW_SIGNAL_DIRS = {
+    'test', 'tests', '__tests__', 'spec', 'docs', 'doc', 'examples', 'example', 'samples',
+    'fixtures', 'testdata', 'benchmarks', 'assets', 'static', 'public', 'images', 'vendor',
+    'third_party', 'node_modules', 'dist', 'build', 'coverage'
+}
+
+# File names shown before the other files of their directory
+HIGH_SIGNAL_FILES = {
+    'package.json', 'requirements.txt', 'pyproject.toml', 'setup.py', 'Pipfile', 'go.mod',
+    'Cargo.toml', 'pom.xml', 'build.gradle', 'Gemfile', 'composer.json', 'Dockerfile',
+    'docker-compose.yml', 'docker-compose.yaml', 'Procfile', 'Makefile', '.env.example',
+    'app.py', 'main.py', 'manage.py', 'server.js', 'index.js', 'app.js', 'main.go',
+    'config.py', 'settings.py', 'README.md'
+}
+
+# Files whose size is looked up to estimate the bytes of unwalked directories
+SIZE_SAMPLE = 64
+
+# Unwalked directories per depth that are listed (not shown) to estimate their level,
+# and how many levels below the walk are sampled this way
+PROBE_DIRS = 16
+PROBE_LEVELS = 16
+
+
+def _dir_rank(name: str) -> int:
+    if name.lower() in HIGH_SIGNAL_DIRS:
+        return 0
+    if name.lower() in LOW_SIGNAL_DIRS or name.startswith('.'):
+        return 2
+    return 1
+
+
+def order_dirs(names: Iterable[str]) -> List[str]:
+    """High-signal directories first, low-signal ones last, alphabetically within each."""
+    return sorted(names, key=lambda name: (_dir_rank(name), name))
+
+
+def order_files(names: Iterable[str]) -> List[str]:
+    """High-signal files first, then the rest alphabetically."""
+    return sorted(names, key=lambda name: (name not in HIGH_SIGNAL_FILES, name))
+
+
+def _list(snapshot, path: str, skip: set, skip_hidden: bool) -> Tuple[List[str], List[str]]:
+    """Subdirectory and file names of ``path``."""
+    child_dirs, child_files = [], []
+    for name in snapshot.listdir(path):
+        if name in skip or (skip_hidden and name.startswith('.')):
+            continue
+        child_path = f"{path}/{name}" if path else name
+        (child_dirs if snapshot.isdir(child_path) else child_files).append(name)
+    return child_dirs, child_files
+
+
+def bounded_walk(snapshot, max_entries: int, max_files_per_dir: Optional[int] = None,
+                 max_depth: Optional[int] = None, skip_hidden: bool = False,
+                 skip: Iterable[str] = ('.git',)) -> Dict:
+    """
+    Walk ``snapshot`` breadth-first in priority order until ``max_entries`` are taken.
+
+    Every shown directory, file and "more files" marker costs one entry; a
+    directory's files are taken before its subdirectories. Directories are
+    listed in order of depth, then signal (see HIGH_SIGNAL_DIRS and
+    LOW_SIGNAL_DIRS), then name. Listing stops once the budget is spent, and
+    shown directories that were never listed carry ``listed: False``.
+
+    Args:
+        snapshot: Repository snapshot
+        max_entries: Entry budget
+        max_files_per_dir: Files shown per directory (all when None)
+        max_depth: Directories at this depth or deeper are not listed (the root is depth 0)
+        skip_hidden: Leave out names starting with a dot
+        skip: Names never shown
+
+    Returns:
+        Dict with:
+            'dirs': ``path -> {"dirs": [...], "files": [...], "hidden_files": n,
+                "hidden_dirs": n, "listed": True, "depth": d}`` for every shown directory
+            'truncated': whether anything was left out
+            'remaining': files, directories and bytes left out, with 'estimated'
+                set when part of it is extrapolated from walked directories
+            'dirs_listed': directories whose contents were read
+    """
+    skip = set(skip)
+    dirs: Dict[str, Dict] = {"": {"listed": False, "depth": 0}}
+    queue = [(0, 0, "")]
+    entries = 0
+    # depth -> [directories listed, files found, subdirectories found]
+    depth_stats: Dict[int, List[int]] = {}
+    hidden_files = 0
+    hidden_dirs = 0
+    sampled_sizes: List[int] = []
+
+    while queue and entries < max_entries:
+        depth, _, path = heapq.heappop(queue)
+        if max_depth is not None and depth >= max_depth:
+            continue
+        try:
+            child_dirs, child_files = _list(snapshot, path, skip, skip_hidden)
+        except OSError:
+            continue
+        stats = depth_stats.setdefault(depth, [0, 0, 0])
+        stats[0] += 1
+        stats[1] += len(child_files)
+        stats[2] += len(child_dirs)
+
+        node = dirs[path]
+        node.update({"listed": True, "dirs": [], "files": [], "hidden_files": 0, "hidden_dirs": 0})
+        shown_files = order_files(child_files)
+        if max_files_per_dir is not None:
+            shown_files = shown_files[:max_files_per_dir]
+        # Keep one entry for the "more files" marker when files are left out
+        room = max_entries - entries
+        if len(shown_files) < len(child_files) or len(shown_files) > room:
+            room -= 1
+        node["files"] = shown_files[:max(room, 0)]
+        node["hidden_files"] = len(child_files) - len(node["files"])
+        entries += len(node["files"]) + (1 if node["hidden_files"] else 0)
+
+        for name in order_dirs(child_dirs):
+            if entries >= max_entries:
+                node["hidden_dirs"] += 1
+                continue
+            child_path = f"{path}/{name}" if path else name
+            node["dirs"].append(name)
+            dirs[child_path] = {"listed": False, "depth": depth + 1}
+            entries += 1
+            heapq.heappush(queue, (depth + 1, _dir_rank(name), child_path))
+        hidden_files += node["hidden_files"]
+        hidden_dirs += node["hidden_dirs"]
+
+        for name in child_files:
+            if len(sampled_sizes) >= SIZE_SAMPLE:
+                break
+            try:
+                sampled_sizes.append(snapshot.getsize(f"{path}/{name}" if path else name))
+            except OSError:
+                continue
+
+    # Sample the levels the walk did not cover: list (without showing) an evenly
+    # spread few unwalked directories per depth, then a few of their
+    # subdirectories one level down, and so on
+    frontier: Dict[int, List[str]] = {}
+    for path, node in dirs.items():
+        if not node["listed"]:
+            frontier.setdefault(node["depth"], []).append(path)
+    probed: Dict[str, Tuple[int, int]] = {}
+    for _ in range(PROBE_LEVELS):
+        if not frontier:
+            break
+        depth = min(frontier)
+        paths = frontier.pop(depth)
+        wanted = PROBE_DIRS - depth_stats.get(depth, [0])[0]
+        if wanted <= 0:
+            continue
+        stride = max(1, len(paths) // wanted)
+        for path in paths[::stride][:wanted]:
+            try:
+                child_dirs, child_files = _list(snapshot, path, skip, skip_hidden)
+            except OSError:
+                continue
+            probed[path] = (len(child_files), len(child_dirs))
+            stats = depth_stats.setdefault(depth, [0, 0, 0])
+            stats[0] += 1
+            stats[1] += len(child_files)
+            stats[2] += len(child_dirs)
+            frontier.setdefault(depth + 1, []).extend(f"{path}/{name}" for name in child_dirs)
+
+    # Extrapolate the subtrees that were never listed from the per-depth means
+    deepest = max(depth_stats) if depth_stats else 0
+
+    def subtree(depth: int, budget: int = PROBE_LEVELS + 8) -> Tuple[float, float]:
+        """Expected (files, directories) below a directory at ``depth``."""
+        stats = depth_stats.get(min(depth, deepest))
+        if not stats or budget == 0:
+            return 0.0, 0.0
+        files = stats[1] / stats[0]
+        # Branching is only trusted up to the deepest depth that was listed
+        branching = stats[2] / stats[0] if depth < deepest else 0.0
+        below_files, below_dirs = subtree(depth + 1, budget - 1) if branching else (0.0, 0.0)
+        return files + branching * below_files, branching * (1 + below_dirs)
+
+    unlisted = [(path, node["depth"]) for path, node in dirs.items() if not node["listed"]]
+    estimated_files = 0.0
+    estimated_dirs = 0.0
+    for path, depth in unlisted:
+        if path in probed:
+            # Its own level is known; only what lies below it is extrapolated
+            files, subdirs = probed[path]
+            below_files, below_dirs = subtree(depth + 1)
+            estimated_files += files + subdirs * below_files
+            estimated_dirs += subdirs * (1 + below_dirs)
+        else:
+            files, below = subtree(depth)
+            estimated_files += files
+            estimated_dirs += below
+    # Hidden subdirectories of listed directories are one level below them
+    for path, node in dirs.items():
+        if node.get("hidden_dirs"):
+            files, below = subtree(node["depth"] + 1)
+            estimated_files += node["hidden_dirs"] * files
+            estimated_dirs += node["hidden_dirs"] * (1 + below)
+
+    remaining_files = hidden_files + int(round(estimated_files))
+    mean_size = sum(sampled_sizes) / len(sampled_sizes) if sampled_sizes else 0
+    return {
+        "dirs": dirs,
+        "truncated": bool(hidden_files or hidden_dirs or unlisted),
+        "remaining": {
+            "files": remaining_files,
+            "directories": int(round(estimated_dirs)),
+            "bytes": int(remaining_files * mean_size),
+            "estimated": bool(unlisted or hidden_dirs)
+        },
+        "dirs_listed": sum(stats[0] for stats in depth_stats.values())
+    }
+
+
+def describe_remaining(remaining: Dict) -> str:
+    """One-line summary of what a bounded walk left out."""
+    prefix = "~" if remaining["estimated"] else ""
+    size = remaining["bytes"]
+    if size >= 1024 * 1024:
+        size_text = f"{size / (1024 * 1024):.1f} MB"
+    else:
+        size_text = f"{size / 1024:.0f} KB"
+    where = f" in {prefix}{remaining['directories']} more directories" if remaining["directories"] else ""
+    return f"... {prefix}{remaining['files']} more files{where} not shown ({prefix}{size_text})"
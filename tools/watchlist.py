@@ -0,0 +1,186 @@
+"""
+Watched repositories that are kept pre-analyzed.
+
+The watchlist polls each repository's HEAD with ``git ls-remote`` (a single
+round trip, nothing is downloaded) and can also be poked by a webhook, which
+makes it poll that repository right away. When
+HEAD moves, the repository is queued on a single low-priority worker that
+refreshes the analysis in the background, so the next interactive request
+for it is served from the stored result.
+"""
+
+import logging
+import os
+import queue
+import threading
+import time
+from typing import Callable, Dict, List, Optional
+from .workspace import authenticated_url, normalize_repo_url, resolve_head_sha
+
+logger = logging.getLogger(__name__)
+
+
+class Watchlist:
+    """
+    Polls watched repositories and refreshes their analyses when HEAD moves.
+
+    Args:
+        refresh: Called as ``refresh(url, github_token)`` on the background
+            lane when a repository's HEAD changes; returns the commit it analyzed
+        is_busy: Returns True while interactive work is running; the lane
+            defers refreshes until it returns False (or max_defer passes)
+        poll_interval: Seconds between polls (WATCHLIST_POLL_INTERVAL, default 300)
+        max_defer: Longest a refresh waits for interactive work (WATCHLIST_MAX_DEFER, default 600)
+    """
+
+    def __init__(self, refresh: Callable[[str, Optional[str]], str],
+                 is_busy: Optional[Callable[[], bool]] = None,
+                 poll_interval: Optional[int] = None, max_defer: Optional[int] = None):
+        self.refresh = refresh
+        self.is_busy = is_busy or (lambda: False)
+        self.poll_interval = poll_interval or int(os.getenv("WATCHLIST_POLL_INTERVAL", "300"))
+        self.max_defer = max_defer if max_defer is not None else int(os.getenv("WATCHLIST_MAX_DEFER", "600"))
+        self._entries: Dict[str, Dict] = {}
+        self._lock = threading.Lock()
+        self._queue: "queue.Queue[str]" = queue.Queue()
+        self._pending = set()
+        self._stop = threading.Event()
+        self._poller: Optional[threading.Thread] = None
+        self._worker: Optional[threading.Thread] = None
+
+    def add(self, url: str, github_token: Optional[str] = None) -> Dict:
+        """Watch ``url``; its first poll queues an initial precomputation."""
+        repo = normalize_repo_url(url)
+        with self._lock:
+            entry = self._entries.setdefault(repo, {
+                "url": url,
+                "head_sha": None,
+                "analyzed_sha": None,
+                "last_checked": None,
+                "last_refreshed": None,
+                "status": "registered",
+                "error": None
+            })
+            if github_token:
+                entry["github_token"] = github_token
+        return self.entry(url)
+
+    def remove(self, url: str) -> bool:
+        with self._lock:
+            return self._entries.pop(normalize_repo_url(url), None) is not None
+
+    def entry(self, url: str) -> Optional[Dict]:
+        with self._lock:
+            entry = self._entries.get(normalize_repo_url(url))
+            return {k: v for k, v in entry.items() if k != "github_token"} if entry else None
+
+    def list(self) -> List[Dict]:
+        with self._lock:
+            return [{k: v for k, v in e.items() if k != "github_token"} for e in self._entries.values()]
+
+    def is_watched(self, url: str) -> bool:
+        with self._lock:
+            return normalize_repo_url(url) in self._entries
+
+    def check(self, url: str) -> Dict:
+        """Compare ``url``'s HEAD with the last analyzed commit and queue a refresh if it moved."""
+        repo = normalize_repo_url(url)
+        with self._lock:
+            entry = self._entries.get(repo)
+            if entry is None:
+                return {"error": f"{url} is not on the watchlist"}
+            clone_url = authenticated_url(entry["url"], entry.get("github_token"))
+
+        head_sha = resolve_head_sha(clone_url)
+        with self._lock:
+            entry["last_checked"] = time.time()
+            if not head_sha:
+                entry["status"] = "unreachable"
+                return {"error": f"Could not resolve HEAD of {url}"}
+            entry["head_sha"] = head_sha
+            changed = head_sha != entry["analyzed_sha"]
+            if changed and repo not in self._pending:
+                self._pending.add(repo)
+                entry["status"] = "queued"
+                self._queue.put(repo)
+        return {"success": True, "head_sha": head_sha, "queued": changed}
+
+    def poll_once(self) -> None:
+        with self._lock:
+            urls = [e["url"] for e in self._entries.values()]
+        for url in urls:
+            if self._stop.is_set():
+                return
+            try:
+                self.check(url)
+            except Exception as e:
+                logger.warning(f"Watchlist poll of {url} failed: {str(e)}")
+
+    def _wait_until_idle(self) -> None:
+        deadline = time.time() + self.max_defer
+        while self.is_busy() and time.time() < deadline and not self._stop.is_set():
+            self._stop.wait(1.0)
+
+    def _run_worker(self) -> None:
+        while not self._stop.is_set():
+            try:
+                repo = self._queue.get(timeout=1.0)
+            except queue.Empty:
+                continue
+            with self._lock:
+                entry = self._entries.get(repo)
+                if entry is None:
+                    self._pending.discard(repo)
+                    continue
+                url, token = entry["url"], entry.get("github_token")
+            # Interactive analyses go first
+            self._wait_until_idle()
+            with self._lock:
+                entry["status"] = "refreshing"
+            try:
+                # HEAD may have moved since it was queued; record what was actually analyzed
+                analyzed_sha = self.refresh(url, token)
+                with self._lock:
+                    entry.update({
+                        "analyzed_sha": analyzed_sha,
+                        "last_refreshed": time.time(),
+                        "status": "warm",
+                        "error": None
+                    })
+            except Exception as e:
+                logger.error(f"Watchlist refresh of {url} failed: {str(e)}")
+                with self._lock:
+                    entry.update({"status": "failed", "error": str(e)})
+            finally:
+                with self._lock:
+                    self._pending.discard(repo)
+
+    def start(self) -> None:
+        """Start the poller and the background refresh lane (idempotent)."""
+        if self._poller and self._poller.is_alive():
+            return
+        self._stop.clear()
+
+        def poll():
+            while not self._stop.is_set():
+                self.poll_once()
+                self._stop.wait(self.poll_interval)
+
+        self._poller = threading.Thread(target=poll, name="watchlist-poller", daemon=True)
+        self._worker = threading.Thread(target=self._run_worker, name="watchlist-refresh", daemon=True)
+        self._poller.start()
+        self._worker.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+
+    def stats(self) -> Dict:
+        with self._lock:
+            statuses = [e["status"] for e in self._entries.values()]
+        return {
+            "watched": len(statuses),
+            "warm": statuses.count("warm"),
+            "queued": self._queue.qsize(),
+            "poll_interval": self.poll_interval,
+            "running": bool(self._poller and self._poller.is_alive())
+        }
@@ -0,0 +1,545 @@
+"""
+Shared, reference-counted repository workspaces.
+
+Checkouts are keyed by (repository, commit SHA) so concurrent analyses of the
+same snapshot share one clone and one scan. Checkouts are handed out read-only
+and are only removed when the last holder releases them. Holders refer to a
+checkout by its workspace id, which never changes. Every caller proves it
+can reach the repository with its own URL before a checkout is shared with it.
+"""
+
+import hashlib
+import os
+import re
+import shutil
+import stat
+import subprocess
+import threading
+import time
+import uuid
+from typing import Any, Callable, Dict, Optional, Tuple
+from urllib.parse import urlparse
+from .archive_fetch import choose_fetch_strategy, fetch_archive
+from .cancellation import AnalysisCancelled, CancellationToken, check_cancelled, run_cancellable
+from .git_object_store import get_shared_object_store
+from .snapshot import MEMORY_PREFIX, DiskSnapshot, load_archive_snapshot
+from .workspace_manager import WorkspaceManager, estimate_repo_size, get_shared_workspace_manager
+
+
+def normalize_repo_url(url: str) -> str:
+    """Return a credential-free identity for a repository URL (host/owner/repo)."""
+    parsed = urlparse(url.strip())
+    host = (parsed.hostname or "").lower()
+    path = parsed.path.strip("/")
+    if path.endswith(".git"):
+        path = path[:-4]
+    return f"{host}/{path}" if host else path
+
+
+def authenticated_url(github_url: str, github_token: Optional[str] = None) -> str:
+    """Embed the GitHub token in the URL used for git operations."""
+    if github_token and github_url.startswith('https://github.com/'):
+        # Convert GitHub URL to authenticated URL
+        return github_url.replace('https://github.com/', f'https://{github_token}@github.com/')
+    return github_url
+
+
+FULL_SHA = re.compile(r'[0-9a-f]{40}')
+
+
+def _ls_remote(url: str, ref: Optional[str] = None, timeout: float = 30,
+               cancel_token: Optional[CancellationToken] = None) -> Tuple[Optional[str], Optional[str]]:
+    """
+    Resolve the commit SHA of ``ref`` (default HEAD) without cloning.
+
+    Returns:
+        (SHA, None), or (None, why it could not be resolved); the reason never
+        contains ``url``, which may carry credentials
+
+    Raises:
+        AnalysisCancelled: ``cancel_token`` was cancelled
+    """
+    try:
+        result = run_cancellable(['git', 'ls-remote', url, ref or 'HEAD'], timeout=timeout, token=cancel_token)
+    except subprocess.TimeoutExpired:
+        return None, f"git ls-remote timed out ({timeout} seconds)"
+    except FileNotFoundError:
+        return None, "Git is not installed or not found in PATH"
+    if result.returncode != 0:
+        return None, f"git ls-remote exited with status {result.returncode}"
+    for line in result.stdout.splitlines():
+        sha = line.split('\t', 1)[0].strip()
+        if FULL_SHA.fullmatch(sha):
+            return sha, None
+    return None, f"no such ref '{ref or 'HEAD'}'"
+
+
+def credential_fingerprint(url: str) -> str:
+    """Short digest of a (possibly authenticated) URL, so callers can be told apart without keeping the URL."""
+    return hashlib.sha256(url.encode()).hexdigest()[:16]
+
+
+def resolve_head_sha(url: str, ref: Optional[str] = None, timeout: float = 30,
+                     cancel_token: Optional[CancellationToken] = None) -> Optional[str]:
+    """Resolve the commit SHA of ``ref`` (default HEAD) without cloning."""
+    return _ls_remote(url, ref, timeout, cancel_token)[0]
+
+
+def _set_writable(path: str, writable: bool) -> None:
+    """Add or strip the write bits on every file and directory below ``path``."""
+    mask = stat.S_IWUSR | stat.S_IWGRP | stat.S_IWOTH
+    for root, dirs, files in os.walk(path, topdown=not writable):
+        for name in dirs + files:
+            item_path = os.path.join(root, name)
+            try:
+                if os.path.islink(item_path):
+                    continue
+                mode = os.stat(item_path).st_mode
+                os.chmod(item_path, (mode | stat.S_IWUSR) if writable else (mode & ~mask))
+            except OSError:
+                pass
+    try:
+        mode = os.stat(path).st_mode
+        os.chmod(path, (mode | stat.S_IWUSR) if writable else (mode & ~mask))
+    except OSError:
+        pass
+
+
+def force_rmtree(path: str) -> None:
+    """Remove a directory tree, restoring write permission where needed."""
+    if not path or not os.path.exists(path):
+        return
+
+    def on_error(func, failed_path, exc_info):
+        parent = os.path.dirname(failed_path)
+        try:
+            os.chmod(parent, os.stat(parent).st_mode | stat.S_IWUSR)
+            os.chmod(failed_path, os.stat(failed_path).st_mode | stat.S_IWUSR)
+        except OSError:
+            pass
+        func(failed_path)
+
+    _set_writable(path, True)
+    shutil.rmtree(path, onerror=on_error)
+
+
+def snapshot_mode() -> str:
+    """
+    Where archive snapshots are held. 'auto' (the default) keeps them in
+    memory below SNAPSHOT_MEMORY_MAX_MB and spills to disk above it; 'disk'
+    always extracts to disk.
+    """
+    return os.getenv("SNAPSHOT_MODE", "auto").lower()
+
+
+def _path_key(local_path: str) -> str:
+    # Virtual snapshots (mem://, objects://) are keyed by their URI as-is
+    if "://" in local_path:
+        return local_path
+    return os.path.realpath(local_path)
+
+
+class Workspace:
+    """A single checkout shared by every holder of the same (repo, SHA)."""
+
+    def __init__(self, key: Tuple[str, str, bool], repo: str, sha: Optional[str], cleaned: bool):
+        self.id = uuid.uuid4().hex[:16]
+        self.key = key
+        self.repo = repo
+        self.sha = sha
+        self.cleaned = cleaned
+        self.path: Optional[str] = None
+        self.temp_dir: Optional[str] = None
+        self.refcount = 0
+        self.error: Optional[str] = None
+        self.ready = threading.Event()
+        self.cache: Dict[str, Any] = {}
+        self.cache_lock = threading.Lock()
+        self.strategy: Optional[str] = None
+        self.snapshot = None
+        self.skipped_files: list = []
+        # (repo, ref, cleaned, credential fingerprint) names that currently lead to this workspace
+        self.aliases: list = []
+
+    @property
+    def label(self) -> str:
+        return f"{self.repo}@{self.sha[:12]}{'' if self.cleaned else '+git'}"
+
+
+class WorkspaceRegistry:
+    """
+    Hands out shared, read-only checkouts with reference counts.
+
+    The first caller for a (repo, SHA) pair clones it; concurrent callers wait
+    for that clone instead of starting their own. ``release`` removes the
+    checkout once its reference count drops to zero.
+
+    A caller only gets a checkout after ``git ls-remote`` with its own
+    ``clone_url`` succeeded, even for a full SHA. The one exception is a
+    branch or HEAD that the same URL (credentials included) resolved to a
+    live workspace less than WORKSPACE_REF_TTL seconds (default 60) ago.
+    """
+
+    def __init__(self, manager: Optional[WorkspaceManager] = None, ref_ttl: Optional[float] = None):
+        self.manager = manager or get_shared_workspace_manager()
+        self.ref_ttl = ref_ttl if ref_ttl is not None else float(os.getenv("WORKSPACE_REF_TTL", "60"))
+        self._workspaces: Dict[Tuple[str, str, bool], Workspace] = {}
+        self._by_id: Dict[str, Workspace] = {}
+        self._by_path: Dict[str, Workspace] = {}
+        # (repo, ref, cleaned, credential fingerprint) -> (workspace, monotonic time the ref was resolved)
+        self._aliases: Dict[Tuple[str, str, bool, str], Tuple[Workspace, float]] = {}
+        self._lock = threading.Lock()
+
+    def acquire(self, url: str, clone_url: Optional[str] = None, ref: Optional[str] = None,
+                cleanup: bool = True, cleaner: Optional[Callable[[str], None]] = None,
+                timeout: int = 300, strategy: Optional[str] = None,
+                github_token: Optional[str] = None,
+                cancel_token: Optional[CancellationToken] = None) -> Dict:
+        """
+        Get a shared checkout of ``url`` at ``ref`` (default HEAD).
+
+        Args:
+            url: Public repository URL, used as the workspace identity
+            clone_url: URL to clone from, e.g. one carrying credentials
+            ref: Branch, tag or SHA to check out
+            cleanup: Whether unnecessary files are stripped from the checkout
+            cleaner: Callable applied to the checkout when ``cleanup`` is set
+            timeout: Clone timeout in seconds
+            strategy: 'archive', 'clone' or 'auto' (see choose_fetch_strategy)
+            github_token: Token for archive downloads of private repositories
+            cancel_token: Cancelling it kills the clone, unless other callers
+                are waiting for the same checkout, and stops waiting for it
+
+        Returns:
+            Dict with success status, workspace key (its id), local path, SHA
+            and the files left out of an archive for being over the size cap,
+            or an error when ``clone_url`` cannot reach the repository or
+            ``ref`` cannot be resolved or fetched
+
+        Raises:
+            AnalysisCancelled: ``cancel_token`` was cancelled; no reference is held
+        """
+        clone_url = clone_url or url
+        repo = normalize_repo_url(url)
+        full_sha = bool(ref and FULL_SHA.fullmatch(ref))
+        alias = (repo, ref or "HEAD", cleanup, credential_fingerprint(clone_url))
+        workspace = None if full_sha else self._reuse(alias)
+        owner = False
+        if workspace is None:
+            # Also the access check: nothing is shared with a caller whose URL cannot reach the repository
+            sha, error = _ls_remote(clone_url, None if full_sha else ref, cancel_token=cancel_token)
+            if not sha:
+                return {"error": f"Could not resolve {ref or 'HEAD'} of {repo}: {error}"}
+            if full_sha:
+                sha = ref
+            key = (repo, sha, cleanup)
+            with self._lock:
+                workspace = self._workspaces.get(key)
+                owner = workspace is None
+                if owner:
+                    workspace = Workspace(key, repo, sha, cleanup)
+                    self._workspaces[key] = workspace
+                    self._by_id[workspace.id] = workspace
+                workspace.refcount += 1
+                if not full_sha:
+                    if alias not in workspace.aliases:
+                        workspace.aliases.append(alias)
+                    self._aliases[alias] = (workspace, time.monotonic())
+
+        if owner:
+            # Archives carry no history, so only cleaned checkouts can use them
+            fetch_strategy = choose_fetch_strategy(
+                url, need_history=not cleanup, requested=strategy,
+                local_objects=get_shared_object_store().has_repository(repo)
+            )
+            self._populate(workspace, url, clone_url, ref, cleaner if cleanup else None,
+                           timeout, fetch_strategy, github_token, cancel_token)
+        elif cancel_token is None:
+            workspace.ready.wait(timeout)
+        else:
+            waited = 0.0
+            while not workspace.ready.wait(0.5) and waited < timeout and not cancel_token.cancelled:
+                waited += 0.5
+
+        if cancel_token is not None and cancel_token.cancelled:
+            self._drop_reference(workspace)
+            raise AnalysisCancelled(cancel_token.reason)
+
+        if workspace.error or not workspace.path:
+            error = workspace.error or "Timed out waiting for shared checkout"
+            self._drop_reference(workspace)
+            return {"error": error}
+
+        return {
+            "success": True,
+            "workspace_key": workspace.id,
+            "local_path": workspace.path,
+            "temp_directory": workspace.temp_dir,
+            "sha": workspace.sha,
+            "shared": not owner,
+            "refcount": workspace.refcount,
+            "strategy": workspace.strategy,
+            "skipped_files": workspace.skipped_files
+        }
+
+    def _reuse(self, alias: Tuple[str, str, bool, str]) -> Optional[Workspace]:
+        """Take a reference to the live workspace the same URL resolved ``alias`` to recently, if any."""
+        with self._lock:
+            entry = self._aliases.get(alias)
+            if entry is None:
+                return None
+            workspace, resolved_at = entry
+            if (workspace.error is None and self._by_id.get(workspace.id) is workspace
+                    and time.monotonic() - resolved_at < self.ref_ttl):
+                workspace.refcount += 1
+                return workspace
+            return None
+
+    def _discard(self, workspace: Workspace) -> None:
+        """Stop handing out ``workspace`` to new callers; current holders keep it."""
+        with self._lock:
+            if self._workspaces.get(workspace.key) is workspace:
+                del self._workspaces[workspace.key]
+            for alias in workspace.aliases:
+                if self._aliases.get(alias, (None,))[0] is workspace:
+                    del self._aliases[alias]
+
+    def _populate(self, workspace: Workspace, url: str, clone_url: str, ref: Optional[str],
+                  cleaner: Optional[Callable[[str], None]], timeout: int,
+                  strategy: str, github_token: Optional[str],
+                  cancel_token: Optional[CancellationToken] = None) -> None:
+        """Fetch the repository snapshot for a freshly registered workspace."""
+        try:
+            self._fetch(workspace, url, clone_url, ref, cleaner, timeout, strategy, github_token, cancel_token)
+        finally:
+            if workspace.error or not workspace.path:
+                # A failed fetch is never shared: the next caller tries again
+                self._discard(workspace)
+            workspace.ready.set()
+
+    def _fetch(self, workspace: Workspace, url: str, clone_url: str, ref: Optional[str],
+               cleaner: Optional[Callable[[str], None]], timeout: int,
+               strategy: str, github_token: Optional[str],
+               cancel_token: Optional[CancellationToken] = None) -> None:
+        if strategy == "objects":
+            # Served from the shared bare clone; nothing is checked out
+            try:
+                snapshot = get_shared_object_store().snapshot(
+                    workspace.repo, clone_url, workspace.sha or ref, timeout, cancel_token
+                )
+                workspace.sha = snapshot.commit
+                workspace.strategy = "objects"
+                workspace.snapshot = snapshot
+                workspace.path = snapshot.root
+                with self._lock:
+                    self._by_path[workspace.path] = workspace
+            except Exception as e:
+                workspace.error = str(e)
+            return
+
+        name = workspace.repo.rsplit('/', 1)[-1] or 'repo'
+        # Checked against the quota (and the tmpfs limit) before anything is fetched
+        size_hint = estimate_repo_size(clone_url)
+        try:
+            temp_dir = self.manager.allocate(f"repo_{name}_", size_hint)
+        except Exception as e:
+            workspace.error = str(e)
+            return
+        repo_path = os.path.join(temp_dir, name)
+        try:
+            fetched = False
+            if strategy == "archive":
+                archive_ref = workspace.sha or ref or "HEAD"
+                if snapshot_mode() == "disk":
+                    result = fetch_archive(url, repo_path, archive_ref,
+                                           github_token=github_token, timeout=timeout)
+                else:
+                    result = load_archive_snapshot(url, archive_ref, repo_path,
+                                                   github_token=github_token, timeout=timeout)
+                fetched = "success" in result
+                if fetched:
+                    workspace.strategy = "archive"
+                    workspace.skipped_files = result.get("skipped_large", [])
+                    snapshot = result.get("snapshot")
+                    if snapshot is not None and snapshot.in_memory:
+                        # Small repository: serve it from memory, no checkout on disk
+                        snapshot.root = f"{MEMORY_PREFIX}{workspace.repo}@{workspace.id}"
+                        workspace.snapshot = snapshot
+                        workspace.path = snapshot.root
+                        force_rmtree(temp_dir)
+                        self.manager.forget(temp_dir)
+                        with self._lock:
+                            self._by_path[workspace.path] = workspace
+                        return
+                else:
+                    # Fall back to a regular clone on any archive failure
+                    force_rmtree(repo_path)
+
+            if not fetched:
+                check_cancelled(cancel_token)
+                self._clone(workspace, clone_url, ref, repo_path, timeout, cancel_token)
+                workspace.strategy = "clone"
+                if cleaner:
+                    cleaner(repo_path)
+
+            self.manager.commit(temp_dir)
+            _set_writable(repo_path, False)
+
+            workspace.path = repo_path
+            workspace.temp_dir = temp_dir
+            workspace.snapshot = DiskSnapshot(repo_path)
+            with self._lock:
+                self._by_path[_path_key(repo_path)] = workspace
+        except Exception as e:
+            workspace.error = str(e)
+            force_rmtree(temp_dir)
+            self.manager.forget(temp_dir)
+
+    def _clone(self, workspace: Workspace, clone_url: str, ref: Optional[str],
+               repo_path: str, timeout: int, cancel_token: Optional[CancellationToken] = None) -> None:
+        """Clone and check out the workspace's commit with git."""
+        try:
+            # A cancelled owner only kills the clone when nobody else waits for it
+            result = run_cancellable(
+                ['git', 'clone', clone_url, repo_path],
+                timeout=timeout,
+                token=cancel_token,
+                should_kill=lambda: workspace.refcount <= 1
+            )
+        except subprocess.TimeoutExpired:
+            raise RuntimeError(f"Repository clone timed out ({timeout} seconds)")
+        except FileNotFoundError:
+            raise RuntimeError("Git is not installed or not found in PATH")
+
+        if result.returncode != 0:
+            raise RuntimeError(f"Git clone failed: {result.stderr}")
+
+        target = workspace.sha or ref
+        if target:
+            checkout = subprocess.run(
+                ['git', '-C', repo_path, 'checkout', '--quiet', target],
+                capture_output=True,
+                text=True
+            )
+            if checkout.returncode != 0:
+                raise RuntimeError(f"Git checkout of {target} failed: {checkout.stderr}")
+        if not workspace.sha:
+            head = subprocess.run(
+                ['git', '-C', repo_path, 'rev-parse', 'HEAD'],
+                capture_output=True,
+                text=True
+            )
+            workspace.sha = head.stdout.strip() or None
+
+    def _drop_reference(self, workspace: Workspace) -> bool:
+        """Decrement a workspace's refcount, deleting it when unused."""
+        with self._lock:
+            workspace.refcount -= 1
+            if workspace.refcount > 0:
+                return False
+            self._by_id.pop(workspace.id, None)
+            if self._workspaces.get(workspace.key) is workspace:
+                del self._workspaces[workspace.key]
+            for alias in workspace.aliases:
+                if self._aliases.get(alias, (None,))[0] is workspace:
+                    del self._aliases[alias]
+            if workspace.path:
+                self._by_path.pop(_path_key(workspace.path), None)
+        if workspace.temp_dir:
+            force_rmtree(workspace.temp_dir)
+            self.manager.forget(workspace.temp_dir)
+        return True
+
+    def release(self, workspace_key: str) -> Dict:
+        """Release one reference to a workspace by its id (the ``workspace_key`` acquire returned)."""
+        with self._lock:
+            workspace = self._by_id.get(workspace_key)
+        if workspace is None:
+            return {"error": f"Workspace {workspace_key} not found"}
+        removed = self._drop_reference(workspace)
+        return {
+            "success": True,
+            "workspace_key": workspace_key,
+            "removed": removed,
+            "removed_path": workspace.temp_dir if removed else None
+        }
+
+    def release_path(self, local_path: str) -> Dict:
+        """Release one reference to the workspace checked out at ``local_path``."""
+        workspace = self.get_by_path(local_path)
+        if workspace is None:
+            return {"error": f"No workspace registered at {local_path}"}
+        return self.release(workspace.id)
+
+    def get_by_path(self, local_path: str) -> Optional[Workspace]:
+        """Find the workspace checked out at ``local_path``."""
+        if not local_path:
+            return None
+        with self._lock:
+            return self._by_path.get(_path_key(local_path))
+
+    def snapshot_for(self, local_path: str):
+        """
+        Get the snapshot serving ``local_path``: the workspace's in-memory or
+        disk snapshot, or a DiskSnapshot for an unmanaged directory.
+        """
+        workspace = self.get_by_path(local_path)
+        if workspace is not None and workspace.snapshot is not None:
+            return workspace.snapshot
+        if local_path and "://" in local_path:
+            raise FileNotFoundError(f"Snapshot {local_path} has been released")
+        return DiskSnapshot(local_path)
+
+    def memory_bytes(self) -> int:
+        """Bytes held by in-memory snapshots."""
+        with self._lock:
+            return sum(
+                w.snapshot.total_bytes for w in self._by_id.values()
+                if w.snapshot is not None and w.snapshot.in_memory
+            )
+
+    def cached(self, local_path: str, name: str, compute: Callable[[], Any]) -> Any:
+        """
+        Compute a scan result once per workspace and share it with every holder.
+
+        Paths that are not managed by the registry are computed directly.
+        """
+        workspace = self.get_by_path(local_path)
+        if workspace is None:
+            return compute()
+        with workspace.cache_lock:
+            if name not in workspace.cache:
+                workspace.cache[name] = compute()
+            return workspace.cache[name]
+
+    def list_workspaces(self) -> list:
+        """List active workspaces with their reference counts."""
+        with self._lock:
+            return [
+                {
+                    "workspace_key": w.id,
+                    "label": w.label,
+                    "repository": w.repo,
+                    "sha": w.sha,
+                    "path": w.path,
+                    "refcount": w.refcount,
+                    "cleaned": w.cleaned,
+                    "strategy": w.strategy,
+                    "in_memory": bool(w.snapshot is not None and w.snapshot.in_memory)
+                }
+                for w in self._by_id.values()
+            ]
+
+
+# Shared WorkspaceRegistry instance
+_shared_workspace_registry = None
+_shared_registry_lock = threading.Lock()
+
+
+def get_shared_workspace_registry() -> WorkspaceRegistry:
+    """Get or create the process-wide WorkspaceRegistry instance."""
+    global _shared_workspace_registry
+    with _shared_registry_lock:
+        if _shared_workspace_registry is None:
+            _shared_workspace_registry = WorkspaceRegistry()
+        return _shared_workspace_registry
@@ -0,0 +1,391 @@
+"""
+Managed workspace root for repository checkouts.
+
+Enforces a global byte quota and a per-analysis size limit, can place small
+repositories on tmpfs, and runs a janitor thread that reclaims directories
+orphaned by crashed or killed workers, including the ``repo_*`` and
+``<name>_<random>`` checkouts that earlier versions left in the system
+temporary directory.
+"""
+
+import json
+import os
+import re
+import shutil
+import tempfile
+import threading
+import time
+from typing import Callable, Dict, List, Optional, Tuple
+from urllib.parse import unquote, urlparse
+
+OWNER_MARKER = ".workspace-owner"
+
+# Checkouts made before the managed root existed: tempfile.mkdtemp(prefix="repo_<name>_")
+# in the cloner and "<name>_<8 random characters>" in the web app
+LEGACY_CHECKOUT = re.compile(r'repo_.+_[a-z0-9_]{8}|.+_[a-z0-9]{8}')
+
+# Seconds a repository size (or a failed lookup) is remembered
+SIZE_CACHE_TTL = 3600
+SIZE_FAILURE_TTL = 300
+_size_cache: Dict[Tuple[str, bool], Tuple[Optional[int], float]] = {}
+_size_cache_lock = threading.Lock()
+
+
+class WorkspaceQuotaError(Exception):
+    """Raised when a checkout would exceed the workspace quota."""
+    pass
+
+
+def _env_int(name: str, default: int) -> int:
+    try:
+        return int(os.getenv(name, default))
+    except (TypeError, ValueError):
+        return default
+
+
+def directory_size(path: str) -> int:
+    """Total size in bytes of the regular files below ``path``."""
+    total = 0
+    for root, dirs, files in os.walk(path):
+        for file in files:
+            try:
+                total += os.lstat(os.path.join(root, file)).st_size
+            except OSError:
+                pass
+    return total
+
+
+def _pid_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    except OSError:
+        return False
+    return True
+
+
+def estimate_repo_size(url: str, timeout: int = 5) -> Optional[int]:
+    """
+    Ask the GitHub API for a repository's size in bytes, if it is reachable.
+
+    A token embedded in ``url`` (as in an authenticated clone URL)
+    authenticates the request, which private repositories need and which
+    lifts the 60 requests/hour anonymous limit. Sizes are cached for
+    SIZE_CACHE_TTL seconds and failed lookups for SIZE_FAILURE_TTL, so
+    repeated checkouts of a repository cost one request.
+    """
+    parsed = urlparse(url)
+    if parsed.hostname != "github.com":
+        return None
+    parts = parsed.path.strip("/").split("/")
+    if len(parts) < 2:
+        return None
+    repo = parts[1][:-4] if parts[1].endswith(".git") else parts[1]
+    token = unquote(parsed.password or parsed.username or "")
+    key = (f"{parts[0]}/{repo}".lower(), bool(token))
+    now = time.monotonic()
+    with _size_cache_lock:
+        cached = _size_cache.get(key)
+        if cached is not None and cached[1] > now:
+            return cached[0]
+    size = None
+    try:
+        import requests
+        response = requests.get(
+            f"https://api.github.com/repos/{parts[0]}/{repo}",
+            headers={"Authorization": f"Bearer {token}"} if token else None,
+            timeout=timeout
+        )
+        if response.status_code == 200:
+            size = int(response.json().get("size", 0)) * 1024
+    except Exception:
+        pass
+    with _size_cache_lock:
+        _size_cache[key] = (size, now + (SIZE_CACHE_TTL if size is not None else SIZE_FAILURE_TTL))
+    return size
+
+
+def _is_legacy_checkout(path: str) -> bool:
+    """A git checkout at ``path`` itself ("<name>_<random>") or one level below ("repo_*")."""
+    if os.path.isdir(os.path.join(path, ".git")):
+        return True
+    try:
+        children = [entry for entry in os.scandir(path) if entry.is_dir(follow_symlinks=False)]
+    except OSError:
+        return False
+    return len(children) == 1 and os.path.isdir(os.path.join(children[0].path, ".git"))
+
+
+class WorkspaceManager:
+    """
+    Allocates checkout directories under a managed root and accounts for
+    their disk usage.
+
+    Configuration is read from the environment:
+        WORKSPACE_ROOT              Managed root (default: <tmp>/git-agent-workspaces)
+        WORKSPACE_QUOTA_MB          Global byte quota across all checkouts
+        WORKSPACE_MAX_REPO_MB       Size limit for a single checkout
+        WORKSPACE_TMPFS_ROOT        Optional tmpfs root (e.g. /dev/shm) for small repos
+        WORKSPACE_TMPFS_MAX_MB      Largest repository placed on tmpfs
+        WORKSPACE_ORPHAN_AGE        Seconds before an unowned directory is reclaimed
+        WORKSPACE_JANITOR_INTERVAL  Seconds between janitor sweeps
+        WORKSPACE_LEGACY_ROOT       Where older versions cloned (default: the system
+                                    temporary directory; empty disables the scan)
+    """
+
+    def __init__(self, root: Optional[str] = None, quota_bytes: Optional[int] = None,
+                 max_repo_bytes: Optional[int] = None, tmpfs_root: Optional[str] = None,
+                 tmpfs_max_bytes: Optional[int] = None, orphan_age: Optional[int] = None,
+                 janitor_interval: Optional[int] = None, legacy_root: Optional[str] = None):
+        self.root = root or os.getenv(
+            "WORKSPACE_ROOT", os.path.join(tempfile.gettempdir(), "git-agent-workspaces")
+        )
+        self.quota_bytes = quota_bytes or _env_int("WORKSPACE_QUOTA_MB", 5120) * 1024 * 1024
+        self.max_repo_bytes = max_repo_bytes or _env_int("WORKSPACE_MAX_REPO_MB", 1024) * 1024 * 1024
+        self.tmpfs_root = tmpfs_root or os.getenv("WORKSPACE_TMPFS_ROOT") or None
+        self.tmpfs_max_bytes = tmpfs_max_bytes or _env_int("WORKSPACE_TMPFS_MAX_MB", 64) * 1024 * 1024
+        self.orphan_age = orphan_age or _env_int("WORKSPACE_ORPHAN_AGE", 3600)
+        self.janitor_interval = janitor_interval or _env_int("WORKSPACE_JANITOR_INTERVAL", 300)
+        self.legacy_root = legacy_root if legacy_root is not None else os.getenv(
+            "WORKSPACE_LEGACY_ROOT", tempfile.gettempdir()
+        )
+
+        self._allocations: Dict[str, int] = {}
+        self._lock = threading.Lock()
+        self._janitor: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+        self._reclaimed_bytes = 0
+        self._reclaimed_dirs = 0
+        self._last_sweep: Optional[float] = None
+        self._reclaimers: List[Callable[[float, float], List[Tuple[str, int]]]] = []
+
+        os.makedirs(self.root, exist_ok=True)
+        if self.tmpfs_root:
+            self.tmpfs_root = os.path.join(self.tmpfs_root, "git-agent-workspaces")
+            os.makedirs(self.tmpfs_root, exist_ok=True)
+
+    def usage_bytes(self) -> int:
+        """Bytes currently accounted to live checkouts."""
+        with self._lock:
+            return sum(self._allocations.values())
+
+    def _reserve(self, temp_dir: str, size: int) -> bool:
+        """Account ``size`` bytes to ``temp_dir`` if the quota has room for them."""
+        with self._lock:
+            if sum(self._allocations.values()) + size > self.quota_bytes:
+                return False
+            self._allocations[temp_dir] = size
+            return True
+
+    def reserve(self, path: str, size: int) -> None:
+        """
+        Account ``size`` bytes to ``path`` ahead of filling it.
+
+        Raises:
+            WorkspaceQuotaError: If they do not fit in the global quota, even after a sweep
+        """
+        if not self._reserve(path, size):
+            self.sweep()
+            if not self._reserve(path, size):
+                raise WorkspaceQuotaError(
+                    f"Workspace quota of {self.quota_bytes} bytes exhausted"
+                )
+
+    def add_reclaimer(self, reclaimer: Callable[[float, float], List[Tuple[str, int]]]) -> None:
+        """
+        Have every sweep also call ``reclaimer(now, orphan_age)``, which frees
+        idle storage kept outside the managed roots and returns the
+        ``(path, bytes)`` it removed.
+        """
+        with self._lock:
+            self._reclaimers.append(reclaimer)
+
+    def allocate(self, prefix: str, size_hint: Optional[int] = None) -> str:
+        """
+        Create a checkout directory, on tmpfs when the repository is known to be small.
+
+        The size hint is reserved against the quota before anything is
+        fetched, so concurrent allocations cannot overcommit it together.
+
+        Raises:
+            WorkspaceQuotaError: If the repository is over the per-analysis
+                limit or its size hint does not fit in the global quota
+        """
+        if size_hint and size_hint > self.max_repo_bytes:
+            raise WorkspaceQuotaError(
+                f"Repository size {size_hint} bytes exceeds the per-analysis limit "
+                f"of {self.max_repo_bytes} bytes"
+            )
+
+        use_tmpfs = bool(self.tmpfs_root and size_hint and size_hint <= self.tmpfs_max_bytes)
+        temp_dir = tempfile.mkdtemp(prefix=prefix, dir=self.tmpfs_root if use_tmpfs else self.root)
+        with open(os.path.join(temp_dir, OWNER_MARKER), "w") as f:
+            json.dump({"pid": os.getpid(), "created": time.time()}, f)
+        try:
+            self.reserve(temp_dir, size_hint or 0)
+        except WorkspaceQuotaError:
+            shutil.rmtree(temp_dir, ignore_errors=True)
+            raise
+        return temp_dir
+
+    def commit(self, temp_dir: str) -> int:
+        """
+        Measure a populated checkout and enforce the size limits.
+
+        Raises:
+            WorkspaceQuotaError: If the checkout is over the per-analysis limit
+                or pushes total usage past the global quota
+        """
+        size = directory_size(temp_dir)
+        with self._lock:
+            self._allocations[temp_dir] = size
+            total = sum(self._allocations.values())
+        if size > self.max_repo_bytes:
+            raise WorkspaceQuotaError(
+                f"Checkout is {size} bytes, over the per-analysis limit of {self.max_repo_bytes} bytes"
+            )
+        if total > self.quota_bytes:
+            raise WorkspaceQuotaError(
+                f"Checkout would raise workspace usage to {total} bytes, over the quota of {self.quota_bytes} bytes"
+            )
+        return size
+
+    def forget(self, temp_dir: str) -> None:
+        """Stop accounting for a checkout that has been removed."""
+        with self._lock:
+            self._allocations.pop(temp_dir, None)
+
+    def _is_orphan(self, path: str, now: float) -> bool:
+        """Decide whether a candidate directory is safe to reclaim."""
+        with self._lock:
+            if path in self._allocations:
+                return False
+        marker = os.path.join(path, OWNER_MARKER)
+        if os.path.exists(marker):
+            try:
+                with open(marker) as f:
+                    owner = json.load(f)
+                pid = int(owner.get("pid", 0))
+                created = float(owner.get("created", 0))
+            except (OSError, ValueError):
+                pid, created = 0, 0
+            if pid:
+                # A live owner may still be using it, however old it is
+                return pid != os.getpid() and not _pid_alive(pid)
+            return now - created > self.orphan_age
+        try:
+            return now - os.stat(path).st_mtime > self.orphan_age
+        except OSError:
+            return False
+
+    def _candidates(self):
+        """Yield the directories under the managed roots, then legacy checkouts."""
+        for base in (self.root, self.tmpfs_root):
+            if not base:
+                continue
+            for entry in os.scandir(base):
+                if entry.is_dir(follow_symlinks=False):
+                    yield entry.path
+        if not self.legacy_root or not os.path.isdir(self.legacy_root):
+            return
+        uid = os.getuid() if hasattr(os, "getuid") else None
+        for entry in os.scandir(self.legacy_root):
+            if (entry.path in (self.root, self.tmpfs_root) or not LEGACY_CHECKOUT.fullmatch(entry.name)
+                    or not entry.is_dir(follow_symlinks=False)):
+                continue
+            try:
+                if uid is not None and entry.stat(follow_symlinks=False).st_uid != uid:
+                    continue
+            except OSError:
+                continue
+            if _is_legacy_checkout(entry.path):
+                yield entry.path
+
+    def sweep(self) -> Dict:
+        """Reclaim orphaned checkout directories once."""
+        from .workspace import force_rmtree
+
+        now = time.time()
+        reclaimed = []
+        freed = 0
+        try:
+            candidates = list(self._candidates())
+        except OSError:
+            candidates = []
+        for path in candidates:
+            try:
+                if not self._is_orphan(path, now):
+                    continue
+                size = directory_size(path)
+                force_rmtree(path)
+                reclaimed.append(path)
+                freed += size
+            except Exception:
+                continue
+        with self._lock:
+            reclaimers = list(self._reclaimers)
+        for reclaimer in reclaimers:
+            try:
+                for path, size in reclaimer(now, self.orphan_age):
+                    reclaimed.append(path)
+                    freed += size
+            except Exception:
+                continue
+        with self._lock:
+            self._reclaimed_dirs += len(reclaimed)
+            self._reclaimed_bytes += freed
+            self._last_sweep = now
+        return {"reclaimed": reclaimed, "freed_bytes": freed}
+
+    def start_janitor(self) -> None:
+        """Start the background janitor thread (idempotent)."""
+        if self._janitor and self._janitor.is_alive():
+            return
+        self._stop.clear()
+
+        def run():
+            while not self._stop.is_set():
+                self.sweep()
+                self._stop.wait(self.janitor_interval)
+
+        self._janitor = threading.Thread(target=run, name="workspace-janitor", daemon=True)
+        self._janitor.start()
+
+    def stop_janitor(self) -> None:
+        """Stop the background janitor thread."""
+        self._stop.set()
+
+    def stats(self) -> Dict:
+        """Usage figures for health output."""
+        with self._lock:
+            usage = sum(self._allocations.values())
+            return {
+                "root": self.root,
+                "tmpfs_root": self.tmpfs_root,
+                "usage_bytes": usage,
+                "quota_bytes": self.quota_bytes,
+                "quota_used_percent": round(100.0 * usage / self.quota_bytes, 2) if self.quota_bytes else None,
+                "max_repo_bytes": self.max_repo_bytes,
+                "active_checkouts": len(self._allocations),
+                "reclaimed_dirs": self._reclaimed_dirs,
+                "reclaimed_bytes": self._reclaimed_bytes,
+                "janitor_running": bool(self._janitor and self._janitor.is_alive()),
+                "last_sweep": self._last_sweep
+            }
+
+
+# Shared WorkspaceManager instance
+_shared_workspace_manager = None
+_shared_manager_lock = threading.Lock()
+
+
+def get_shared_workspace_manager() -> WorkspaceManager:
+    """Get or create the process-wide WorkspaceManager instance."""
+    global _shared_workspace_manager
+    with _shared_manager_lock:
+        if _shared_workspace_manager is None:
+            _shared_workspace_manager = WorkspaceManager()
+        return _shared_workspace_manager